@@ -29,6 +29,14 @@ class Settings:
     DATABASE_PATH: str = os.getenv("DATABASE_PATH", "database/numbers.db")
     BACKUP_DIR: str = os.getenv("BACKUP_DIR", "backups")
     BACKUP_INTERVAL: int = int(os.getenv("BACKUP_INTERVAL", "3600"))  # seconds
+    DB_MMAP_SIZE: int = int(os.getenv("DB_MMAP_SIZE", str(256 * 1024 * 1024)))  # bytes
+    DB_CACHE_SIZE_KB: int = int(os.getenv("DB_CACHE_SIZE_KB", str(64 * 1024)))
+    DB_GROUP_COMMIT: bool = os.getenv("DB_GROUP_COMMIT", "False") == "True"
+    DB_GROUP_COMMIT_WINDOW_MS: float = float(os.getenv("DB_GROUP_COMMIT_WINDOW_MS", "5"))
+    DB_GROUP_COMMIT_MAX_OPS: int = int(os.getenv("DB_GROUP_COMMIT_MAX_OPS", "100"))
+    DB_SHARDS: int = int(os.getenv("DB_SHARDS", "1"))  # 1 = single file, fixed once created
+    CACHE_TTL: int = int(os.getenv("CACHE_TTL", "300"))  # seconds
+    CACHE_MAX_USERS: int = int(os.getenv("CACHE_MAX_USERS", "10000"))
     
     # Bot Limits
     DEFAULT_USER_LIMIT: int = int(os.getenv("DEFAULT_LIMIT", "10"))
@@ -41,8 +49,28 @@ class Settings:
         '80', '81', '82', '83', '84', '85', '86', '87', '88', '89',
         '90', '91', '92', '93', '94', '95', '96', '97', '98', '99'
     ]
-    OTP_LENGTH: int = 6
+    NUMBER_INDEX_PATH: str = os.getenv("NUMBER_INDEX_PATH", "database/numbers.idx")  # empty disables
+    NUMBER_GENERATOR_MODE: str = os.getenv("NUMBER_GENERATOR_MODE", "random")  # random | sequence
+    SEQUENCER_STATE_PATH: str = os.getenv("SEQUENCER_STATE_PATH", "database/sequencer.json")
+    SEQUENCER_BLOCK_SIZE: int = int(os.getenv("SEQUENCER_BLOCK_SIZE", "1000"))
+    OTP_LENGTH: int = int(os.getenv("OTP_LENGTH", "6"))
     NUMBER_VALIDITY_HOURS: int = 24
+    EXPIRY_SWEEP_INTERVAL: int = int(os.getenv("EXPIRY_SWEEP_INTERVAL", "60"))  # seconds
+    EXPIRY_BATCH_SIZE: int = int(os.getenv("EXPIRY_BATCH_SIZE", "500"))
+    LIMIT_RESET_PERIOD: str = os.getenv("LIMIT_RESET_PERIOD", "")  # daily | weekly, empty disables
+    LIMIT_RESET_INTERVAL: int = int(os.getenv("LIMIT_RESET_INTERVAL", "300"))  # seconds
+    LIMIT_RESET_BATCH_SIZE: int = int(os.getenv("LIMIT_RESET_BATCH_SIZE", "500"))
+    
+    # History archival (monthly files, empty ARCHIVE_DIR disables)
+    ARCHIVE_DIR: str = os.getenv("ARCHIVE_DIR", "database/archive")
+    ARCHIVE_AFTER_DAYS: int = int(os.getenv("ARCHIVE_AFTER_DAYS", "30"))
+    ARCHIVE_INTERVAL: int = int(os.getenv("ARCHIVE_INTERVAL", "3600"))  # seconds
+    ARCHIVE_CHUNK_SIZE: int = int(os.getenv("ARCHIVE_CHUNK_SIZE", "500"))
+    
+    # Number Pool (pre-generated pairs refilled in background)
+    POOL_LOW_WATERMARK: int = int(os.getenv("POOL_LOW_WATERMARK", "200"))
+    POOL_HIGH_WATERMARK: int = int(os.getenv("POOL_HIGH_WATERMARK", "1000"))
+    POOL_REFILL_BATCH: int = int(os.getenv("POOL_REFILL_BATCH", "250"))
     
     # Subscription Channels
     @staticmethod
@@ -63,6 +91,14 @@ class Settings:
                 "optional": []
             }
     
+    # Subscription checks (getChatMember against the required channels)
+    SUBSCRIPTION_CHECK: bool = os.getenv("SUBSCRIPTION_CHECK", "False") == "True"
+    SUBSCRIPTION_POSITIVE_TTL: int = int(os.getenv("SUBSCRIPTION_POSITIVE_TTL", "3600"))  # seconds
+    SUBSCRIPTION_NEGATIVE_TTL: int = int(os.getenv("SUBSCRIPTION_NEGATIVE_TTL", "60"))  # seconds
+    SUBSCRIPTION_WORKERS: int = int(os.getenv("SUBSCRIPTION_WORKERS", "8"))
+    # Bot API endpoint override, e.g. a local server: http://127.0.0.1:8081/bot{0}/{1}
+    BOT_API_URL: str = os.getenv("BOT_API_URL", "")
+    
     # Logging
     LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
     LOG_FILE: str = os.getenv("LOG_FILE", "logs/bot.log")
@@ -71,10 +107,28 @@ class Settings:
     # Webhook (for production)
     WEBHOOK_URL: str = os.getenv("WEBHOOK_URL", "")
     WEBHOOK_PORT: int = int(os.getenv("WEBHOOK_PORT", "8443"))
+    WEBHOOK_HOST: str = os.getenv("WEBHOOK_HOST", "0.0.0.0")  # listen address
+    WEBHOOK_PATH: str = os.getenv("WEBHOOK_PATH", "/webhook")
+    WEBHOOK_SECRET: str = os.getenv("WEBHOOK_SECRET", "")  # empty: generated at start
+    WEBHOOK_WORKERS: int = int(os.getenv("WEBHOOK_WORKERS", "8"))
+    WEBHOOK_QUEUE_SIZE: int = int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000"))
+    WEBHOOK_HTTP_THREADS: int = int(os.getenv("WEBHOOK_HTTP_THREADS", "4"))
+    WEBHOOK_SSL_CERT: str = os.getenv("WEBHOOK_SSL_CERT", "")  # proxy's self-signed cert, uploaded to Telegram
+    
+    # Update dispatch: N per-user lanes (ordered per user); 0 = telebot's thread pool
+    UPDATE_LANES: int = int(os.getenv("UPDATE_LANES", "0"))
+    UPDATE_LANE_QUEUE_SIZE: int = int(os.getenv("UPDATE_LANE_QUEUE_SIZE", "1000"))
     
     # Security
     ENABLE_RATE_LIMIT: bool = os.getenv("ENABLE_RATE_LIMIT", "True") == "True"
     RATE_LIMIT_WINDOW: int = int(os.getenv("RATE_LIMIT_WINDOW", "3600"))  # seconds
+    RATE_LIMIT_PER_WINDOW: int = int(os.getenv("RATE_LIMIT_PER_WINDOW", "120"))
+    RATE_LIMIT_PER_DAY: int = int(os.getenv("RATE_LIMIT_PER_DAY", "1000"))
+    RATE_LIMIT_RATE: float = float(os.getenv("RATE_LIMIT_RATE", "1"))  # updates per second
+    RATE_LIMIT_BURST: int = int(os.getenv("RATE_LIMIT_BURST", "5"))
+    RATE_LIMIT_FLUSH_INTERVAL: int = int(os.getenv("RATE_LIMIT_FLUSH_INTERVAL", "30"))  # seconds
+    # How often admin edits to rate_limits reach users already in memory
+    RATE_LIMIT_REFRESH_INTERVAL: int = int(os.getenv("RATE_LIMIT_REFRESH_INTERVAL", "300"))  # seconds
     
     # Messages
     @staticmethod
@@ -0,0 +1,214 @@
+"""
+Hot-reloadable configuration snapshot
+
+Channels and admin IDs are parsed once into an immutable ConfigSnapshot.
+Handlers read the current snapshot (one attribute read, no file I/O);
+ConfigStore builds a new one and swaps the reference when
+config/channels.json or .env changes (mtime poll) or on SIGHUP. On
+reload, values in .env take precedence over the environment the process
+was started with (before load_dotenv), so a line removed from .env is
+really gone; a file that fails to parse or validate keeps the previous
+snapshot.
+"""
+
+import json
+import os
+import signal
+import threading
+import time
+from types import MappingProxyType
+from typing import Dict, Mapping, NamedTuple, Optional, Tuple
+
+from dotenv import dotenv_values
+
+from config.settings import Settings
+
+class ConfigSnapshot(NamedTuple):
+    admin_ids: frozenset
+    admin_username: str
+    required_channels: Tuple[Mapping[str, str], ...]
+    optional_channels: Tuple[Mapping[str, str], ...]
+    version: int
+    loaded_at: float
+
+def _parse_admin_ids(value: str) -> frozenset:
+    """'1, 2,x' -> frozenset({1, 2})"""
+    return frozenset(int(part.strip()) for part in value.split(",") if part.strip().isdigit())
+
+def _channel(entry) -> Mapping[str, str]:
+    """Channel entry ("@name" or {"id", "name", "url"}) as a read-only mapping
+
+    Raises ValueError for entries handlers could not render.
+    """
+    if isinstance(entry, str):
+        entry = {'id': entry}
+    if not isinstance(entry, dict) or not isinstance(entry.get('id'), (str, int)):
+        raise ValueError(f"Channel entry needs an id: {entry!r}")
+
+    channel = {key: str(value) for key, value in entry.items()}
+    channel.setdefault('name', channel['id'])
+    if 'url' not in channel:
+        # Only public @usernames have a link that can be derived
+        if not channel['id'].startswith('@'):
+            raise ValueError(f"Channel {channel['id']} needs a url")
+        channel['url'] = f"https://t.me/{channel['id'][1:]}"
+    return MappingProxyType(channel)
+
+def _channels(channels, key: str) -> Tuple[Mapping[str, str], ...]:
+    """Validated channel list under key"""
+    entries = channels.get(key, [])
+    if not isinstance(entries, list):
+        raise ValueError(f"channels.json: '{key}' must be a list")
+    return tuple(_channel(entry) for entry in entries)
+
+class ConfigStore:
+    def __init__(self, channels_path: Optional[str] = "config/channels.json",
+                 env_path: Optional[str] = ".env", poll_interval: float = 5):
+        """Load the first snapshot"""
+        self.channels_path = channels_path
+        self.env_path = env_path
+        self.poll_interval = poll_interval
+
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._reload_requested = threading.Event()
+        self.reloads = 0
+
+        self._mtimes = self._current_mtimes()
+        # load_dotenv has already copied .env into os.environ; keep only
+        # what the process was started with, so reloads can drop keys
+        dotenv = self._read_env_file()
+        self._base_env = {key: value for key, value in os.environ.items()
+                          if dotenv.get(key) != value}
+        # Startup: the process environment as Settings saw it
+        self._snapshot = self._build(dict(os.environ), self._load_channels(), version=1)
+
+    def get(self) -> ConfigSnapshot:
+        """Current snapshot (never mutated, safe to keep for one request)"""
+        return self._snapshot
+
+    def swap(self, snapshot: ConfigSnapshot):
+        """Replace the current snapshot"""
+        self._snapshot = snapshot
+
+    # Loading
+
+    def _current_mtimes(self) -> Tuple:
+        """Modification times of the watched files (None if missing)"""
+        mtimes = []
+        for path in (self.channels_path, self.env_path):
+            try:
+                mtimes.append(os.stat(path).st_mtime_ns if path else None)
+            except OSError:
+                mtimes.append(None)
+        return tuple(mtimes)
+
+    def _read_env_file(self) -> Dict[str, str]:
+        """Values set in the .env file (empty if there is none)"""
+        if not self.env_path or not os.path.exists(self.env_path):
+            return {}
+        return {key: value for key, value in dotenv_values(self.env_path).items()
+                if value is not None}
+
+    def _load_channels(self) -> Dict:
+        """Parse channels.json, falling back to Settings' defaults"""
+        if not self.channels_path:
+            return Settings.get_channels()
+        try:
+            with open(self.channels_path, 'r', encoding='utf-8') as f:
+                channels = json.load(f)
+        except FileNotFoundError:
+            return Settings.get_channels()
+        if not isinstance(channels, dict):
+            raise ValueError("channels.json must be an object with 'required'/'optional' lists")
+        return channels
+
+    def _build(self, env: Mapping[str, str], channels: Dict, version: int) -> ConfigSnapshot:
+        """Assemble an immutable snapshot"""
+        return ConfigSnapshot(
+            admin_ids=_parse_admin_ids(env.get("ADMIN_IDS", "")),
+            admin_username=env.get("ADMIN_USERNAME", ""),
+            required_channels=_channels(channels, "required"),
+            optional_channels=_channels(channels, "optional"),
+            version=version,
+            loaded_at=time.time()
+        )
+
+    def reload(self) -> bool:
+        """Re-read the files and swap in a new snapshot, return success"""
+        with self._lock:
+            mtimes = self._current_mtimes()
+            try:
+                env = dict(self._base_env)
+                env.update(self._read_env_file())
+                snapshot = self._build(env, self._load_channels(), self._snapshot.version + 1)
+            except Exception as e:
+                # Half-written or broken file: keep serving the last good one
+                print(f"❌ Config reload failed, keeping version {self._snapshot.version}: {e}")
+                self._mtimes = mtimes
+                return False
+
+            self._mtimes = mtimes
+            self._snapshot = snapshot
+            self.reloads += 1
+        print(f"🔄 Config reloaded (version {snapshot.version}, {len(snapshot.admin_ids)} admins, "
+              f"{len(snapshot.required_channels)} required channels)")
+        return True
+
+    # Watching
+
+    def install_sighup(self) -> bool:
+        """Reload on SIGHUP (main thread, POSIX only)"""
+        if not hasattr(signal, 'SIGHUP') or threading.current_thread() is not threading.main_thread():
+            return False
+        # The handler only flags; the watcher thread does the work
+        signal.signal(signal.SIGHUP, lambda signum, frame: self._reload_requested.set())
+        return True
+
+    def start(self):
+        """Start watching the files"""
+        if self._thread and self._thread.is_alive():
+            return
+
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="config-watch", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop watching the files"""
+        self._stopped.set()
+        self._reload_requested.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self):
+        """Watcher loop: poll mtimes, wake early on SIGHUP"""
+        while not self._stopped.is_set():
+            requested = self._reload_requested.wait(self.poll_interval)
+            self._reload_requested.clear()
+            if self._stopped.is_set():
+                break
+            if requested or self._current_mtimes() != self._mtimes:
+                try:
+                    self.reload()
+                except Exception as e:
+                    # Never let one bad reload end the watcher
+                    print(f"❌ Config watcher error: {e}")
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_store() -> ConfigStore:
+    """Process-wide ConfigStore, created on first use"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ConfigStore()
+    return _store
+
+def current() -> ConfigSnapshot:
+    """Current process-wide snapshot"""
+    return get_store().get()
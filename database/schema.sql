@@ -1,5 +1,8 @@
 -- Database Schema for Virtual Number Bot
 -- Version: 1.0.0
+--
+-- Reference only: the bot applies this schema through the ordered steps in
+-- src/migrations.py and records progress in the schema_version table.
 
 -- Users table
 CREATE TABLE IF NOT EXISTS users (
@@ -94,7 +97,10 @@ CREATE TABLE IF NOT EXISTS rate_limits (
     hourly_limit INTEGER DEFAULT 10,
     is_blocked BOOLEAN DEFAULT 0,
     block_reason TEXT,
-    block_until TIMESTAMP
+    block_until TIMESTAMP,
+    window_start INTEGER,
+    window_count INTEGER DEFAULT 0,
+    day_start INTEGER
 );
 
 -- Backup logs
@@ -111,8 +117,51 @@ CREATE TABLE IF NOT EXISTS backup_logs (
 -- Create indexes for better performance
 CREATE INDEX IF NOT EXISTS idx_users_join_date ON users(join_date);
 CREATE INDEX IF NOT EXISTS idx_users_last_active ON users(last_active);
-CREATE INDEX IF NOT EXISTS idx_numbers_history_user_id ON numbers_history(user_id);
+CREATE INDEX IF NOT EXISTS idx_numbers_history_user_id_id ON numbers_history(user_id, id);
 CREATE INDEX IF NOT EXISTS idx_numbers_history_created_at ON numbers_history(created_at);
 CREATE INDEX IF NOT EXISTS idx_admin_logs_timestamp ON admin_logs(timestamp);
 CREATE INDEX IF NOT EXISTS idx_subscriptions_user_id ON subscriptions(user_id);
-CREATE INDEX IF NOT EXISTS idx_bot_stats_date ON bot_stats(date);
\ No newline at end of file
+CREATE INDEX IF NOT EXISTS idx_bot_stats_date ON bot_stats(date);
+CREATE INDEX IF NOT EXISTS idx_user_limits_used ON user_limits(used);
+CREATE INDEX IF NOT EXISTS idx_numbers_history_expiring ON numbers_history(expires_at) WHERE is_expired = 0;
+
+-- Numbers still valid (is_expired is set by the expiry sweeper)
+CREATE VIEW IF NOT EXISTS active_numbers AS
+SELECT * FROM numbers_history
+WHERE is_expired = 0 AND expires_at > CURRENT_TIMESTAMP;
+
+-- Interned app names (compact numbers_history layout, see src/compact.py)
+CREATE TABLE IF NOT EXISTS app_names (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+
+-- Phone number claims (sharded storage only, see src/storage.py)
+CREATE TABLE IF NOT EXISTS number_claims (
+    phone_number INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    claimed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Scheduled quota reset cursor (see src/limit_reset.py)
+CREATE TABLE IF NOT EXISTS limit_reset_progress (
+    period TEXT PRIMARY KEY,
+    period_start TEXT NOT NULL,
+    last_user_id INTEGER NOT NULL,
+    users_reset INTEGER DEFAULT 0,
+    started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
+-- Newest archived history id per user (see src/archive.py)
+CREATE TABLE IF NOT EXISTS archived_users (
+    user_id INTEGER PRIMARY KEY,
+    max_id INTEGER NOT NULL
+);
+
+-- Applied migrations
+CREATE TABLE IF NOT EXISTS schema_version (
+    version INTEGER PRIMARY KEY,
+    description TEXT,
+    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
\ No newline at end of file
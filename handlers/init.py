@@ -3,11 +3,16 @@ from .number_handler import register_number_handlers
 from .admin_handler import register_admin_handlers
 from .callback_handler import register_callback_handlers
 from .subscription_handler import register_subscription_handlers
+from .rate_limit import RateLimitMiddleware
 
-def register_handlers(bot, db, user_manager, admin_manager):
+def register_handlers(bot, db, user_manager, admin_manager, rate_limiter=None,
+                      subscription_verifier=None):
     """Register all handlers"""
+    if rate_limiter is not None:
+        # Needs TeleBot(..., use_class_middlewares=True)
+        bot.setup_middleware(RateLimitMiddleware(bot, rate_limiter, admin_manager))
     register_start_handlers(bot, db, user_manager)
-    register_number_handlers(bot, db, user_manager)
+    register_number_handlers(bot, db, user_manager, subscription_verifier)
     register_admin_handlers(bot, db, admin_manager)
     register_callback_handlers(bot, db, user_manager)
     register_subscription_handlers(bot, db)
\ No newline at end of file
@@ -1,7 +1,9 @@
 from telebot import types
-import json
+from telebot.apihelper import ApiTelegramException
 
-def register_number_handlers(bot, db, user_manager):
+from config.snapshot import current as current_config
+
+def register_number_handlers(bot, db, user_manager, subscription_verifier=None):
     
     @bot.message_handler(commands=['number'])
     def request_number(message):
@@ -16,12 +18,19 @@ def register_number_handlers(bot, db, user_manager):
         # Process number request
         result = user_manager.request_number(user_id, "Telegram Bot")
         
-        if not result or not result.get('success'):
+        if result is not None and not result['success']:
+            bot.reply_to(
+                message,
+                "⚠️ এই মুহূর্তে নাম্বার দেওয়া যাচ্ছে না, একটু পরে আবার চেষ্টা করুন।"
+            )
+            return
+        
+        if result is None:
             # Limit reached
             markup = types.InlineKeyboardMarkup()
             contact_btn = types.InlineKeyboardButton(
                 "📞 এডমিনের সাথে যোগাযোগ",
-                url=f"https://t.me/{os.getenv('ADMIN_USERNAME')}"
+                url=f"https://t.me/{current_config().admin_username}"
             )
             markup.add(contact_btn)
             
@@ -54,54 +63,107 @@ def register_number_handlers(bot, db, user_manager):
     def show_my_numbers(message):
         """Show user's number history"""
         user_id = message.from_user.id
-        numbers = user_manager.get_user_history(user_id)
+        page = user_manager.get_user_history_page(user_id)
         
-        if not numbers:
+        if not page['items']:
             bot.reply_to(message, "📭 আপনি এখনো কোনো নাম্বার পাননি।")
             return
         
+        response, markup = format_numbers_page(page)
+        bot.reply_to(message, response, parse_mode='Markdown', reply_markup=markup)
+    
+    @bot.callback_query_handler(func=lambda call: (call.data or '').startswith('mynumbers:'))
+    def page_my_numbers(call):
+        """Handle next/prev buttons of /mynumbers"""
+        try:
+            _, direction, cursor = call.data.split(':')
+            cursor = int(cursor)
+        except ValueError:
+            bot.answer_callback_query(call.id)
+            return
+        
+        try:
+            # The cursor only moves within the caller's own history
+            user_id = call.from_user.id
+            page = user_manager.get_user_history_page(user_id, cursor, direction)
+            if not page['items']:
+                page = user_manager.get_user_history_page(user_id)
+            if not page['items']:
+                return
+            
+            response, markup = format_numbers_page(page)
+            bot.edit_message_text(
+                response,
+                call.message.chat.id,
+                call.message.message_id,
+                parse_mode='Markdown',
+                reply_markup=markup
+            )
+        except ApiTelegramException as e:
+            # A double tap renders the same page again
+            if 'message is not modified' not in str(e):
+                raise
+        finally:
+            # Stop the button's spinner whatever happened
+            bot.answer_callback_query(call.id)
+    
+    def format_numbers_page(page):
+        """Build message text and next/prev keyboard for a history page"""
         response = "📋 *আপনার নাম্বার সমূহ*\n\n"
         
-        for idx, num in enumerate(numbers[:5], 1):
-            response += f"*#{idx}*\n"
+        for num in page['items']:
             response += f"📱: `{num['phone_number']}`\n"
             response += f"🔐: `{num['otp_code']}`\n"
             response += f"📅: {num['created_at'][:10]}\n"
             response += f"📱 অ্যাপ: {num['app_name']}\n"
+            if num.get('is_expired'):
+                response += "⌛ মেয়াদ শেষ\n"
             response += "─" * 30 + "\n"
         
-        if len(numbers) > 5:
-            response += f"\n📜 আরো {len(numbers) - 5} টি নাম্বার আছে..."
+        # Buttons carry the id of the page edge as cursor
+        buttons = []
+        if page['has_prev']:
+            buttons.append(types.InlineKeyboardButton(
+                "⬅️ নতুন", callback_data=f"mynumbers:prev:{page['items'][0]['id']}"
+            ))
+        if page['has_next']:
+            buttons.append(types.InlineKeyboardButton(
+                "পুরাতন ➡️", callback_data=f"mynumbers:next:{page['items'][-1]['id']}"
+            ))
         
-        bot.reply_to(message, response, parse_mode='Markdown')
+        markup = None
+        if buttons:
+            markup = types.InlineKeyboardMarkup()
+            markup.row(*buttons)
+        return response, markup
     
-    def check_subscriptions(user_id):
+    @bot.callback_query_handler(func=lambda call: call.data == 'check_subscription')
+    def recheck_subscription(call):
+        """Handle the check button: verify again, skipping the cache"""
+        if check_subscriptions(call.from_user.id, force=True):
+            bot.answer_callback_query(call.id, "✅ ধন্যবাদ! এখন /number দিন।", show_alert=True)
+        else:
+            bot.answer_callback_query(call.id, "❌ এখনো সব চ্যানেলে জয়েন করেননি।", show_alert=True)
+    
+    def check_subscriptions(user_id, force=False):
         """Check if user is subscribed to required channels"""
-        # Load channels from config
-        try:
-            with open('config/channels.json', 'r') as f:
-                channels = json.load(f)
-        except:
-            # Default channels for testing
-            channels = {
-                "required": ["@test_channel_1", "@test_channel_2"],
-                "optional": ["@support_channel"]
-            }
-        
-        # In production, implement actual Telegram API checks
-        # For now, return True for testing
-        return True
+        if subscription_verifier is None:
+            # SUBSCRIPTION_CHECK disabled
+            return True
+        return subscription_verifier.is_subscribed(user_id, force=force)
     
     def show_subscription_required(message):
         """Show subscription requirement"""
         markup = types.InlineKeyboardMarkup(row_width=2)
         
         # Add channel buttons
-        btn1 = types.InlineKeyboardButton("📢 চ্যানেল ১", url="https://t.me/test_channel_1")
-        btn2 = types.InlineKeyboardButton("📢 চ্যানেল ২", url="https://t.me/test_channel_2")
+        buttons = [
+            types.InlineKeyboardButton(f"📢 {channel['name']}", url=channel['url'])
+            for channel in current_config().required_channels
+        ]
         check_btn = types.InlineKeyboardButton("✅ চেক করুন", callback_data="check_subscription")
         
-        markup.add(btn1, btn2, check_btn)
+        markup.add(*buttons, check_btn)
         
         bot.reply_to(
             message,
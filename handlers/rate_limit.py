@@ -0,0 +1,33 @@
+from telebot import types
+from telebot.handler_backends import BaseMiddleware, CancelUpdate
+
+class RateLimitMiddleware(BaseMiddleware):
+    def __init__(self, bot, rate_limiter, admin_manager=None):
+        """Drop messages and callbacks of users over their rate limit"""
+        super().__init__()
+        self.update_types = ['message', 'callback_query']
+        self.bot = bot
+        self.rate_limiter = rate_limiter
+        self.admin_manager = admin_manager
+    
+    def pre_process(self, update, data):
+        """Runs before any handler sees the update"""
+        user = getattr(update, 'from_user', None)
+        if user is None:
+            return None
+        if self.admin_manager and self.admin_manager.is_admin(user.id):
+            return None
+        if self.rate_limiter.check(user.id):
+            return None
+        
+        if isinstance(update, types.CallbackQuery):
+            # Stop the button's loading spinner; nothing is sent to the chat
+            try:
+                self.bot.answer_callback_query(update.id, "⏳ একটু অপেক্ষা করুন...")
+            except Exception:
+                pass
+        return CancelUpdate()
+    
+    def post_process(self, update, data, exception):
+        """Nothing to do after handlers"""
+        pass
@@ -1,6 +1,7 @@
 from telebot import types
 import json
-import os
+
+from config.snapshot import current as current_config
 
 def register_start_handlers(bot, db, user_manager):
     
@@ -51,7 +52,7 @@ def register_start_handlers(bot, db, user_manager):
         btn1 = types.InlineKeyboardButton("📱 নাম্বার নিন", callback_data="get_number")
         btn2 = types.InlineKeyboardButton("📊 আমার স্ট্যাটাস", callback_data="my_status")
         btn3 = types.InlineKeyboardButton("📋 নিয়মাবলী", callback_data="show_rules")
-        btn4 = types.InlineKeyboardButton("👑 এডমিন", url=f"https://t.me/{os.getenv('ADMIN_USERNAME', '')}")
+        btn4 = types.InlineKeyboardButton("👑 এডমিন", url=f"https://t.me/{current_config().admin_username}")
         
         markup.add(btn1, btn2, btn3, btn4)
         
@@ -14,6 +14,7 @@ sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
 
 from src.bot import VirtualNumberBot
 from src.utils.backup import BackupManager
+from config.settings import Settings
 
 # Configure logging
 logging.basicConfig(
@@ -46,7 +47,8 @@ def main():
     
     try:
         # Initialize backup manager
-        backup = BackupManager()
+        backup = BackupManager(archive_dir=Settings.ARCHIVE_DIR or None,
+                               shards=Settings.DB_SHARDS)
         backup.start_auto_backup()
         
         # Initialize and start bot
@@ -1,31 +1,40 @@
-import os
-from typing import List, Dict
+import csv
+from typing import Callable, Iterable, List, Dict, Optional
 from datetime import datetime
 
+from config.snapshot import get_store
+
+# Named user cohorts for bulk operations; `?` is the time window
+COHORTS = {
+    'all': "SELECT user_id FROM users",
+    'active': "SELECT user_id FROM users WHERE last_active >= datetime('now', ?)",
+    'new': "SELECT user_id FROM users WHERE join_date >= datetime('now', ?)"
+}
+
 class AdminManager:
-    def __init__(self, db):
+    def __init__(self, db, expiry_sweeper=None, limit_reset=None, config=None,
+                 rate_limiter=None):
         """Initialize admin manager"""
         self.db = db
-        self.admin_ids = self._load_admin_ids()
+        self.expiry_sweeper = expiry_sweeper
+        self.limit_reset = limit_reset
+        self.rate_limiter = rate_limiter
+        # ConfigStore; admin IDs follow its hot reloads
+        self.config = config or get_store()
+        self._search_index = None
     
-    def _load_admin_ids(self) -> List[int]:
-        """Load admin IDs from environment or config"""
-        admin_str = os.getenv("ADMIN_IDS", "")
-        if admin_str:
-            return [int(id.strip()) for id in admin_str.split(",") if id.strip().isdigit()]
-        return []
+    @property
+    def admin_ids(self) -> frozenset:
+        """Admin IDs of the current config snapshot"""
+        return self.config.get().admin_ids
     
     def is_admin(self, user_id: int) -> bool:
         """Check if user is admin"""
-        return user_id in self.admin_ids
+        return user_id in self.config.get().admin_ids
     
     def add_admin_log(self, admin_id: int, action: str, target_user: int, details: str = ""):
         """Log admin action"""
-        self.db.cursor.execute('''
-        INSERT INTO admin_logs (admin_id, action, target_user, details)
-        VALUES (?, ?, ?, ?)
-        ''', (admin_id, action, target_user, details))
-        self.db.conn.commit()
+        self.db.add_admin_log(admin_id, action, target_user, details)
     
     def update_user_limit(self, admin_id: int, target_user: int, new_limit: int) -> Dict:
         """Update user's limit (admin action)"""
@@ -59,50 +68,178 @@ class AdminManager:
         
         return {'success': False, 'error': 'Database error'}
     
+    # Bulk operations
+    
+    def get_cohort(self, cohort: str, days: int = 7) -> List[int]:
+        """User IDs in a named cohort (e.g. 'active' in the last `days` days)"""
+        sql = COHORTS[cohort]
+        params = (f"-{int(days)} days",) if '?' in sql else ()
+        return [row[0] for row in self.db.scatter(sql, params)]
+    
+    @staticmethod
+    def read_user_ids_csv(path: str) -> List[int]:
+        """User IDs from a CSV file: the user_id column, or the first one"""
+        user_ids = []
+        with open(path, newline='', encoding='utf-8') as f:
+            column = 0
+            for number, row in enumerate(csv.reader(f)):
+                if number == 0 and 'user_id' in row:
+                    column = row.index('user_id')
+                    continue
+                if len(row) > column and row[column].strip().isdigit():
+                    user_ids.append(int(row[column].strip()))
+        return user_ids
+    
+    def _bulk(self, admin_id: int, user_ids: Iterable[int], assignments: str, params,
+              action: str, details: str, chunk_size: int,
+              progress: Optional[Callable[[Dict], None]]) -> Dict:
+        """Run a chunked limits update, logging each chunk's users in one insert"""
+        if not self.is_admin(admin_id):
+            return {'success': False, 'error': 'Not authorized'}
+        
+        def log_chunk(updated: List[int]):
+            self.db.add_admin_logs([(admin_id, action, user_id, details) for user_id in updated])
+        
+        try:
+            result = self.db.bulk_update_limits(
+                user_ids, assignments, params,
+                chunk_size=chunk_size, progress=progress, on_chunk=log_chunk
+            )
+        except Exception as e:
+            print(f"❌ Bulk {action} failed: {e}")
+            return {'success': False, 'error': 'Database error'}
+        
+        result.update(success=True, message=f"{details} for {result['updated']} users")
+        return result
+    
+    def bulk_update_user_limit(self, admin_id: int, user_ids: Iterable[int], new_limit: int,
+                               chunk_size: int = 500,
+                               progress: Optional[Callable[[Dict], None]] = None) -> Dict:
+        """Set many users' limit (admin action)"""
+        return self._bulk(admin_id, user_ids, 'max_limit = ?, remaining = ? - used',
+                          (new_limit, new_limit), 'UPDATE_LIMIT', f"Set limit to {new_limit}",
+                          chunk_size, progress)
+    
+    def bulk_add_extra_numbers(self, admin_id: int, user_ids: Iterable[int], extra_count: int,
+                               chunk_size: int = 500,
+                               progress: Optional[Callable[[Dict], None]] = None) -> Dict:
+        """Add extra numbers to many users (admin action)"""
+        return self._bulk(admin_id, user_ids,
+                          'extra_given = extra_given + ?, remaining = remaining + ?',
+                          (extra_count, extra_count), 'ADD_EXTRA',
+                          f"Added {extra_count} extra numbers", chunk_size, progress)
+    
+    def bulk_reset_user_limits(self, admin_id: int, user_ids: Iterable[int],
+                               chunk_size: int = 500,
+                               progress: Optional[Callable[[Dict], None]] = None) -> Dict:
+        """Reset many users' used count (admin action)"""
+        return self._bulk(admin_id, user_ids, 'used = 0, remaining = max_limit + extra_given',
+                          (), 'RESET_LIMITS', "Reset limits", chunk_size, progress)
+    
     def get_admin_stats(self) -> Dict:
         """Get detailed statistics for admin"""
         stats = self.db.get_stats()
         
-        # Add additional admin stats
-        self.db.cursor.execute('''
+        # Add additional admin stats (range on created_at: today's rows only;
+        # a user's rows live in one shard, so per-shard counts add up)
+        stats['unique_users_today'] = sum(row[0] for row in self.db.scatter('''
         SELECT COUNT(DISTINCT user_id) FROM numbers_history 
-        WHERE DATE(created_at) = DATE('now')
-        ''')
-        stats['unique_users_today'] = self.db.cursor.fetchone()[0]
+        WHERE created_at >= DATE('now')
+        '''))
         
-        self.db.cursor.execute('''
+        rows = self.db.scatter('''
         SELECT 
-            DATE(created_at) as date,
-            COUNT(*) as count
-        FROM numbers_history 
-        GROUP BY DATE(created_at) 
+            date,
+            numbers_generated as count
+        FROM bot_stats 
+        WHERE numbers_generated > 0 
         ORDER BY date DESC 
         LIMIT 7
         ''')
-        stats['weekly_trend'] = [dict(row) for row in self.db.cursor.fetchall()]
+        trend = {}
+        for row in rows:
+            trend[row['date']] = trend.get(row['date'], 0) + row['count']
+        stats['weekly_trend'] = [
+            {'date': date, 'count': trend[date]} for date in sorted(trend, reverse=True)[:7]
+        ]
+        stats['db_writer'] = self.db.get_write_metrics()
+        stats['cache'] = self.db.get_cache_stats()
+        if self.expiry_sweeper is not None:
+            stats['expiry'] = self.expiry_sweeper.get_metrics()
+        if self.limit_reset is not None:
+            stats['limit_reset'] = self.limit_reset.get_metrics()
+        if self.db.archive is not None:
+            stats['archive'] = self.db.archive.get_stats()
+        if self.rate_limiter is not None:
+            stats['rate_limiter'] = self.rate_limiter.get_stats()
         
         return stats
     
-    def get_user_search(self, search_term: str) -> List[Dict]:
-        """Search users by username or ID"""
+    def _has_search_index(self) -> bool:
+        """Check whether the users_fts trigram index exists"""
+        if self._search_index is None:
+            rows = self.db.scatter('''
+            SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'users_fts'
+            ''')
+            self._search_index = bool(rows)
+        return self._search_index
+    
+    def get_user_search(self, search_term: str, limit: int = 20) -> List[Dict]:
+        """Search users by username, name or ID (best matches first)"""
         try:
+            search_term = search_term.strip().lstrip('@')
+            if not search_term:
+                return []
             if search_term.isdigit():
                 # Search by user ID
-                self.db.cursor.execute('''
+                user_id = int(search_term)
+                rows = self.db.fetchall_for(user_id, '''
                 SELECT u.*, ul.* 
                 FROM users u 
                 LEFT JOIN user_limits ul ON u.user_id = ul.user_id 
                 WHERE u.user_id = ?
-                ''', (int(search_term),))
+                ''', (user_id,))
+            elif len(search_term) >= 3 and self._has_search_index():
+                # Trigram match anywhere in the names, username hits rank first
+                rows = self.db.scatter('''
+                SELECT u.*, ul.*, bm25(users_fts, 10.0, 1.0, 1.0) AS score 
+                FROM users_fts f 
+                JOIN users u ON u.user_id = f.rowid 
+                LEFT JOIN user_limits ul ON u.user_id = ul.user_id 
+                WHERE users_fts MATCH ? 
+                ORDER BY score 
+                LIMIT ?
+                ''', ('"' + search_term.replace('"', '""') + '"', limit),
+                   key=lambda row: row['score'], limit=limit)
+            elif len(search_term) >= 3:
+                # No FTS5 in this SQLite build
+                rows = self.db.scatter('''
+                SELECT u.*, ul.* 
+                FROM users u 
+                LEFT JOIN user_limits ul ON u.user_id = ul.user_id 
+                WHERE u.username LIKE ? ESCAPE '\\' 
+                LIMIT ?
+                ''', (f'%{self._escape_like(search_term)}%', limit), limit=limit)
             else:
-                # Search by username
-                self.db.cursor.execute('''
+                # Too short for trigrams: username prefix, an index range
+                rows = self.db.scatter('''
                 SELECT u.*, ul.* 
                 FROM users u 
                 LEFT JOIN user_limits ul ON u.user_id = ul.user_id 
-                WHERE u.username LIKE ?
-                ''', (f'%{search_term}%',))
+                WHERE u.username LIKE ? ESCAPE '\\' 
+                ORDER BY u.username COLLATE NOCASE 
+                LIMIT ?
+                ''', (f'{self._escape_like(search_term)}%', limit),
+                   key=lambda row: (row['username'] or '').lower(), limit=limit)
             
-            return [dict(row) for row in self.db.cursor.fetchall()]
+            users = [dict(row) for row in rows]
+            for user in users:
+                user.pop('score', None)
+            return users
         except:
-            return []
\ No newline at end of file
+            return []
+    
+    @staticmethod
+    def _escape_like(term: str) -> str:
+        """Escape LIKE wildcards in a search term"""
+        return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
\ No newline at end of file
@@ -0,0 +1,280 @@
+"""
+Monthly archives of cold numbers_history rows
+
+Rows older than `max_age_days` move, chunk by chunk, into one SQLite file
+per month (numbers_YYYY_MM.db). Archives are ATTACHed to a private reader
+only for queries that need old rows: full user history, number uniqueness
+checks and exports. The hot database and its cache only carry recent
+history; backups copy the archive files along with it. archived_users keeps each user's newest archived id, so
+history pages that lie entirely in the hot table never open an archive.
+"""
+
+import glob
+import os
+import re
+import sqlite3
+import threading
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from .compact import is_compact
+
+class NumberArchive:
+    def __init__(self, connections, archive_dir: str = "database/archive",
+                 max_age_days: int = 30, chunk_size: int = 500,
+                 interval: float = 3600):
+        """Initialize archive over the hot database's ConnectionManager"""
+        self.connections = connections
+        self.archive_dir = archive_dir
+        self.max_age_days = max_age_days
+        # Stays below SQLite's host parameter limit in the DELETE
+        self.chunk_size = max(1, min(chunk_size, 900))
+        self.interval = interval
+        os.makedirs(archive_dir, exist_ok=True)
+        
+        self._stopped = threading.Event()
+        self._thread = None
+        self.moved = 0
+        self.last_run = None
+        
+        self._backfill_markers()
+    
+    # Layout
+    
+    def path(self, month: str) -> str:
+        """Archive file for a YYYY_MM month"""
+        return os.path.join(self.archive_dir, f"numbers_{month}.db")
+    
+    def months(self) -> List[str]:
+        """Archived months, newest first"""
+        months = []
+        for path in glob.glob(os.path.join(self.archive_dir, "numbers_*.db")):
+            match = re.fullmatch(r"numbers_(\d{4}_\d{2})\.db", os.path.basename(path))
+            if match:
+                months.append(match.group(1))
+        return sorted(months, reverse=True)
+    
+    def mismatched_months(self, compact: bool) -> List[str]:
+        """Months whose numbers_history layout differs from the hot table's"""
+        mismatched = []
+        for month in self.months():
+            conn = sqlite3.connect(self.path(month))
+            try:
+                if is_compact(conn) != compact:
+                    mismatched.append(month)
+            finally:
+                conn.close()
+        return mismatched
+    
+    def _open_month(self, month: str, columns_sql: str) -> sqlite3.Connection:
+        """Open (creating if needed) a month's archive file"""
+        conn = sqlite3.connect(self.path(month))
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(columns_sql.replace("CREATE TABLE", "CREATE TABLE IF NOT EXISTS", 1))
+        conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_numbers_history_user_id_id
+        ON numbers_history(user_id, id)
+        ''')
+        return conn
+    
+    # Moving rows
+    
+    def archive_old_rows(self, progress: Optional[Callable[[int], None]] = None) -> int:
+        """Move rows older than max_age_days into monthly archives, return rows moved
+        
+        Each chunk is copied and committed to its archive before it is
+        deleted from the hot database in one short writer job, so an
+        interrupted run leaves duplicates (ignored next time), never gaps.
+        """
+        reader = self.connections.open_reader()
+        archives = {}
+        moved = 0
+        try:
+            table_sql = reader.execute('''
+            SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'numbers_history'
+            ''').fetchone()[0]
+            
+            while not self._stopped.is_set():
+                rows = reader.execute('''
+                SELECT strftime('%Y_%m', created_at) AS archive_month, *
+                FROM numbers_history
+                WHERE created_at < datetime('now', ?)
+                ORDER BY created_at
+                LIMIT ?
+                ''', (f"-{int(self.max_age_days)} days", self.chunk_size)).fetchall()
+                if not rows:
+                    break
+                
+                by_month = {}
+                for row in rows:
+                    by_month.setdefault(row[0], []).append(tuple(row)[1:])
+                
+                columns = rows[0].keys()[1:]
+                insert = (f"INSERT OR IGNORE INTO numbers_history ({', '.join(columns)}) "
+                          f"VALUES ({', '.join('?' * len(columns))})")
+                for month, values in by_month.items():
+                    if month not in archives:
+                        archives[month] = self._open_month(month, table_sql)
+                    with archives[month]:
+                        archives[month].executemany(insert, values)
+                
+                ids = [row['id'] for row in rows]
+                markers = {}
+                for row in rows:
+                    markers[row['user_id']] = max(markers.get(row['user_id'], 0), row['id'])
+                
+                def move(conn):
+                    conn.execute(
+                        f"DELETE FROM numbers_history WHERE id IN ({', '.join('?' * len(ids))})", ids
+                    )
+                    self._save_markers(conn, markers.items())
+                
+                self.connections.write(move)
+                
+                moved += len(rows)
+                if progress:
+                    progress(moved)
+        finally:
+            reader.close()
+            for conn in archives.values():
+                conn.close()
+        
+        self.moved += moved
+        return moved
+    
+    # Per-user markers
+    
+    @staticmethod
+    def _save_markers(conn, markers: Iterable):
+        """Raise users' newest archived ids ((user_id, max_id) pairs)"""
+        conn.executemany('''
+        INSERT INTO archived_users (user_id, max_id) VALUES (?, ?)
+        ON CONFLICT(user_id) DO UPDATE SET max_id = max(max_id, excluded.max_id)
+        ''', markers)
+    
+    def _backfill_markers(self):
+        """Fill archived_users from archives written before it existed"""
+        if not self.months() or self.connections.fetchone('SELECT 1 FROM archived_users LIMIT 1'):
+            return
+        markers = list(self.query('''
+        SELECT user_id, MAX(id) FROM archive.numbers_history GROUP BY user_id
+        '''))
+        self.connections.write(lambda conn: self._save_markers(conn, [tuple(row) for row in markers]))
+        print(f"📦 Indexed archived history of {len({row[0] for row in markers}):,} users")
+    
+    def archived_max_id(self, user_id: int) -> Optional[int]:
+        """Newest archived history id of user, None if nothing is archived"""
+        row = self.connections.fetchone(
+            'SELECT max_id FROM archived_users WHERE user_id = ?', (user_id,)
+        )
+        return row[0] if row else None
+    
+    # Reading archived rows
+    
+    def query(self, sql: str, params=(), months: Optional[Iterable[str]] = None) -> Iterator[sqlite3.Row]:
+        """Run sql against each archive (newest first), yielding rows
+        
+        The archive is ATTACHed as `archive` on a private reader for the
+        duration of its query, e.g. SELECT * FROM archive.numbers_history.
+        """
+        months = self.months() if months is None else list(months)
+        if not months:
+            return
+        
+        conn = self.connections.open_reader()
+        try:
+            for month in months:
+                conn.execute("ATTACH DATABASE ? AS archive", (self.path(month),))
+                try:
+                    for row in conn.execute(sql, params).fetchall():
+                        yield row
+                finally:
+                    conn.execute("DETACH DATABASE archive")
+        finally:
+            conn.close()
+    
+    def get_user_rows(self, user_id: int, where: str = "", params=(),
+                      order: str = "DESC", limit: Optional[int] = None) -> List[Dict]:
+        """Get user's archived rows by id order, stopping once limit is reached"""
+        months = self.months() if order == "DESC" else self.months()[::-1]
+        sql = f'''
+        SELECT * FROM archive.numbers_history
+        WHERE user_id = ? {where}
+        ORDER BY id {order}
+        ''' + ("LIMIT ?" if limit is not None else "")
+        query_params = (user_id,) + tuple(params) + ((limit,) if limit is not None else ())
+        
+        rows = []
+        for month in months:
+            rows.extend(dict(row) for row in self.query(sql, query_params, [month]))
+            if limit is not None and len(rows) >= limit:
+                break
+        return rows
+    
+    def get_issued_numbers(self, numbers: List[str]) -> set:
+        """Return which of the given numbers are in an archive"""
+        issued = set()
+        for start in range(0, len(numbers), 500):
+            chunk = numbers[start:start + 500]
+            placeholders = ','.join('?' * len(chunk))
+            issued.update(row[0] for row in self.query(f'''
+            SELECT phone_number FROM archive.numbers_history
+            WHERE phone_number IN ({placeholders})
+            ''', chunk))
+        return issued
+    
+    def iter_numbers(self) -> Iterator[str]:
+        """Iterate over every archived number"""
+        for month in self.months():
+            conn = sqlite3.connect(self.path(month))
+            try:
+                cursor = conn.execute('SELECT phone_number FROM numbers_history')
+                while True:
+                    rows = cursor.fetchmany(10000)
+                    if not rows:
+                        break
+                    for row in rows:
+                        yield row[0]
+            finally:
+                conn.close()
+    
+    # Background worker
+    
+    def start(self):
+        """Start periodic archival"""
+        if self._thread and self._thread.is_alive():
+            return
+        
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="number-archive", daemon=True)
+        self._thread.start()
+        print(f"✅ Archival started (rows older than {self.max_age_days} days, "
+              f"every {self.interval}s)")
+    
+    def stop(self):
+        """Stop periodic archival"""
+        self._stopped.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+    
+    def _run(self):
+        """Background worker loop"""
+        while not self._stopped.is_set():
+            try:
+                moved = self.archive_old_rows()
+                if moved:
+                    print(f"📦 Archived {moved:,} numbers")
+            except Exception as e:
+                print(f"❌ Archival failed: {e}")
+            self._stopped.wait(self.interval)
+    
+    def get_stats(self) -> Dict:
+        """Get archive statistics"""
+        months = self.months()
+        return {
+            'months': len(months),
+            'oldest': months[-1] if months else None,
+            'newest': months[0] if months else None,
+            'size_bytes': sum(os.path.getsize(self.path(month)) for month in months),
+            'moved': self.moved
+        }
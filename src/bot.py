@@ -7,10 +7,23 @@ from dotenv import load_dotenv
 # Load environment variables
 load_dotenv()
 
+from config.settings import Settings
+from config.snapshot import get_store
 from src.database import DatabaseManager
 from src.number_generator import NumberGenerator
+from src.number_index import NumberIndex
+from src.number_sequencer import NumberSequencer
+from src.number_pool import NumberPool
+from src.expiry import ExpirySweeper
+from src.limit_reset import LimitResetScheduler
+from src.archive import NumberArchive
+from src.otp_engine import OTPEngine
 from src.user_manager import UserManager
 from src.admin_manager import AdminManager
+from src.rate_limiter import RateLimiter
+from src.subscription import SubscriptionVerifier
+from src.webhook import WebhookServer
+from src.dispatcher import LaneTeleBot
 from handlers import register_handlers
 
 class VirtualNumberBot:
@@ -20,28 +33,179 @@ class VirtualNumberBot:
         if not self.token:
             raise ValueError("BOT_TOKEN not found in environment variables")
         
-        self.bot = telebot.TeleBot(self.token)
-        self.db = DatabaseManager()
-        self.number_gen = NumberGenerator()
-        self.user_manager = UserManager(self.db)
-        self.admin_manager = AdminManager(self.db)
+        if Settings.BOT_API_URL:
+            telebot.apihelper.API_URL = Settings.BOT_API_URL
+        self.dispatcher = None
+        if Settings.UPDATE_LANES:
+            # Polling and webhook both feed the per-user lanes
+            self.bot = LaneTeleBot(self.token, lanes=Settings.UPDATE_LANES,
+                                   queue_size=Settings.UPDATE_LANE_QUEUE_SIZE,
+                                   use_class_middlewares=True)
+            self.dispatcher = self.bot.dispatcher
+        else:
+            # Webhook mode runs handlers on its own worker pool
+            self.bot = telebot.TeleBot(self.token, threaded=not Settings.WEBHOOK_URL,
+                                       use_class_middlewares=True)
+        # Channels, admins and messages; swapped on file change or SIGHUP
+        self.config = get_store()
+        self.config.install_sighup()
+        self.config.start()
+        self.db = DatabaseManager(
+            mmap_size=Settings.DB_MMAP_SIZE,
+            cache_size_kb=Settings.DB_CACHE_SIZE_KB,
+            group_commit=Settings.DB_GROUP_COMMIT,
+            group_window_ms=Settings.DB_GROUP_COMMIT_WINDOW_MS,
+            group_max_ops=Settings.DB_GROUP_COMMIT_MAX_OPS,
+            cache_ttl=Settings.CACHE_TTL,
+            cache_max_users=Settings.CACHE_MAX_USERS,
+            shards=Settings.DB_SHARDS
+        )
+        # Claims a crash cut off from their history row
+        self.db.reconcile_claims()
+        self.archive = None
+        if Settings.ARCHIVE_DIR and self.db.storage.sharded:
+            print("⚠️ Archival is not supported with sharded storage, skipping")
+        elif Settings.ARCHIVE_DIR:
+            # Attach before the index build so archived numbers stay taken
+            self.archive = NumberArchive(
+                self.db.connections,
+                Settings.ARCHIVE_DIR,
+                max_age_days=Settings.ARCHIVE_AFTER_DAYS,
+                chunk_size=Settings.ARCHIVE_CHUNK_SIZE,
+                interval=Settings.ARCHIVE_INTERVAL
+            )
+            mismatched = self.archive.mismatched_months(self.db.compact)
+            if mismatched:
+                # Lookups would probe them with the wrong key type
+                raise ValueError(f"Archives {', '.join(mismatched)} are not in the database's layout, "
+                                 f"run: python -m src.compact convert")
+            self.db.archive = self.archive
+            self.archive.start()
+        self.number_index = None
+        if Settings.NUMBER_INDEX_PATH:
+            self.number_index = NumberIndex(Settings.NUMBER_INDEX_PATH, Settings.NUMBER_PREFIXES)
+            self.number_index.ensure_built(self.db)
+        self.number_sequencer = None
+        if Settings.NUMBER_GENERATOR_MODE == "sequence":
+            self.number_sequencer = NumberSequencer(
+                Settings.SEQUENCER_STATE_PATH,
+                Settings.NUMBER_PREFIXES,
+                block_size=Settings.SEQUENCER_BLOCK_SIZE
+            )
+        self.number_gen = NumberGenerator(
+            self.number_index,
+            self.number_sequencer,
+            OTPEngine(Settings.OTP_LENGTH)
+        )
+        self.number_pool = NumberPool(
+            self.number_gen,
+            self.db,
+            low_watermark=Settings.POOL_LOW_WATERMARK,
+            high_watermark=Settings.POOL_HIGH_WATERMARK,
+            refill_batch=Settings.POOL_REFILL_BATCH
+        )
+        self.number_pool.start()
+        self.expiry_sweeper = ExpirySweeper(
+            self.db,
+            interval=Settings.EXPIRY_SWEEP_INTERVAL,
+            batch_size=Settings.EXPIRY_BATCH_SIZE
+        )
+        self.expiry_sweeper.start()
+        self.limit_reset = None
+        if Settings.LIMIT_RESET_PERIOD:
+            self.limit_reset = LimitResetScheduler(
+                self.db,
+                Settings.LIMIT_RESET_PERIOD,
+                interval=Settings.LIMIT_RESET_INTERVAL,
+                batch_size=Settings.LIMIT_RESET_BATCH_SIZE
+            )
+            self.limit_reset.start()
+        self.user_manager = UserManager(self.db, self.number_gen, self.number_pool)
+        self.rate_limiter = None
+        if Settings.ENABLE_RATE_LIMIT:
+            self.rate_limiter = RateLimiter(
+                self.db,
+                rate=Settings.RATE_LIMIT_RATE,
+                burst=Settings.RATE_LIMIT_BURST,
+                window=Settings.RATE_LIMIT_WINDOW,
+                window_limit=Settings.RATE_LIMIT_PER_WINDOW,
+                daily_limit=Settings.RATE_LIMIT_PER_DAY,
+                flush_interval=Settings.RATE_LIMIT_FLUSH_INTERVAL,
+                refresh_interval=Settings.RATE_LIMIT_REFRESH_INTERVAL
+            )
+            self.rate_limiter.start()
+        
+        self.admin_manager = AdminManager(self.db, self.expiry_sweeper, self.limit_reset,
+                                          self.config, self.rate_limiter)
+        
+        self.subscription_verifier = None
+        if Settings.SUBSCRIPTION_CHECK:
+            self.subscription_verifier = SubscriptionVerifier(
+                self.db,
+                lambda channel_id, user_id: self.bot.get_chat_member(channel_id, user_id).status,
+                lambda: self.config.get().required_channels,
+                positive_ttl=Settings.SUBSCRIPTION_POSITIVE_TTL,
+                negative_ttl=Settings.SUBSCRIPTION_NEGATIVE_TTL,
+                max_workers=Settings.SUBSCRIPTION_WORKERS
+            )
+            self.subscription_verifier.start()
+        
+        self.webhook = None
         
         # Register all handlers
-        register_handlers(self.bot, self.db, self.user_manager, self.admin_manager)
+        register_handlers(self.bot, self.db, self.user_manager, self.admin_manager,
+                          self.rate_limiter, self.subscription_verifier)
         
         print("✅ Bot initialized successfully")
     
     def run(self):
-        """Start the bot"""
-        print("🚀 Starting bot polling...")
+        """Start the bot (webhook if WEBHOOK_URL is set, else polling)"""
+        mode = "webhook" if Settings.WEBHOOK_URL else "polling"
+        print(f"🚀 Starting bot {mode}...")
         print(f"📅 Started at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         print("📱 Bot is now running. Press Ctrl+C to stop.")
         
+        if Settings.WEBHOOK_URL:
+            self.webhook = WebhookServer(
+                self.bot,
+                Settings.WEBHOOK_URL,
+                host=Settings.WEBHOOK_HOST,
+                port=Settings.WEBHOOK_PORT,
+                path=Settings.WEBHOOK_PATH,
+                secret_token=Settings.WEBHOOK_SECRET,
+                workers=Settings.WEBHOOK_WORKERS,
+                queue_size=Settings.WEBHOOK_QUEUE_SIZE,
+                ssl_cert=Settings.WEBHOOK_SSL_CERT,
+                http_threads=Settings.WEBHOOK_HTTP_THREADS,
+                dispatcher=self.dispatcher
+            )
+            self.webhook.run()
+            return
+        
         # Start polling
+        self.bot.remove_webhook()
         self.bot.infinity_polling(timeout=20, long_polling_timeout=20)
     
     def stop(self):
         """Stop the bot gracefully"""
         print("🛑 Stopping bot...")
+        if self.webhook:
+            self.webhook.stop()
+        if self.dispatcher:
+            self.dispatcher.stop()
+        self.number_pool.stop()
+        self.config.stop()
+        if self.subscription_verifier:
+            self.subscription_verifier.stop()
+        if self.rate_limiter:
+            self.rate_limiter.stop()
+        self.expiry_sweeper.stop()
+        if self.limit_reset:
+            self.limit_reset.stop()
+        if self.archive:
+            self.archive.stop()
+        if self.number_index:
+            self.number_index.checkpoint(self.db)
+            self.number_index.close()
         self.db.close()
         print("👋 Bot stopped successfully")
\ No newline at end of file
@@ -0,0 +1,107 @@
+"""
+In-process LRU cache with TTL
+
+Read-through fills race with writers: a row read before a commit can be
+stored after the writer's invalidate. Writers (set, invalidate) bump a
+version; a reader takes version(key) before its query and stores with
+set_if_unchanged, which drops the value if a writer touched the key in
+between. Versions live in a fixed number of stripes, so memory stays
+bounded; a stripe collision only costs a skipped fill.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional
+
+VERSION_STRIPES = 1024
+
+class TTLCache:
+    def __init__(self, maxsize: int = 10000, ttl: float = 300):
+        """Initialize cache holding up to `maxsize` entries for `ttl` seconds"""
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._versions = [0] * VERSION_STRIPES
+        self.hits = 0
+        self.misses = 0
+        self.dropped_fills = 0
+    
+    def get(self, key) -> Optional[Any]:
+        """Get a live entry, or None on miss"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < now:
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+    
+    def version(self, key) -> int:
+        """Write version of key, taken before a read-through query"""
+        with self._lock:
+            return self._versions[hash(key) % VERSION_STRIPES]
+    
+    def _bump(self, key):
+        """Record a write to key (caller holds lock)"""
+        self._versions[hash(key) % VERSION_STRIPES] += 1
+    
+    def _store(self, key, value):
+        """Insert and evict (caller holds lock)"""
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+    
+    def set(self, key, value):
+        """Store an entry written by a writer, evicting the least recently used if full"""
+        with self._lock:
+            self._bump(key)
+            if self.maxsize > 0:
+                self._store(key, value)
+    
+    def set_if_unchanged(self, key, value, version: int) -> bool:
+        """Store a read-through value unless a writer touched key since version"""
+        with self._lock:
+            if self._versions[hash(key) % VERSION_STRIPES] != version:
+                self.dropped_fills += 1
+                return False
+            if self.maxsize > 0:
+                self._store(key, value)
+            return True
+    
+    def invalidate(self, key):
+        """Drop an entry"""
+        with self._lock:
+            self._bump(key)
+            self._data.pop(key, None)
+    
+    def invalidate_many(self, keys: Iterable):
+        """Drop several entries"""
+        with self._lock:
+            for key in keys:
+                self._bump(key)
+                self._data.pop(key, None)
+    
+    def clear(self):
+        """Drop every entry"""
+        with self._lock:
+            self._versions = [version + 1 for version in self._versions]
+            self._data.clear()
+    
+    def get_stats(self) -> Dict:
+        """Get size and hit-rate counters"""
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'hits': self.hits,
+            'misses': self.misses,
+            'dropped_fills': self.dropped_fills,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
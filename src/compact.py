@@ -0,0 +1,220 @@
+"""
+Compact numbers_history layout
+
+Legacy rows keep phone_number, otp_code and app_name as TEXT. The compact
+layout stores the number as INTEGER digits (country code included, "+"
+dropped), the OTP as INTEGER plus its length (leading zeros), and app_name
+as an id into the small app_names table. DatabaseManager detects the
+layout at startup and converts at its boundary, so callers still see
+strings.
+
+Convert an existing database (bot stopped) with:
+    python -m src.compact convert [database/numbers.db] [archive_dir] [shards]
+archive_dir defaults to ARCHIVE_DIR: archives must share the hot layout,
+the bot refuses to start otherwise.
+"""
+
+import glob
+import os
+import sqlite3
+import sys
+from typing import Dict, Optional
+
+COMPACT_TABLE = '''
+CREATE TABLE {name} (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER,
+    phone_number INTEGER UNIQUE,
+    otp_code INTEGER,
+    otp_length INTEGER,
+    app_id INTEGER REFERENCES app_names(id),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP DEFAULT (datetime('now', '+24 hours')),
+    is_used BOOLEAN DEFAULT 0,
+    used_at TIMESTAMP,
+    is_expired BOOLEAN DEFAULT 0,
+    FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+)
+'''
+
+COPY_ROWS = '''
+INSERT INTO numbers_history_compact
+(id, user_id, phone_number, otp_code, otp_length, app_id,
+ created_at, expires_at, is_used, used_at, is_expired)
+SELECT h.id, h.user_id,
+       CAST(ltrim(h.phone_number, '+') AS INTEGER),
+       CAST(h.otp_code AS INTEGER), length(h.otp_code),
+       a.id, h.created_at, h.expires_at, h.is_used, h.used_at, h.is_expired
+FROM numbers_history h
+LEFT JOIN {apps} a ON a.name = COALESCE(h.app_name, 'Unknown')
+'''
+
+def encode_phone(phone: str) -> int:
+    """'+917012345678' -> 917012345678"""
+    return int(phone.lstrip('+'))
+
+def decode_phone(value) -> Optional[str]:
+    """917012345678 -> '+917012345678' (legacy TEXT passes through)"""
+    return f"+{value}" if isinstance(value, int) else value
+
+def encode_otp(otp: str) -> tuple:
+    """'004213' -> (4213, 6)"""
+    return int(otp), len(otp)
+
+def decode_otp(value, length: Optional[int]) -> Optional[str]:
+    """(4213, 6) -> '004213' (legacy TEXT passes through)"""
+    if not isinstance(value, int):
+        return value
+    return str(value).zfill(length or 0)
+
+def is_compact(conn) -> bool:
+    """Check whether numbers_history uses the compact layout"""
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(numbers_history)")]
+    return 'app_id' in columns
+
+def _rebuild(conn, apps: str):
+    """Swap numbers_history for a compact copy, keeping indexes and views"""
+    indexes = [row[0] for row in conn.execute('''
+    SELECT sql FROM sqlite_master
+    WHERE type = 'index' AND tbl_name = 'numbers_history' AND sql IS NOT NULL
+    ''')]
+    # Views may select from numbers_history; recreated once it is back
+    views = conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'view'").fetchall()
+    sequence = conn.execute('''
+    SELECT seq FROM sqlite_sequence WHERE name = 'numbers_history'
+    ''').fetchone()
+    
+    conn.execute(COMPACT_TABLE.format(name='numbers_history_compact'))
+    conn.execute(COPY_ROWS.format(apps=apps))
+    for name, _ in views:
+        conn.execute(f'DROP VIEW "{name}"')
+    conn.execute('DROP TABLE numbers_history')
+    conn.execute('ALTER TABLE numbers_history_compact RENAME TO numbers_history')
+    for sql in indexes:
+        conn.execute(sql)
+    for _, sql in views:
+        conn.execute(sql)
+    
+    # Never hand out an id an archived or deleted row already had
+    if sequence:
+        conn.execute('''
+        UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'numbers_history'
+        ''', (sequence[0],))
+
+def _map_apps(conn, app_ids: Dict[str, int]):
+    """Temp table of the main file's app ids, for _rebuild on another file"""
+    conn.execute('CREATE TEMP TABLE app_map (id INTEGER, name TEXT PRIMARY KEY)')
+    conn.executemany('INSERT INTO app_map (id, name) VALUES (?, ?)',
+                     [(app_id, name) for name, app_id in app_ids.items()])
+
+def convert(db, archive_dir: Optional[str] = None) -> Dict[str, int]:
+    """Convert the hot database and any archives to the compact layout
+    
+    Each shard's table is rebuilt in one writer transaction; each archive
+    file in its own. Already compact files are skipped, so it can be re-run.
+    """
+    archives = []
+    if archive_dir:
+        archives = sorted(glob.glob(os.path.join(archive_dir, "numbers_*.db")))
+    
+    # Every app name, from shards and archives, gets its id in the main file
+    names = set()
+    for connections in db.storage.shards:
+        if not connections.write(is_compact):
+            names.update(row[0] for row in connections.fetchall('''
+            SELECT DISTINCT COALESCE(app_name, 'Unknown') FROM numbers_history
+            '''))
+    for path in archives:
+        conn = sqlite3.connect(path)
+        try:
+            if not is_compact(conn):
+                names.update(row[0] for row in conn.execute('''
+                SELECT DISTINCT COALESCE(app_name, 'Unknown') FROM numbers_history
+                '''))
+        finally:
+            conn.close()
+    
+    db.connections.write(lambda conn: conn.executemany(
+        'INSERT OR IGNORE INTO app_names (name) VALUES (?)', [(name,) for name in names]
+    ))
+    app_ids = {row[1]: row[0] for row in db.fetchall('SELECT id, name FROM app_names')}
+    
+    def convert_hot(conn):
+        if is_compact(conn):
+            return 0
+        _map_apps(conn, app_ids)
+        _rebuild(conn, 'temp.app_map')
+        conn.execute('DROP TABLE temp.app_map')
+        return conn.execute('SELECT COUNT(*) FROM numbers_history').fetchone()[0]
+    
+    converted = {}
+    for number, connections in enumerate(db.storage.shards):
+        name = f"numbers_history (shard {number})" if db.storage.sharded else 'numbers_history'
+        converted[name] = connections.write(convert_hot)
+    
+    for path in archives:
+        conn = sqlite3.connect(path, isolation_level=None)
+        try:
+            if is_compact(conn):
+                continue
+            conn.execute('BEGIN IMMEDIATE')
+            _map_apps(conn, app_ids)
+            _rebuild(conn, 'temp.app_map')
+            converted[os.path.basename(path)] = conn.execute(
+                'SELECT COUNT(*) FROM numbers_history'
+            ).fetchone()[0]
+            conn.execute('COMMIT')
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+    
+    db.reload_layout()
+    return converted
+
+def _size(path: str) -> int:
+    """File size including a WAL file, if any"""
+    return sum(os.path.getsize(p) for p in (path, path + "-wal") if os.path.exists(p))
+
+def main(argv=None):
+    """Command line entry point"""
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] != 'convert':
+        print("Usage: python -m src.compact convert [db_path] [archive_dir] [shards]")
+        return 1
+    
+    from config.settings import Settings
+    from .database import DatabaseManager
+    
+    db_path = argv[1] if len(argv) > 1 else "database/numbers.db"
+    archive_dir = argv[2] if len(argv) > 2 else Settings.ARCHIVE_DIR
+    
+    db = DatabaseManager(db_path, shards=int(argv[3]) if len(argv) > 3 else 1)
+    paths = [connections.db_path for connections in db.storage.managers()]
+    before = sum(_size(path) for path in paths)
+    try:
+        converted = convert(db, archive_dir or None)
+    finally:
+        db.close()
+    
+    # Hand the freed pages back to the filesystem
+    if archive_dir:
+        paths_to_vacuum = paths + sorted(glob.glob(os.path.join(archive_dir, "numbers_*.db")))
+    else:
+        paths_to_vacuum = paths
+    for path in paths_to_vacuum:
+        conn = sqlite3.connect(path)
+        try:
+            conn.execute('VACUUM')
+        finally:
+            conn.close()
+    
+    for name, rows in converted.items():
+        print(f"✅ {name}: {rows:,} rows converted")
+    print(f"📦 {db_path}: {before:,} -> {sum(_size(path) for path in paths):,} bytes")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
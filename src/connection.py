@@ -0,0 +1,272 @@
+"""
+SQLite connection layer: WAL, per-thread readers, single writer thread
+"""
+
+import sqlite3
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Any, List, Optional, Dict
+
+class ConnectionManager:
+    # Open managers per database file, so file-level tools (restore) can
+    # tell the bot is still using it
+    _open_paths: Dict[str, int] = {}
+    _open_lock = threading.Lock()
+    
+    @classmethod
+    def is_open(cls, db_path: str) -> bool:
+        """Check whether a manager in this process has db_path open"""
+        with cls._open_lock:
+            return cls._open_paths.get(os.path.abspath(db_path), 0) > 0
+    
+    def __init__(self, db_path: str, mmap_size: int = 256 * 1024 * 1024,
+                 cache_size_kb: int = 64 * 1024, busy_timeout_ms: int = 5000,
+                 group_commit: bool = False, group_window_ms: float = 5,
+                 group_max_ops: int = 100):
+        """Open the writer connection and start the writer thread"""
+        if db_path == ":memory:":
+            raise ValueError("ConnectionManager needs a database file (WAL readers)")
+        
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self.db_path = db_path
+        self.mmap_size = mmap_size
+        self.cache_size_kb = cache_size_kb
+        self.busy_timeout_ms = busy_timeout_ms
+        
+        # Group commit: everything queued within the window (or up to
+        # group_max_ops jobs) shares one transaction and one fsync
+        self.group_commit = group_commit
+        self.group_window = group_window_ms / 1000.0
+        self.group_max_ops = max(1, group_max_ops)
+        self._metrics = {
+            'batches': 0,
+            'operations': 0,
+            'max_batch_size': 0,
+            'last_batch_size': 0,
+            'commit_ms_total': 0.0,
+            'max_commit_ms': 0.0,
+            'wait_ms_total': 0.0,
+            'max_wait_ms': 0.0
+        }
+        self._metrics_lock = threading.Lock()
+        
+        self._trace = None
+        self._local = threading.local()
+        self._readers = []
+        self._readers_lock = threading.Lock()
+        
+        self._writer_conn = self._connect()
+        self._writer_conn.execute("PRAGMA journal_mode=WAL")
+        self._writes = queue.Queue()
+        self._writer = threading.Thread(target=self._run_writer, name="db-writer", daemon=True)
+        self._writer.start()
+        
+        self._closed = False
+        with self._open_lock:
+            path = os.path.abspath(db_path)
+            self._open_paths[path] = self._open_paths.get(path, 0) + 1
+    
+    def _connect(self, readonly: bool = False) -> sqlite3.Connection:
+        """Open a tuned connection"""
+        # Autocommit mode; the writer issues BEGIN/COMMIT itself
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+        conn.execute(f"PRAGMA cache_size={-int(self.cache_size_kb)}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        if readonly:
+            conn.execute("PRAGMA query_only=1")
+        conn.set_trace_callback(self._trace)
+        return conn
+    
+    def set_trace_callback(self, callback: Optional[Callable[[str], None]]):
+        """Pass every statement run on the writer and readers to callback"""
+        self._trace = callback
+        self._writer_conn.set_trace_callback(callback)
+        with self._readers_lock:
+            for conn in self._readers:
+                conn.set_trace_callback(callback)
+    
+    # Reads
+    
+    def reader(self) -> sqlite3.Connection:
+        """Get this thread's reader connection"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._connect(readonly=True)
+            self._local.conn = conn
+            with self._readers_lock:
+                self._readers.append(conn)
+        return conn
+    
+    def open_reader(self) -> sqlite3.Connection:
+        """Open a private read-only connection (caller closes it)"""
+        return self._connect(readonly=True)
+    
+    def fetchone(self, sql: str, params=()) -> Optional[sqlite3.Row]:
+        """Run a read query, return first row"""
+        return self.reader().execute(sql, params).fetchone()
+    
+    def fetchall(self, sql: str, params=()) -> List[sqlite3.Row]:
+        """Run a read query, return all rows"""
+        return self.reader().execute(sql, params).fetchall()
+    
+    # Writes
+    
+    def submit(self, fn: Callable[[sqlite3.Connection], Any]) -> Future:
+        """Queue fn(conn) to run in its own transaction on the writer thread"""
+        future = Future()
+        if threading.current_thread() is self._writer:
+            # Nested write from inside a write job: already in a transaction
+            try:
+                future.set_result(fn(self._writer_conn))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        
+        self._writes.put((fn, future, time.monotonic()))
+        return future
+    
+    def write(self, fn: Callable[[sqlite3.Connection], Any], wait: bool = True) -> Any:
+        """Run fn(conn) on the writer thread
+        
+        With wait=True (default) blocks until the transaction is durable and
+        returns fn's result; with wait=False returns the Future immediately.
+        """
+        future = self.submit(fn)
+        if not wait:
+            future.add_done_callback(self._report_failure)
+            return future
+        return future.result()
+    
+    @staticmethod
+    def _report_failure(future: Future):
+        """Surface errors of writes nobody waits for"""
+        if not future.cancelled() and future.exception() is not None:
+            print(f"❌ Background write failed: {future.exception()}")
+    
+    def execute(self, sql: str, params=(), wait: bool = True) -> Any:
+        """Run a single write statement, return affected rows"""
+        return self.write(lambda conn: conn.execute(sql, params).rowcount, wait=wait)
+    
+    def _run_writer(self):
+        """Writer thread loop"""
+        stopping = False
+        while not stopping:
+            job = self._writes.get()
+            if job is None:
+                break
+            
+            batch = [job]
+            if self.group_commit:
+                deadline = time.monotonic() + self.group_window
+                while len(batch) < self.group_max_ops:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    try:
+                        job = self._writes.get(timeout=timeout)
+                    except queue.Empty:
+                        break
+                    if job is None:
+                        stopping = True
+                        break
+                    batch.append(job)
+            
+            self._commit_batch(batch)
+    
+    def _commit_batch(self, batch: List):
+        """Run queued jobs in one transaction, each under its own savepoint"""
+        conn = self._writer_conn
+        jobs = [job for job in batch if job[1].set_running_or_notify_cancel()]
+        if not jobs:
+            return
+        
+        outcomes = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for fn, future, _ in jobs:
+                # A failing job only rolls back its own changes
+                conn.execute("SAVEPOINT job")
+                try:
+                    outcomes.append((future, fn(conn), None))
+                    conn.execute("RELEASE job")
+                except Exception as e:
+                    conn.execute("ROLLBACK TO job")
+                    conn.execute("RELEASE job")
+                    outcomes.append((future, None, e))
+            
+            commit_start = time.monotonic()
+            conn.execute("COMMIT")
+            committed = time.monotonic()
+        except BaseException as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            for _, future, _ in jobs:
+                future.set_exception(e)
+            return
+        
+        self._record_batch(jobs, (committed - commit_start) * 1000, committed)
+        for future, result, error in outcomes:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+    
+    def _record_batch(self, jobs: List, commit_ms: float, committed: float):
+        """Update batch size and latency counters"""
+        wait_ms = (committed - min(job[2] for job in jobs)) * 1000
+        with self._metrics_lock:
+            metrics = self._metrics
+            metrics['batches'] += 1
+            metrics['operations'] += len(jobs)
+            metrics['last_batch_size'] = len(jobs)
+            metrics['max_batch_size'] = max(metrics['max_batch_size'], len(jobs))
+            metrics['commit_ms_total'] += commit_ms
+            metrics['max_commit_ms'] = max(metrics['max_commit_ms'], commit_ms)
+            metrics['wait_ms_total'] += wait_ms
+            metrics['max_wait_ms'] = max(metrics['max_wait_ms'], wait_ms)
+    
+    def get_metrics(self) -> Dict:
+        """Get writer statistics (batch size, commit latency, queue depth)"""
+        with self._metrics_lock:
+            metrics = dict(self._metrics)
+        
+        batches = metrics['batches'] or 1
+        return {
+            'group_commit': self.group_commit,
+            'queue_depth': self._writes.qsize(),
+            'batches': metrics['batches'],
+            'operations': metrics['operations'],
+            'avg_batch_size': metrics['operations'] / batches,
+            'max_batch_size': metrics['max_batch_size'],
+            'last_batch_size': metrics['last_batch_size'],
+            'avg_commit_ms': metrics['commit_ms_total'] / batches,
+            'max_commit_ms': metrics['max_commit_ms'],
+            # Oldest job in a batch: enqueue until durable
+            'avg_wait_ms': metrics['wait_ms_total'] / batches,
+            'max_wait_ms': metrics['max_wait_ms']
+        }
+    
+    def close(self):
+        """Drain pending writes and close all connections"""
+        if self._writer.is_alive():
+            self._writes.put(None)
+            self._writer.join()
+        
+        self._writer_conn.close()
+        with self._readers_lock:
+            for conn in self._readers:
+                conn.close()
+            self._readers.clear()
+        
+        with self._open_lock:
+            if not self._closed:
+                self._closed = True
+                path = os.path.abspath(self.db_path)
+                self._open_paths[path] -= 1
@@ -1,119 +1,221 @@
 import sqlite3
 import json
 import os
+import time
 from datetime import datetime
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Callable, Iterable
+
+from .cache import TTLCache
+from .storage import open_storage
+from .migrations import MigrationRunner
+from .stats import record_stats
+from .compact import is_compact, encode_phone, decode_phone, encode_otp, decode_otp
+
+# reserve_number, _touch_user and the limit reset use INSERT/UPDATE ... RETURNING
+MIN_SQLITE_VERSION = (3, 35, 0)
 
 class DatabaseManager:
-    def __init__(self, db_path: str = "database/numbers.db"):
+    def __init__(self, db_path: str = "database/numbers.db",
+                 mmap_size: int = 256 * 1024 * 1024, cache_size_kb: int = 64 * 1024,
+                 group_commit: bool = False, group_window_ms: float = 5,
+                 group_max_ops: int = 100, cache_ttl: float = 300,
+                 cache_max_users: int = 10000, shards: int = 1):
         """Initialize database connection"""
-        os.makedirs(os.path.dirname(db_path), exist_ok=True)
-        self.conn = sqlite3.connect(db_path, check_same_thread=False)
-        self.conn.row_factory = sqlite3.Row
-        self.cursor = self.conn.cursor()
-        self.create_tables()
-    
-    def create_tables(self):
-        """Create necessary tables"""
-        # Users table
-        self.cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            user_id INTEGER PRIMARY KEY,
-            username TEXT,
-            first_name TEXT,
-            last_name TEXT,
-            language_code TEXT,
-            is_premium BOOLEAN DEFAULT 0,
-            is_bot BOOLEAN DEFAULT 0,
-            join_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            last_active TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
+        if sqlite3.sqlite_version_info < MIN_SQLITE_VERSION:
+            raise RuntimeError(
+                f"SQLite {sqlite3.sqlite_version} is too old, "
+                f"{'.'.join(map(str, MIN_SQLITE_VERSION))}+ is required (RETURNING); "
+                "use a Python build linked against a newer SQLite"
+            )
         
-        # User limits table
-        self.cursor.execute('''
-        CREATE TABLE IF NOT EXISTS user_limits (
-            user_id INTEGER PRIMARY KEY,
-            max_limit INTEGER DEFAULT 10,
-            used INTEGER DEFAULT 0,
-            remaining INTEGER DEFAULT 10,
-            extra_given INTEGER DEFAULT 0,
-            total_allowed INTEGER GENERATED ALWAYS AS (max_limit + extra_given) VIRTUAL,
-            last_reset TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+        # Reads use per-thread WAL readers, writes go through one writer
+        # thread per file; with shards > 1 per-user tables are split by user_id
+        self.storage = open_storage(
+            db_path,
+            shards,
+            mmap_size=mmap_size,
+            cache_size_kb=cache_size_kb,
+            group_commit=group_commit,
+            group_window_ms=group_window_ms,
+            group_max_ops=group_max_ops
         )
-        ''')
+        # Main file: global tables (admin logs, app names, subscriptions)
+        self.connections = self.storage.main
+        # In group-commit mode activity writes (user upserts, admin logs)
+        # are write-behind: queued without waiting for the fsync
+        self.write_behind = group_commit
         
-        # Numbers history table
-        self.cursor.execute('''
-        CREATE TABLE IF NOT EXISTS numbers_history (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            phone_number TEXT UNIQUE,
-            otp_code TEXT,
-            app_name TEXT DEFAULT 'Unknown',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            expires_at TIMESTAMP DEFAULT (datetime('now', '+24 hours')),
-            is_used BOOLEAN DEFAULT 0,
-            FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
-        )
-        ''')
+        # Read-through caches keyed by user_id; every write path below
+        # updates or drops the affected entries. Quota enforcement itself
+        # never trusts the cache (see reserve_number).
+        self.limits_cache = TTLCache(cache_max_users, cache_ttl)
+        self.profile_cache = TTLCache(cache_max_users, cache_ttl)
         
-        # Admin actions log
-        self.cursor.execute('''
-        CREATE TABLE IF NOT EXISTS admin_logs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            admin_id INTEGER,
-            action TEXT,
-            target_user INTEGER,
-            details TEXT,
-            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-        ''')
+        # NumberArchive holding cold history, set when archival is enabled
+        self.archive = None
+        self.create_tables()
+        self.reload_layout()
+    
+    def create_tables(self):
+        """Create tables and apply pending schema migrations"""
+        for connections in self.storage.managers():
+            MigrationRunner(connections).run()
+    
+    def reload_layout(self):
+        """Detect the numbers_history layout (legacy TEXT or compact)"""
+        self.compact = self.storage.shards[0].write(is_compact)
+        self._app_ids = {}
+        self._app_names = {}
+    
+    def _app_id(self, app_name: str) -> int:
+        """Interned id of an app name (compact layout)"""
+        app_id = self._app_ids.get(app_name)
+        if app_id is None:
+            # Own committed job: a rolled-back caller never leaves a stale id
+            def intern(conn):
+                conn.execute('INSERT OR IGNORE INTO app_names (name) VALUES (?)', (app_name,))
+                return conn.execute('SELECT id FROM app_names WHERE name = ?', (app_name,)).fetchone()[0]
+            
+            app_id = self.connections.write(intern)
+            self._app_ids[app_name] = app_id
+            self._app_names[app_id] = app_name
+        return app_id
+    
+    def _history_insert(self, user_id: int, phone: str, otp: str, app_name: str):
+        """SQL and parameters adding a number in the current layout"""
+        if not self.compact:
+            return ('''
+            INSERT INTO numbers_history (user_id, phone_number, otp_code, app_name)
+            VALUES (?, ?, ?, ?)
+            ''', (user_id, phone, otp, app_name))
         
-        # Subscription tracking
-        self.cursor.execute('''
-        CREATE TABLE IF NOT EXISTS subscriptions (
-            user_id INTEGER,
-            channel_id TEXT,
-            channel_name TEXT,
-            is_subscribed BOOLEAN DEFAULT 0,
-            last_checked TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            PRIMARY KEY (user_id, channel_id)
-        )
-        ''')
+        otp_value, otp_length = encode_otp(otp)
+        return ('''
+        INSERT INTO numbers_history (user_id, phone_number, otp_code, otp_length, app_id)
+        VALUES (?, ?, ?, ?, ?)
+        ''', (user_id, encode_phone(phone), otp_value, otp_length, self._app_id(app_name)))
+    
+    def _decode_history(self, row) -> Dict:
+        """History row as handlers expect it: numbers, OTPs and app as text"""
+        row = dict(row)
+        if 'app_id' in row:
+            app_id = row.pop('app_id')
+            if app_id is not None and app_id not in self._app_names:
+                self._app_names.update(
+                    (r[0], r[1]) for r in self.fetchall('SELECT id, name FROM app_names')
+                )
+            row['phone_number'] = decode_phone(row['phone_number'])
+            row['otp_code'] = decode_otp(row['otp_code'], row.pop('otp_length'))
+            row['app_name'] = self._app_names.get(app_id, 'Unknown')
+        return row
+    
+    def fetchone(self, sql: str, params=()) -> Optional[sqlite3.Row]:
+        """Run a read query on this thread's reader connection (main file)"""
+        return self.connections.fetchone(sql, params)
+    
+    def fetchall(self, sql: str, params=()) -> List[sqlite3.Row]:
+        """Run a read query on this thread's reader connection (main file)"""
+        return self.connections.fetchall(sql, params)
+    
+    def execute(self, sql: str, params=(), wait: bool = True):
+        """Run a write statement through the writer, return affected rows (main file)"""
+        return self.connections.execute(sql, params, wait=wait)
+    
+    def fetchall_for(self, user_id: int, sql: str, params=()) -> List[sqlite3.Row]:
+        """Run a read query on the file holding user's rows"""
+        return self.storage.shard_for(user_id).fetchall(sql, params)
+    
+    def scatter(self, sql: str, params=(), key=None, reverse: bool = False,
+                limit: Optional[int] = None) -> List[sqlite3.Row]:
+        """Run a read query on every file holding user rows, gather the rows
         
-        self.conn.commit()
+        With `key` the per-shard results are merged in that order; `limit`
+        cuts the merged list (each shard's query should carry it too).
+        """
+        rows = []
+        for connections in self.storage.shards:
+            rows.extend(connections.fetchall(sql, params))
+        if key is not None and self.storage.sharded:
+            rows.sort(key=key, reverse=reverse)
+        return rows[:limit] if limit is not None else rows
+    
+    def get_write_metrics(self) -> Dict:
+        """Get writer batch size and commit latency"""
+        return self.storage.get_metrics()
     
     def add_user(self, user_id: int, username: str, first_name: str, 
                  last_name: str = "", language_code: str = "", 
                  is_premium: bool = False, is_bot: bool = False):
         """Add a new user to database"""
-        try:
-            self.cursor.execute('''
+        def insert(conn):
+            cursor = conn.execute('''
             INSERT OR IGNORE INTO users 
             (user_id, username, first_name, last_name, language_code, is_premium, is_bot)
             VALUES (?, ?, ?, ?, ?, ?, ?)
             ''', (user_id, username, first_name, last_name, language_code, is_premium, is_bot))
+            if cursor.rowcount:
+                # Joining counts as today's activity too
+                record_stats(conn, new_users=1, active_users=1)
             
             # Initialize user limits
-            self.cursor.execute('''
+            conn.execute('''
             INSERT OR IGNORE INTO user_limits (user_id) VALUES (?)
             ''', (user_id,))
-            
-            self.conn.commit()
+        
+        try:
+            self.storage.shard_for(user_id).write(insert, wait=not self.write_behind)
             return True
         except Exception as e:
             print(f"Error adding user: {e}")
             return False
     
+    def get_user(self, user_id: int) -> Optional[Dict]:
+        """Get user's profile"""
+        user = self.profile_cache.get(user_id)
+        if user is None:
+            version = self.profile_cache.version(user_id)
+            row = self.storage.shard_for(user_id).fetchone(
+                'SELECT * FROM users WHERE user_id = ?', (user_id,)
+            )
+            if not row:
+                return None
+            user = dict(row)
+            # Dropped if a writer changed the user while we read
+            self.profile_cache.set_if_unchanged(user_id, user, version)
+        return dict(user)
+    
     def get_user_limits(self, user_id: int) -> Optional[Dict]:
         """Get user's number limits"""
-        self.cursor.execute('''
-        SELECT * FROM user_limits WHERE user_id = ?
-        ''', (user_id,))
-        row = self.cursor.fetchone()
-        return dict(row) if row else None
+        limits = self.limits_cache.get(user_id)
+        if limits is None:
+            version = self.limits_cache.version(user_id)
+            row = self.storage.shard_for(user_id).fetchone('''
+            SELECT * FROM user_limits WHERE user_id = ?
+            ''', (user_id,))
+            if not row:
+                return None
+            limits = dict(row)
+            self.limits_cache.set_if_unchanged(user_id, limits, version)
+        return dict(limits)
+    
+    def invalidate_user(self, user_id: int):
+        """Drop cached limits and profile for user"""
+        self.limits_cache.invalidate(user_id)
+        self.profile_cache.invalidate(user_id)
+    
+    def get_cache_stats(self) -> Dict:
+        """Get hit-rate counters for the user caches"""
+        return {
+            'limits': self.limits_cache.get_stats(),
+            'profiles': self.profile_cache.get_stats()
+        }
+    
+    def init_user_limits(self, user_id: int) -> Optional[Dict]:
+        """Create default limits for user if missing, return limits"""
+        self.storage.shard_for(user_id).execute(
+            'INSERT OR IGNORE INTO user_limits (user_id) VALUES (?)', (user_id,)
+        )
+        return self.get_user_limits(user_id)
     
     def can_get_number(self, user_id: int) -> bool:
         """Check if user can get more numbers"""
@@ -125,15 +227,17 @@ class DatabaseManager:
     
     def add_number_to_history(self, user_id: int, phone: str, otp: str, app_name: str = "Unknown"):
         """Add number to history and update limits"""
-        try:
+        history_sql, history_params = self._history_insert(user_id, phone, otp, app_name)
+        local_claim = self.storage.claim_is_local(phone, user_id)
+        
+        def insert(conn):
             # Add to history
-            self.cursor.execute('''
-            INSERT INTO numbers_history (user_id, phone_number, otp_code, app_name)
-            VALUES (?, ?, ?, ?)
-            ''', (user_id, phone, otp, app_name))
+            if local_claim:
+                self.storage.claim_in(conn, phone, user_id)
+            conn.execute(history_sql, history_params)
             
             # Update limits
-            self.cursor.execute('''
+            conn.execute('''
             UPDATE user_limits 
             SET used = used + 1, 
                 remaining = remaining - 1 
@@ -141,98 +245,432 @@ class DatabaseManager:
             ''', (user_id,))
             
             # Update user activity
-            self.cursor.execute('''
-            UPDATE users 
-            SET last_active = CURRENT_TIMESTAMP 
-            WHERE user_id = ?
-            ''', (user_id,))
-            
-            self.conn.commit()
+            self._touch_user(conn, user_id)
+            record_stats(conn, numbers_generated=1, otps_generated=1)
+        
+        try:
+            if not local_claim:
+                self.storage.claim_number(phone, user_id)
+        except Exception as e:
+            print(f"Error adding number: {e}")
+            return False
+        
+        try:
+            self.storage.shard_for(user_id).write(insert)
             return True
         except Exception as e:
+            if not local_claim:
+                self.storage.release_number(phone, user_id)
             print(f"Error adding number: {e}")
             return False
+        finally:
+            self.invalidate_user(user_id)
+    
+    def reserve_number(self, user_id: int, phone: str, otp: str,
+                       app_name: str = "Unknown") -> Optional[Dict]:
+        """Take one unit of quota and record the number in one transaction
+        
+        Returns the updated limits, or None if the user has no quota left.
+        A duplicate phone number rolls back and re-raises IntegrityError.
+        """
+        history_sql, history_params = self._history_insert(user_id, phone, otp, app_name)
+        local_claim = self.storage.claim_is_local(phone, user_id)
+        
+        def reserve(conn):
+            conn.execute('''
+            INSERT OR IGNORE INTO user_limits (user_id) VALUES (?)
+            ''', (user_id,))
+            
+            # Conditional decrement: no separate limit check, no overdraft
+            row = conn.execute('''
+            UPDATE user_limits
+            SET used = used + 1,
+                remaining = remaining - 1
+            WHERE user_id = ? AND used < max_limit + extra_given
+            RETURNING user_id, max_limit, used, remaining, extra_given,
+                      total_allowed, last_reset
+            ''', (user_id,)).fetchone()
+            
+            if row is None:
+                return None
+            limits = dict(row)
+            
+            if local_claim:
+                self.storage.claim_in(conn, phone, user_id)
+            conn.execute(history_sql, history_params)
+            
+            user = self._touch_user(conn, user_id)
+            record_stats(conn, numbers_generated=1, otps_generated=1)
+            
+            # Runs on the writer thread, so cache updates land in commit order
+            self.limits_cache.set(user_id, limits)
+            if user:
+                self.profile_cache.set(user_id, dict(user))
+            return dict(limits)
+        
+        # Sharded storage: a claim on another shard commits first and is
+        # given back if nothing was written
+        if not local_claim:
+            self.storage.claim_number(phone, user_id)
+        try:
+            limits = self.storage.shard_for(user_id).write(reserve)
+        except Exception:
+            self.invalidate_user(user_id)
+            if not local_claim:
+                self.storage.release_number(phone, user_id)
+            raise
+        if limits is None and not local_claim:
+            self.storage.release_number(phone, user_id)
+        return limits
+    
+    def reconcile_claims(self, window_seconds: int = 3600) -> int:
+        """Release claims whose history row was never written, return count
+        
+        Only a crash between a cross-shard claim and its history write
+        leaves one, so only claims close to the newest are checked. Run
+        before handlers start.
+        """
+        released = 0
+        for phone, user_id in self.storage.recent_claims(window_seconds):
+            stored = encode_phone(phone) if self.compact else phone
+            rows = self.fetchall_for(user_id, '''
+            SELECT 1 FROM numbers_history WHERE phone_number = ?
+            ''', (stored,))
+            if not rows:
+                self.storage.release_number(phone, user_id)
+                released += 1
+        if released:
+            print(f"⚠️ Released {released} number claims left without history")
+        return released
+    
+    @staticmethod
+    def _touch_user(conn, user_id: int) -> Optional[sqlite3.Row]:
+        """Update last_active, counting the user once per day as active"""
+        row = conn.execute('''
+        SELECT last_active >= DATE('now') FROM users WHERE user_id = ?
+        ''', (user_id,)).fetchone()
+        if row is None:
+            return None
+        if not row[0]:
+            record_stats(conn, active_users=1)
+        
+        return conn.execute('''
+        UPDATE users
+        SET last_active = CURRENT_TIMESTAMP
+        WHERE user_id = ?
+        RETURNING *
+        ''', (user_id,)).fetchone()
+    
+    def get_issued_numbers(self, numbers: List[str]) -> set:
+        """Return which of the given numbers already exist in history"""
+        if self.storage.sharded:
+            # Claims are never archived
+            return self.storage.get_claimed(numbers)
+        
+        # Look up stored values, report the caller's strings
+        stored = {encode_phone(number) if self.compact else number: number for number in numbers}
+        keys = list(stored)
+        found = set()
+        # Stay below SQLite's host parameter limit
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            placeholders = ','.join('?' * len(chunk))
+            rows = self.fetchall(f'''
+            SELECT phone_number FROM numbers_history
+            WHERE phone_number IN ({placeholders})
+            ''', chunk)
+            found.update(row[0] for row in rows)
+        
+        if self.archive is not None:
+            remaining = [key for key in keys if key not in found]
+            found |= self.archive.get_issued_numbers(remaining)
+        return {stored[key] for key in found if key in stored}
+    
+    def iter_issued_numbers(self, batch_size: int = 10000):
+        """Iterate over every number in history"""
+        if self.storage.sharded:
+            yield from self.storage.iter_claimed(batch_size)
+            return
+        
+        # Own connection, so a long scan never shares a cursor with handlers
+        conn = self.connections.open_reader()
+        try:
+            cursor = conn.execute('SELECT phone_number FROM numbers_history')
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield decode_phone(row[0])
+        finally:
+            conn.close()
+        
+        if self.archive is not None:
+            for number in self.archive.iter_numbers():
+                yield decode_phone(number)
+    
+    def history_sequences(self) -> List[int]:
+        """Last numbers_history id handed out, per shard (never decreases)"""
+        sequences = []
+        for connections in self.storage.shards:
+            row = connections.fetchone('''
+            SELECT seq FROM sqlite_sequence WHERE name = 'numbers_history'
+            ''')
+            sequences.append(row[0] if row else 0)
+        return sequences
+    
+    def iter_numbers_after(self, sequences: List[int], batch_size: int = 10000):
+        """Iterate over numbers whose history id is above each shard's sequence"""
+        for connections, after in zip(self.storage.shards, sequences):
+            conn = connections.open_reader()
+            try:
+                cursor = conn.execute('''
+                SELECT phone_number FROM numbers_history WHERE id > ?
+                ''', (after,))
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    for row in rows:
+                        yield decode_phone(row[0])
+            finally:
+                conn.close()
     
     def get_user_numbers(self, user_id: int, limit: int = 10) -> List[Dict]:
         """Get user's number history"""
-        self.cursor.execute('''
-        SELECT * FROM numbers_history 
-        WHERE user_id = ? 
-        ORDER BY created_at DESC 
+        return self._history_rows(user_id, limit=limit)
+    
+    def get_active_numbers(self, user_id: int, limit: int = 10) -> List[Dict]:
+        """Get user's numbers that have not expired yet"""
+        rows = self.fetchall_for(user_id, '''
+        SELECT * FROM active_numbers
+        WHERE user_id = ?
+        ORDER BY id DESC
         LIMIT ?
         ''', (user_id, limit))
-        return [dict(row) for row in self.cursor.fetchall()]
+        return [self._decode_history(row) for row in rows]
+    
+    def get_user_numbers_page(self, user_id: int, cursor: Optional[int] = None,
+                              direction: str = "next", page_size: int = 5) -> Dict:
+        """Get one page of user's history, newest first
+        
+        `cursor` is a history id from the current page: "next" returns older
+        rows (id < cursor), "prev" newer rows (id > cursor). Each page is one
+        bounded range read on (user_id, id).
+        """
+        if direction == "prev" and cursor is not None:
+            rows = self._history_rows(user_id, after=cursor, order="ASC", limit=page_size + 1)
+            items = rows[:page_size][::-1]
+            has_newer, has_older = len(rows) > page_size, True
+        else:
+            if cursor is None:
+                rows = self._history_rows(user_id, limit=page_size + 1)
+            else:
+                rows = self._history_rows(user_id, before=cursor, limit=page_size + 1)
+            items = rows[:page_size]
+            has_newer, has_older = cursor is not None, len(rows) > page_size
+        
+        return {
+            'items': items,
+            'has_prev': has_newer and bool(items),
+            'has_next': has_older and bool(items)
+        }
+    
+    def _history_rows(self, user_id: int, before: Optional[int] = None,
+                      after: Optional[int] = None, order: str = "DESC",
+                      limit: int = 10) -> List[Dict]:
+        """Read user's history in id order (before > id > after), continuing into archived months"""
+        where, params = "", ()
+        if before is not None:
+            where, params = "AND id < ?", (before,)
+        elif after is not None:
+            where, params = "AND id > ?", (after,)
+        
+        # id order is insertion order, read straight off (user_id, id)
+        rows = [dict(row) for row in self.fetchall_for(user_id, f'''
+        SELECT * FROM numbers_history
+        WHERE user_id = ? {where}
+        ORDER BY id {order}
+        LIMIT ?
+        ''', (user_id, *params, limit))]
+        
+        # Archived rows are older: needed when a descending read runs out of
+        # hot rows, or an ascending one starts below the newest archived id
+        archived_max = self.archive.archived_max_id(user_id) if self.archive is not None else None
+        if archived_max is not None and (len(rows) < limit if order == "DESC"
+                                         else after is None or after < archived_max):
+            seen = {row['id'] for row in rows}
+            archived = self.archive.get_user_rows(user_id, where, params, order, limit)
+            rows.extend(row for row in archived if row['id'] not in seen)
+            rows.sort(key=lambda row: row['id'], reverse=(order == "DESC"))
+            rows = rows[:limit]
+        return [self._decode_history(row) for row in rows]
     
     def update_user_limit(self, user_id: int, new_limit: int):
         """Update user's max limit (admin only)"""
         try:
-            self.cursor.execute('''
+            self.storage.shard_for(user_id).execute('''
             UPDATE user_limits 
             SET max_limit = ?, 
                 remaining = ? - used 
             WHERE user_id = ?
             ''', (new_limit, new_limit, user_id))
-            
-            self.conn.commit()
             return True
         except Exception as e:
             print(f"Error updating limit: {e}")
             return False
+        finally:
+            self.limits_cache.invalidate(user_id)
     
     def add_extra_numbers(self, user_id: int, extra: int):
         """Add extra numbers to user (admin only)"""
         try:
-            self.cursor.execute('''
+            self.storage.shard_for(user_id).execute('''
             UPDATE user_limits 
             SET extra_given = extra_given + ?, 
                 remaining = remaining + ? 
             WHERE user_id = ?
             ''', (extra, extra, user_id))
-            
-            self.conn.commit()
             return True
         except Exception as e:
             print(f"Error adding extra: {e}")
             return False
+        finally:
+            self.limits_cache.invalidate(user_id)
+    
+    def reset_user_limits(self, user_id: int) -> bool:
+        """Reset user's used count (admin only)"""
+        try:
+            self.storage.shard_for(user_id).execute('''
+            UPDATE user_limits
+            SET used = 0,
+                remaining = max_limit + extra_given
+            WHERE user_id = ?
+            ''', (user_id,))
+            return True
+        except Exception as e:
+            print(f"Error resetting limits: {e}")
+            return False
+        finally:
+            self.limits_cache.invalidate(user_id)
+    
+    def bulk_update_limits(self, user_ids: Iterable[int], assignments: str, params=(),
+                           chunk_size: int = 500,
+                           progress: Optional[Callable[[Dict], None]] = None,
+                           on_chunk: Optional[Callable[[List[int]], None]] = None) -> Dict:
+        """Apply `UPDATE user_limits SET <assignments>` to many users
+        
+        Users are grouped per shard and updated chunk_size at a time, one
+        set-based statement and one short writer transaction per chunk, so
+        handler writes queued meanwhile get the writer between chunks.
+        on_chunk receives the ids each chunk actually updated.
+        """
+        chunk_size = max(1, min(chunk_size, 900))
+        result = {'processed': 0, 'updated': 0, 'chunks': 0, 'max_chunk_ms': 0.0}
+        
+        def flush(connections, chunk: List[int]):
+            def update(conn):
+                started = time.monotonic()
+                rows = conn.execute(f'''
+                UPDATE user_limits
+                SET {assignments}
+                WHERE user_id IN ({', '.join('?' * len(chunk))})
+                RETURNING user_id
+                ''', (*params, *chunk)).fetchall()
+                return [row[0] for row in rows], (time.monotonic() - started) * 1000
+            
+            try:
+                updated, chunk_ms = connections.write(update)
+            finally:
+                for user_id in chunk:
+                    self.limits_cache.invalidate(user_id)
+            
+            result['processed'] += len(chunk)
+            result['updated'] += len(updated)
+            result['chunks'] += 1
+            result['max_chunk_ms'] = max(result['max_chunk_ms'], chunk_ms)
+            if on_chunk and updated:
+                on_chunk(updated)
+            if progress:
+                progress(dict(result))
+        
+        pending = {}
+        seen = set()
+        for user_id in user_ids:
+            if user_id in seen:
+                continue
+            seen.add(user_id)
+            connections = self.storage.shard_for(user_id)
+            chunk = pending.setdefault(connections, [])
+            chunk.append(user_id)
+            if len(chunk) >= chunk_size:
+                flush(connections, pending.pop(connections))
+        
+        for connections, chunk in pending.items():
+            flush(connections, chunk)
+        return result
+    
+    def add_admin_log(self, admin_id: int, action: str, target_user: int, details: str = ""):
+        """Log admin action"""
+        def insert(conn):
+            conn.execute('''
+            INSERT INTO admin_logs (admin_id, action, target_user, details)
+            VALUES (?, ?, ?, ?)
+            ''', (admin_id, action, target_user, details))
+            record_stats(conn, admin_actions=1)
+        
+        self.connections.write(insert, wait=not self.write_behind)
+    
+    def add_admin_logs(self, entries: List[tuple]):
+        """Log many admin actions in one transaction
+        
+        entries are (admin_id, action, target_user, details) tuples.
+        """
+        if not entries:
+            return
+        
+        def insert(conn):
+            conn.executemany('''
+            INSERT INTO admin_logs (admin_id, action, target_user, details)
+            VALUES (?, ?, ?, ?)
+            ''', entries)
+            record_stats(conn, admin_actions=len(entries))
+        
+        self.connections.write(insert, wait=not self.write_behind)
     
     def get_stats(self) -> Dict:
         """Get bot statistics"""
         stats = {}
         
-        # Total users
-        self.cursor.execute('SELECT COUNT(*) FROM users')
-        stats['total_users'] = self.cursor.fetchone()[0]
-        
-        # Active today
-        self.cursor.execute('''
-        SELECT COUNT(*) FROM users 
-        WHERE DATE(last_active) = DATE('now')
+        # Totals and today's counts come from the daily rollups, which
+        # each shard keeps for its own users: sums are exact
+        rows = self.scatter('''
+        SELECT COALESCE(SUM(new_users), 0),
+               COALESCE(SUM(numbers_generated), 0)
+        FROM bot_stats
         ''')
-        stats['active_today'] = self.cursor.fetchone()[0]
-        
-        # Total numbers generated
-        self.cursor.execute('SELECT COUNT(*) FROM numbers_history')
-        stats['total_numbers'] = self.cursor.fetchone()[0]
+        stats['total_users'] = sum(row[0] for row in rows)
+        stats['total_numbers'] = sum(row[1] for row in rows)
         
-        # Numbers today
-        self.cursor.execute('''
-        SELECT COUNT(*) FROM numbers_history 
-        WHERE DATE(created_at) = DATE('now')
+        rows = self.scatter('''
+        SELECT active_users, numbers_generated FROM bot_stats
+        WHERE date = DATE('now')
         ''')
-        stats['numbers_today'] = self.cursor.fetchone()[0]
+        stats['active_today'] = sum(row[0] for row in rows)
+        stats['numbers_today'] = sum(row[1] for row in rows)
         
-        # Top users
-        self.cursor.execute('''
+        # Top users: each shard's top 5, merged
+        rows = self.scatter('''
         SELECT u.user_id, u.username, ul.used 
         FROM users u 
         JOIN user_limits ul ON u.user_id = ul.user_id 
         ORDER BY ul.used DESC 
         LIMIT 5
-        ''')
-        stats['top_users'] = [dict(row) for row in self.cursor.fetchall()]
+        ''', key=lambda row: row['used'], reverse=True, limit=5)
+        stats['top_users'] = [dict(row) for row in rows]
         
         return stats
     
     def close(self):
         """Close database connection"""
-        self.conn.close()
\ No newline at end of file
+        self.storage.close()
\ No newline at end of file
@@ -0,0 +1,212 @@
+"""
+Per-user update lanes
+
+LaneDispatcher runs updates on N lanes, each a queue with one worker
+thread. An update goes to lane user_id % N, so one user's updates run
+strictly in arrival order (no two requests of the same user race the
+quota checks) while different users run in parallel. LaneTeleBot feeds
+every update from polling or the webhook through a dispatcher.
+
+Neither source ever waits for a full lane: one user flooding their lane
+would otherwise stall the polling thread, and with it every other user.
+Polling drops the update (it was already confirmed to Telegram), the
+webhook answers 503 so Telegram retries it.
+"""
+
+import queue
+import threading
+import time
+from typing import Callable, Dict, List
+
+import telebot
+
+# Update fields that carry the sender, in telebot attribute names
+UPDATE_FIELDS = (
+    'message', 'edited_message', 'callback_query', 'inline_query', 'chosen_inline_result',
+    'shipping_query', 'pre_checkout_query', 'poll_answer', 'my_chat_member', 'chat_member',
+    'chat_join_request', 'channel_post', 'edited_channel_post'
+)
+
+def update_key(update) -> int:
+    """Sender's user id, else the chat id, else the update id"""
+    for field in UPDATE_FIELDS:
+        obj = getattr(update, field, None)
+        if obj is None:
+            continue
+        user = getattr(obj, 'from_user', None) or getattr(obj, 'user', None)
+        if user is not None:
+            return user.id
+        chat = getattr(obj, 'chat', None)
+        if chat is not None:
+            return chat.id
+    return update.update_id
+
+class _Lane:
+    __slots__ = ('index', 'queue', 'thread', 'lock', 'processed', 'errors', 'rejected', 'max_depth',
+                 'total_lag_ms', 'total_handler_ms', 'last_handler_ms', 'max_handler_ms')
+    
+    def __init__(self, index: int, queue_size: int):
+        self.index = index
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.thread = None
+        self.lock = threading.Lock()
+        self.processed = 0
+        self.errors = 0
+        self.rejected = 0
+        self.max_depth = 0
+        self.total_lag_ms = 0.0
+        self.total_handler_ms = 0.0
+        self.last_handler_ms = 0.0
+        self.max_handler_ms = 0.0
+
+class LaneDispatcher:
+    def __init__(self, handle: Callable, lanes: int = 8, queue_size: int = 1000):
+        """Initialize dispatcher; handle(update) runs one update's handlers"""
+        self.handle = handle
+        self._lanes = [_Lane(i, max(1, queue_size)) for i in range(max(1, lanes))]
+        self._started = False
+        self._start_lock = threading.Lock()
+    
+    @property
+    def rejected(self) -> int:
+        """Updates dropped because their lane was full"""
+        total = 0
+        for lane in self._lanes:
+            with lane.lock:
+                total += lane.rejected
+        return total
+    
+    def lane_for(self, update) -> int:
+        """Lane index of an update"""
+        return update_key(update) % len(self._lanes)
+    
+    def submit(self, update, block: bool = True) -> bool:
+        """Queue an update on its lane, return False if it was full
+        
+        block=True waits for room; both update sources pass block=False.
+        """
+        self.start()
+        lane = self._lanes[self.lane_for(update)]
+        try:
+            lane.queue.put((update, time.monotonic()), block=block)
+        except queue.Full:
+            with lane.lock:
+                lane.rejected += 1
+            return False
+        
+        depth = lane.queue.qsize()
+        with lane.lock:
+            lane.max_depth = max(lane.max_depth, depth)
+        return True
+    
+    def _work(self, lane: _Lane):
+        """Lane loop: run this lane's updates one at a time"""
+        while True:
+            item = lane.queue.get()
+            if item is None:
+                break
+            update, queued_at = item
+            started = time.monotonic()
+            try:
+                self.handle(update)
+                failed = False
+            except Exception as e:
+                failed = True
+                print(f"❌ Update {update.update_id} failed on lane {lane.index}: {e}")
+            handler_ms = (time.monotonic() - started) * 1000
+            
+            with lane.lock:
+                lane.processed += 1
+                lane.errors += failed
+                lane.total_lag_ms += (started - queued_at) * 1000
+                lane.total_handler_ms += handler_ms
+                lane.last_handler_ms = handler_ms
+                lane.max_handler_ms = max(lane.max_handler_ms, handler_ms)
+    
+    def start(self):
+        """Start one worker thread per lane"""
+        if self._started:
+            return
+        with self._start_lock:
+            if self._started:
+                return
+            for lane in self._lanes:
+                lane.thread = threading.Thread(target=self._work, args=(lane,),
+                                               name=f"update-lane-{lane.index}", daemon=True)
+                lane.thread.start()
+            self._started = True
+        print(f"✅ Update dispatcher started ({len(self._lanes)} lanes)")
+    
+    def stop(self, timeout: float = 5):
+        """Let lanes finish what is queued, then stop them"""
+        with self._start_lock:
+            if not self._started:
+                return
+            self._started = False
+            for lane in self._lanes:
+                lane.queue.put(None)
+            for lane in self._lanes:
+                lane.thread.join(timeout=timeout)
+                lane.thread = None
+    
+    def get_metrics(self) -> Dict:
+        """Get queue depth and handler latency per lane"""
+        lanes: List[Dict] = []
+        for lane in self._lanes:
+            with lane.lock:
+                processed = lane.processed or 1
+                lanes.append({
+                    'lane': lane.index,
+                    'queue_depth': lane.queue.qsize(),
+                    'max_depth': lane.max_depth,
+                    'processed': lane.processed,
+                    'errors': lane.errors,
+                    'rejected': lane.rejected,
+                    'avg_lag_ms': lane.total_lag_ms / processed,
+                    'avg_handler_ms': lane.total_handler_ms / processed,
+                    'last_handler_ms': lane.last_handler_ms,
+                    'max_handler_ms': lane.max_handler_ms
+                })
+        return {
+            'lanes': lanes,
+            'queue_depth': sum(lane['queue_depth'] for lane in lanes),
+            'processed': sum(lane['processed'] for lane in lanes),
+            'rejected': sum(lane['rejected'] for lane in lanes)
+        }
+
+class LaneTeleBot(telebot.TeleBot):
+    """TeleBot whose updates run on per-user lanes instead of its thread pool"""
+    
+    def __init__(self, token: str, lanes: int = 8, queue_size: int = 1000, **kwargs):
+        # Polling advances last_update_id before lanes run the updates;
+        # the setter below keeps lane threads from moving it back
+        self._last_update_id = 0
+        self._update_id_lock = threading.Lock()
+        kwargs['threaded'] = False  # handlers run inline on the lane thread
+        super().__init__(token, **kwargs)
+        self.dispatcher = LaneDispatcher(self._process_update, lanes, queue_size)
+    
+    @property
+    def last_update_id(self) -> int:
+        return self._last_update_id
+    
+    @last_update_id.setter
+    def last_update_id(self, value: int):
+        with self._update_id_lock:
+            if value > self._last_update_id:
+                self._last_update_id = value
+    
+    def _process_update(self, update):
+        """Run one update's middlewares and handlers (lane thread)"""
+        super().process_new_updates([update])
+    
+    def process_new_updates(self, updates):
+        """Queue updates on their lanes (polling thread)"""
+        for update in updates:
+            self.last_update_id = update.update_id
+            if not self.dispatcher.submit(update, block=False):
+                rejected = self.dispatcher.rejected
+                # First drop and then every 100th, a flood must not flood the log too
+                if rejected == 1 or rejected % 100 == 0:
+                    print(f"⚠️ Lane {self.dispatcher.lane_for(update)} full, dropped update "
+                          f"{update.update_id} ({rejected} dropped so far)")
@@ -0,0 +1,117 @@
+import threading
+import time
+from typing import Dict, Tuple
+
+class ExpirySweeper:
+    def __init__(self, db, interval: float = 60, batch_size: int = 500,
+                 pause: float = 0.05):
+        """Initialize background sweeper flagging expired numbers"""
+        self.db = db
+        self.interval = interval
+        self.batch_size = max(1, batch_size)
+        # Gap between batches so queued handler writes get the writer first
+        self.pause = pause
+        
+        self._stopped = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        
+        # Counters for monitoring
+        self.runs = 0
+        self.batches = 0
+        self.expired = 0
+        self.backlog = 0
+        self.last_batch_ms = 0.0
+        self.max_batch_ms = 0.0
+        self._batch_ms_total = 0.0
+        self.last_run = None
+    
+    def start(self):
+        """Start background sweep worker"""
+        if self._thread and self._thread.is_alive():
+            return
+        
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="expiry-sweeper", daemon=True)
+        self._thread.start()
+        print(f"✅ Expiry sweeper started (every {self.interval}s, batch={self.batch_size})")
+    
+    def stop(self):
+        """Stop background sweep worker"""
+        self._stopped.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+    
+    def _expire_batch(self, conn) -> Tuple[int, float]:
+        """Flag up to batch_size expired rows, return (rows, ms under the lock)"""
+        started = time.monotonic()
+        # Range read on the partial index: only unflagged rows are in it
+        rows = conn.execute('''
+        UPDATE numbers_history
+        SET is_expired = 1
+        WHERE id IN (
+            SELECT id FROM numbers_history
+            WHERE is_expired = 0 AND expires_at <= CURRENT_TIMESTAMP
+            ORDER BY expires_at
+            LIMIT ?
+        )
+        ''', (self.batch_size,)).rowcount
+        return rows, (time.monotonic() - started) * 1000
+    
+    def sweep(self) -> int:
+        """Expire everything due, one short transaction per batch, return rows"""
+        total = 0
+        # Shards have their own writers; each is drained in turn
+        for connections in self.db.storage.shards:
+            while not self._stopped.is_set():
+                rows, batch_ms = connections.write(self._expire_batch)
+                
+                with self._lock:
+                    self.batches += 1
+                    self.expired += rows
+                    self.last_batch_ms = batch_ms
+                    self.max_batch_ms = max(self.max_batch_ms, batch_ms)
+                    self._batch_ms_total += batch_ms
+                
+                total += rows
+                if rows < self.batch_size:
+                    break
+                self._stopped.wait(self.pause)
+        
+        self.backlog = self.get_backlog()
+        self.runs += 1
+        self.last_run = time.time()
+        return total
+    
+    def get_backlog(self) -> int:
+        """Count rows past expiry that are not flagged yet"""
+        return sum(row[0] for row in self.db.scatter('''
+        SELECT COUNT(*) FROM numbers_history
+        WHERE is_expired = 0 AND expires_at <= CURRENT_TIMESTAMP
+        '''))
+    
+    def _run(self):
+        """Background worker loop"""
+        while not self._stopped.is_set():
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"❌ Expiry sweep failed: {e}")
+            self._stopped.wait(self.interval)
+    
+    def get_metrics(self) -> Dict:
+        """Get sweep statistics (per-batch cost, backlog)"""
+        with self._lock:
+            batches = self.batches or 1
+            return {
+                'runs': self.runs,
+                'batches': self.batches,
+                'expired': self.expired,
+                'backlog': self.backlog,
+                'batch_size': self.batch_size,
+                'last_batch_ms': self.last_batch_ms,
+                'avg_batch_ms': self._batch_ms_total / batches,
+                'max_batch_ms': self.max_batch_ms,
+                'last_run': self.last_run
+            }
@@ -0,0 +1,177 @@
+"""
+Scheduled quota resets
+
+Once per period (UTC day, or week starting Monday) every user whose
+last_reset predates the period gets used = 0 again. Users are walked in
+user_id order, one short writer transaction per batch; the batch and the
+progress cursor in limit_reset_progress commit together, so a restarted
+bot resumes where the last committed batch stopped.
+"""
+
+import threading
+import time
+from typing import Dict, List, Tuple
+
+# SQL date a period started on
+PERIODS = {
+    'daily': "DATE('now')",
+    'weekly': "DATE('now', '-6 days', 'weekday 1')"
+}
+
+class LimitResetScheduler:
+    def __init__(self, db, period: str = "daily", interval: float = 300,
+                 batch_size: int = 500, pause: float = 0.05):
+        """Initialize background quota reset worker"""
+        if period not in PERIODS:
+            raise ValueError(f"Unknown reset period: {period} (expected one of {', '.join(PERIODS)})")
+        
+        self.db = db
+        self.period = period
+        self.interval = interval
+        # Stays below SQLite's host parameter limit (and the lock short)
+        self.batch_size = max(1, min(batch_size, 900))
+        # Gap between batches so queued handler writes get the writer first
+        self.pause = pause
+        
+        self._stopped = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        
+        # Counters for monitoring
+        self.runs = 0
+        self.batches = 0
+        self.users_reset = 0
+        self.last_batch_ms = 0.0
+        self.max_batch_ms = 0.0
+        self.last_run = None
+        self.period_start = None
+    
+    def start(self):
+        """Start background reset worker"""
+        if self._thread and self._thread.is_alive():
+            return
+        
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="limit-reset", daemon=True)
+        self._thread.start()
+        print(f"✅ Limit reset scheduler started ({self.period}, batch={self.batch_size})")
+    
+    def stop(self):
+        """Stop background reset worker"""
+        self._stopped.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+    
+    def _reset_batch(self, start: str, cursor: int):
+        """Write job: reset the next batch of due users after cursor"""
+        def reset(conn) -> Tuple[List[int], float]:
+            started = time.monotonic()
+            # Keyset walk on the primary key; users reset this period no
+            # longer match, new users start with a fresh last_reset
+            user_ids = [row[0] for row in conn.execute('''
+            UPDATE user_limits
+            SET used = 0,
+                remaining = max_limit + extra_given,
+                last_reset = CURRENT_TIMESTAMP,
+                reset_count = reset_count + 1
+            WHERE user_id IN (
+                SELECT user_id FROM user_limits
+                WHERE user_id > ? AND last_reset < ?
+                ORDER BY user_id
+                LIMIT ?
+            )
+            RETURNING user_id
+            ''', (cursor, start, self.batch_size))]
+            
+            finished = len(user_ids) < self.batch_size
+            conn.execute('''
+            UPDATE limit_reset_progress
+            SET last_user_id = ?,
+                users_reset = users_reset + ?,
+                finished_at = CASE WHEN ? THEN CURRENT_TIMESTAMP END
+            WHERE period = ?
+            ''', (max(user_ids, default=cursor), len(user_ids), finished, self.period))
+            return user_ids, (time.monotonic() - started) * 1000
+        return reset
+    
+    def _reset_shard(self, connections, start: str) -> int:
+        """Reset due users of one file, resuming from its saved cursor"""
+        state = connections.fetchone('''
+        SELECT period_start, last_user_id, finished_at FROM limit_reset_progress
+        WHERE period = ?
+        ''', (self.period,))
+        if state and state['period_start'] == start:
+            if state['finished_at']:
+                return 0
+            cursor = state['last_user_id']
+        else:
+            cursor = -1
+            connections.write(lambda conn: conn.execute('''
+            INSERT INTO limit_reset_progress (period, period_start, last_user_id, users_reset)
+            VALUES (?, ?, ?, 0)
+            ON CONFLICT(period) DO UPDATE
+            SET period_start = excluded.period_start,
+                last_user_id = excluded.last_user_id,
+                users_reset = 0,
+                started_at = CURRENT_TIMESTAMP,
+                finished_at = NULL
+            ''', (self.period, start, cursor)))
+        
+        total = 0
+        while not self._stopped.is_set():
+            user_ids, batch_ms = connections.write(self._reset_batch(start, cursor))
+            # After commit, so a handler re-reading the limits sees the reset
+            for user_id in user_ids:
+                self.db.limits_cache.invalidate(user_id)
+            
+            with self._lock:
+                self.batches += 1
+                self.users_reset += len(user_ids)
+                self.last_batch_ms = batch_ms
+                self.max_batch_ms = max(self.max_batch_ms, batch_ms)
+            
+            total += len(user_ids)
+            if len(user_ids) < self.batch_size:
+                break
+            cursor = max(user_ids)
+            self._stopped.wait(self.pause)
+        return total
+    
+    def run_due(self) -> int:
+        """Reset every user due in the current period, return users reset"""
+        total = 0
+        for connections in self.db.storage.shards:
+            start = connections.fetchone(f"SELECT {PERIODS[self.period]}")[0]
+            self.period_start = start
+            total += self._reset_shard(connections, start)
+        
+        self.runs += 1
+        self.last_run = time.time()
+        return total
+    
+    def _run(self):
+        """Background worker loop"""
+        while not self._stopped.is_set():
+            try:
+                reset = self.run_due()
+                if reset:
+                    print(f"🔄 Reset limits of {reset:,} users ({self.period})")
+            except Exception as e:
+                print(f"❌ Limit reset failed: {e}")
+            self._stopped.wait(self.interval)
+    
+    def get_metrics(self) -> Dict:
+        """Get reset statistics (per-batch cost, current period)"""
+        with self._lock:
+            return {
+                'period': self.period,
+                'period_start': self.period_start,
+                'runs': self.runs,
+                'batches': self.batches,
+                'users_reset': self.users_reset,
+                'batch_size': self.batch_size,
+                'last_batch_ms': self.last_batch_ms,
+                'max_batch_ms': self.max_batch_ms,
+                'last_run': self.last_run
+            }
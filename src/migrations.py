@@ -0,0 +1,384 @@
+"""
+Versioned schema migrations
+
+Each migration is a list of steps. Every step runs in its own short write
+transaction on the writer thread, so long operations such as index builds
+never hold the write lock for the whole upgrade; readers keep working
+throughout thanks to WAL. Steps are idempotent, so a migration that was
+interrupted half-way is simply re-run on the next start.
+"""
+
+import logging
+import sqlite3
+from typing import Callable, List, Tuple, Union
+
+from .stats import backfill_rows
+
+logger = logging.getLogger(__name__)
+
+Step = Union[str, Callable]
+
+def add_column(table: str, column: str, declaration: str) -> Callable:
+    """Step that adds a column unless it already exists"""
+    def step(conn):
+        columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+        if column not in columns:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
+    return step
+
+BASELINE = [
+    # Users table
+    '''
+    CREATE TABLE IF NOT EXISTS users (
+        user_id INTEGER PRIMARY KEY,
+        username TEXT,
+        first_name TEXT,
+        last_name TEXT,
+        language_code TEXT,
+        is_premium BOOLEAN DEFAULT 0,
+        is_bot BOOLEAN DEFAULT 0,
+        join_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        last_active TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    
+    # User limits table
+    '''
+    CREATE TABLE IF NOT EXISTS user_limits (
+        user_id INTEGER PRIMARY KEY,
+        max_limit INTEGER DEFAULT 10,
+        used INTEGER DEFAULT 0,
+        remaining INTEGER DEFAULT 10,
+        extra_given INTEGER DEFAULT 0,
+        total_allowed INTEGER GENERATED ALWAYS AS (max_limit + extra_given) VIRTUAL,
+        last_reset TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+    )
+    ''',
+    
+    # Numbers history table
+    '''
+    CREATE TABLE IF NOT EXISTS numbers_history (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        phone_number TEXT UNIQUE,
+        otp_code TEXT,
+        app_name TEXT DEFAULT 'Unknown',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        expires_at TIMESTAMP DEFAULT (datetime('now', '+24 hours')),
+        is_used BOOLEAN DEFAULT 0,
+        FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+    )
+    ''',
+    
+    # Admin actions log
+    '''
+    CREATE TABLE IF NOT EXISTS admin_logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        admin_id INTEGER,
+        action TEXT,
+        target_user INTEGER,
+        details TEXT,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    
+    # Subscription tracking
+    '''
+    CREATE TABLE IF NOT EXISTS subscriptions (
+        user_id INTEGER,
+        channel_id TEXT,
+        channel_name TEXT,
+        is_subscribed BOOLEAN DEFAULT 0,
+        last_checked TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (user_id, channel_id)
+    )
+    '''
+]
+
+# Columns database/schema.sql has that older databases lack
+SCHEMA_COLUMNS = [
+    add_column('users', 'total_numbers', 'INTEGER DEFAULT 0'),
+    add_column('users', 'total_otps', 'INTEGER DEFAULT 0'),
+    add_column('users', 'status', "TEXT DEFAULT 'active' "
+                                  "CHECK (status IN ('active', 'banned', 'premium'))"),
+    add_column('user_limits', 'reset_count', 'INTEGER DEFAULT 0'),
+    add_column('numbers_history', 'used_at', 'TIMESTAMP'),
+    add_column('numbers_history', 'is_expired', 'BOOLEAN DEFAULT 0'),
+    add_column('admin_logs', 'ip_address', 'TEXT'),
+    add_column('admin_logs', 'user_agent', 'TEXT'),
+    add_column('subscriptions', 'channel_type', "TEXT DEFAULT 'telegram'"),
+    add_column('subscriptions', 'check_count', 'INTEGER DEFAULT 0')
+]
+
+SCHEMA_TABLES = [
+    # Bot statistics
+    '''
+    CREATE TABLE IF NOT EXISTS bot_stats (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        date DATE UNIQUE NOT NULL,
+        total_users INTEGER DEFAULT 0,
+        new_users INTEGER DEFAULT 0,
+        active_users INTEGER DEFAULT 0,
+        numbers_generated INTEGER DEFAULT 0,
+        otps_generated INTEGER DEFAULT 0,
+        admin_actions INTEGER DEFAULT 0,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    
+    # Rate limiting
+    '''
+    CREATE TABLE IF NOT EXISTS rate_limits (
+        user_id INTEGER PRIMARY KEY,
+        request_count INTEGER DEFAULT 0,
+        last_request TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        daily_limit INTEGER DEFAULT 100,
+        hourly_limit INTEGER DEFAULT 10,
+        is_blocked BOOLEAN DEFAULT 0,
+        block_reason TEXT,
+        block_until TIMESTAMP
+    )
+    ''',
+    
+    # Backup logs
+    '''
+    CREATE TABLE IF NOT EXISTS backup_logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        backup_type TEXT NOT NULL,
+        file_path TEXT NOT NULL,
+        file_size INTEGER,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        status TEXT DEFAULT 'success',
+        error_message TEXT
+    )
+    '''
+]
+
+# One index per step, so each build holds the write lock only for itself
+SCHEMA_INDEXES = [
+    'CREATE INDEX IF NOT EXISTS idx_users_join_date ON users(join_date)',
+    'CREATE INDEX IF NOT EXISTS idx_users_last_active ON users(last_active)',
+    'CREATE INDEX IF NOT EXISTS idx_numbers_history_user_id ON numbers_history(user_id)',
+    'CREATE INDEX IF NOT EXISTS idx_numbers_history_created_at ON numbers_history(created_at)',
+    'CREATE INDEX IF NOT EXISTS idx_admin_logs_timestamp ON admin_logs(timestamp)',
+    'CREATE INDEX IF NOT EXISTS idx_subscriptions_user_id ON subscriptions(user_id)',
+    'CREATE INDEX IF NOT EXISTS idx_bot_stats_date ON bot_stats(date)',
+    # Sampled statistics: bounded work even on large tables
+    'PRAGMA analysis_limit=1000',
+    'ANALYZE'
+]
+
+# Top users (ORDER BY used DESC LIMIT n) walks this index instead of sorting
+USED_INDEX = [
+    'CREATE INDEX IF NOT EXISTS idx_user_limits_used ON user_limits(used)',
+    'ANALYZE user_limits'
+]
+
+# History pages are keyset ranges on (user_id, id); the composite index
+# also serves plain user_id lookups, so the single-column one goes
+HISTORY_PAGE_INDEX = [
+    'CREATE INDEX IF NOT EXISTS idx_numbers_history_user_id_id ON numbers_history(user_id, id)',
+    'DROP INDEX IF EXISTS idx_numbers_history_user_id'
+]
+
+def create_user_search(conn):
+    """Trigram full-text index over user names, synced by triggers"""
+    try:
+        conn.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS users_fts USING fts5(
+            username, first_name, last_name,
+            content='users', content_rowid='user_id', tokenize='trigram'
+        )
+        ''')
+    except sqlite3.OperationalError as e:
+        # SQLite without FTS5 or trigram (< 3.34): search falls back to LIKE
+        logger.warning(f"User search index unavailable: {e}")
+        return
+    
+    conn.execute('''
+    CREATE TRIGGER IF NOT EXISTS users_fts_insert AFTER INSERT ON users BEGIN
+        INSERT INTO users_fts (rowid, username, first_name, last_name)
+        VALUES (new.user_id, new.username, new.first_name, new.last_name);
+    END
+    ''')
+    conn.execute('''
+    CREATE TRIGGER IF NOT EXISTS users_fts_delete AFTER DELETE ON users BEGIN
+        INSERT INTO users_fts (users_fts, rowid, username, first_name, last_name)
+        VALUES ('delete', old.user_id, old.username, old.first_name, old.last_name);
+    END
+    ''')
+    # Only name changes touch the index, not last_active updates
+    conn.execute('''
+    CREATE TRIGGER IF NOT EXISTS users_fts_update
+    AFTER UPDATE OF username, first_name, last_name ON users BEGIN
+        INSERT INTO users_fts (users_fts, rowid, username, first_name, last_name)
+        VALUES ('delete', old.user_id, old.username, old.first_name, old.last_name);
+        INSERT INTO users_fts (rowid, username, first_name, last_name)
+        VALUES (new.user_id, new.username, new.first_name, new.last_name);
+    END
+    ''')
+    conn.execute("INSERT INTO users_fts (users_fts) VALUES ('rebuild')")
+
+USER_SEARCH = [
+    create_user_search,
+    # Short terms use a prefix LIKE, which needs a case-insensitive index
+    'CREATE INDEX IF NOT EXISTS idx_users_username_nocase ON users(username COLLATE NOCASE)'
+]
+
+# The sweeper reads due rows off a partial index that only holds live
+# rows, so its cost follows the backlog, not the size of history
+EXPIRY = [
+    '''
+    CREATE INDEX IF NOT EXISTS idx_numbers_history_expiring
+    ON numbers_history(expires_at) WHERE is_expired = 0
+    ''',
+    '''
+    CREATE VIEW IF NOT EXISTS active_numbers AS
+    SELECT * FROM numbers_history
+    WHERE is_expired = 0 AND expires_at > CURRENT_TIMESTAMP
+    '''
+]
+
+# Interned app names for the compact numbers_history layout (src/compact.py)
+APP_NAMES = [
+    '''
+    CREATE TABLE IF NOT EXISTS app_names (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL UNIQUE
+    )
+    '''
+]
+
+# Phone number claims of the sharded backend (src/storage.py): the
+# number itself is the rowid, so a claim is one B-tree insert
+NUMBER_CLAIMS = [
+    '''
+    CREATE TABLE IF NOT EXISTS number_claims (
+        phone_number INTEGER PRIMARY KEY,
+        user_id INTEGER NOT NULL,
+        claimed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    '''
+]
+
+# Startup reconciliation (DatabaseManager.reconcile_claims) only looks at
+# the newest claims
+NUMBER_CLAIMS_RECENT = [
+    '''
+    CREATE INDEX IF NOT EXISTS idx_number_claims_claimed_at
+    ON number_claims(claimed_at)
+    '''
+]
+
+# Resume point of the scheduled quota reset (src/limit_reset.py), kept in
+# the same file as the user_limits rows it walks
+LIMIT_RESET_PROGRESS = [
+    '''
+    CREATE TABLE IF NOT EXISTS limit_reset_progress (
+        period TEXT PRIMARY KEY,
+        period_start TEXT NOT NULL,
+        last_user_id INTEGER NOT NULL,
+        users_reset INTEGER DEFAULT 0,
+        started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        finished_at TIMESTAMP
+    )
+    '''
+]
+
+# In-memory rate limiter snapshots (src/rate_limiter.py)
+RATE_LIMIT_WINDOWS = [
+    add_column('rate_limits', 'window_start', 'INTEGER'),
+    add_column('rate_limits', 'window_count', 'INTEGER DEFAULT 0'),
+    add_column('rate_limits', 'day_start', 'INTEGER')
+]
+
+# Which users have archived history (src/archive.py), so history reads
+# only open the monthly archives when they can hold the rows asked for
+ARCHIVED_USERS = [
+    '''
+    CREATE TABLE IF NOT EXISTS archived_users (
+        user_id INTEGER PRIMARY KEY,
+        max_id INTEGER NOT NULL
+    )
+    '''
+]
+
+# get_stats sums bot_stats; fill it from the history databases already hold
+STATS_BACKFILL = [
+    backfill_rows
+]
+
+MIGRATIONS: List[Tuple[int, str, List[Step]]] = [
+    (1, "baseline tables", BASELINE),
+    (2, "schema.sql columns", SCHEMA_COLUMNS),
+    (3, "bot_stats, rate_limits and backup_logs tables", SCHEMA_TABLES),
+    (4, "schema.sql indexes", SCHEMA_INDEXES),
+    (5, "user_limits.used index", USED_INDEX),
+    (6, "numbers_history (user_id, id) index", HISTORY_PAGE_INDEX),
+    (7, "user search index", USER_SEARCH),
+    (8, "expiry index and active_numbers view", EXPIRY),
+    (9, "app_names lookup table", APP_NAMES),
+    (10, "number_claims table", NUMBER_CLAIMS),
+    (11, "limit_reset_progress table", LIMIT_RESET_PROGRESS),
+    (12, "rate_limits window counters", RATE_LIMIT_WINDOWS),
+    (13, "archived_users markers", ARCHIVED_USERS),
+    (14, "bot_stats backfill", STATS_BACKFILL),
+    (15, "number_claims claimed_at index", NUMBER_CLAIMS_RECENT)
+]
+
+class MigrationRunner:
+    def __init__(self, connections, migrations: List[Tuple[int, str, List[Step]]] = None):
+        """Initialize runner for a ConnectionManager"""
+        self.connections = connections
+        self.migrations = sorted(migrations or MIGRATIONS, key=lambda m: m[0])
+    
+    def current_version(self) -> int:
+        """Get highest applied schema version"""
+        return self.connections.write(lambda conn: conn.execute(
+            'SELECT COALESCE(MAX(version), 0) FROM schema_version'
+        ).fetchone()[0])
+    
+    def run(self) -> List[int]:
+        """Apply pending migrations in order, return applied versions"""
+        self.connections.write(lambda conn: conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        '''))
+        
+        current = self.current_version()
+        applied = []
+        for version, description, steps in self.migrations:
+            if version <= current:
+                continue
+            
+            logger.info(f"Applying schema migration {version}: {description} ({len(steps)} steps)")
+            for number, step in enumerate(steps, 1):
+                final = number == len(steps)
+                self.connections.write(self._step(step, version, description, final))
+            applied.append(version)
+        
+        version = self.current_version()
+        if applied:
+            logger.info(f"Database schema migrated to version {version} (applied: {applied})")
+        else:
+            logger.info(f"Database schema up to date at version {version}")
+        return applied
+    
+    @staticmethod
+    def _step(step: Step, version: int, description: str, final: bool) -> Callable:
+        """Wrap a step; the final one also records the version"""
+        def run(conn):
+            if callable(step):
+                step(conn)
+            else:
+                conn.execute(step)
+            if final:
+                conn.execute(
+                    'INSERT INTO schema_version (version, description) VALUES (?, ?)',
+                    (version, description)
+                )
+        return run
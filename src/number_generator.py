@@ -1,12 +1,70 @@
+import os
 import random
 import hashlib
-from datetime import datetime
-from typing import Tuple
+import threading
+from collections import OrderedDict
+from typing import Tuple, List, Iterator
+
+from .number_index import COUNTRY_CODE, SUFFIX_MIN, SUFFIX_SPAN, format_position
+from .otp_engine import OTPEngine
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional, batches fall back to pure Python
+    np = None
+
+class NumberBatch:
+    def __init__(self, numbers, otps, otp_length: int):
+        """Columnar batch of generated pairs
+        
+        `numbers` holds national numbers (prefix + suffix) and `otps` the
+        OTP values, both as integer arrays; strings are only built on demand.
+        """
+        self.numbers = numbers
+        self.otps = otps
+        self.otp_length = otp_length
+    
+    def __len__(self) -> int:
+        return len(self.numbers)
+    
+    def phone_numbers(self) -> List[str]:
+        """Get numbers as display strings"""
+        return [f"{COUNTRY_CODE}{number}" for number in self._values(self.numbers)]
+    
+    def otp_codes(self) -> List[str]:
+        """Get OTPs as zero-padded strings"""
+        template = f"%0{self.otp_length}d"
+        return [template % otp for otp in self._values(self.otps)]
+    
+    def pairs(self) -> List[Tuple[str, str]]:
+        """Get (number, OTP) string pairs"""
+        return list(zip(self.phone_numbers(), self.otp_codes()))
+    
+    def __iter__(self) -> Iterator[Tuple[str, str]]:
+        return iter(self.pairs())
+    
+    @staticmethod
+    def _values(column) -> List[int]:
+        return column.tolist() if hasattr(column, 'tolist') else column
 
 class NumberGenerator:
-    def __init__(self):
+    def __init__(self, index=None, sequencer=None, otp_engine=None,
+                 recent_limit: int = 100000):
         """Initialize number generator"""
-        self.used_numbers = set()
+        # Persistent issued-number bitset; used_numbers is only a fallback
+        # for generators running without an index
+        self.index = index
+        # Optional collision-free counter permutation (sequence mode)
+        self.sequencer = sequencer
+        self.otp_engine = otp_engine or OTPEngine()
+        # Most recent numbers only, so a long-lived generator stays bounded;
+        # older repeats are caught by numbers_history's UNIQUE constraint
+        self.used_numbers = OrderedDict()
+        self.recent_limit = max(1, recent_limit)
+        # Index positions handed out but not yet committed (or released);
+        # their bits are only set by mark_issued
+        self._pending = set()
+        self._pending_lock = threading.Lock()
         
         # Indian mobile number prefixes
         self.prefixes = [
@@ -17,27 +75,145 @@ class NumberGenerator:
     
     def generate_indian_number(self) -> str:
         """Generate a unique Indian virtual number"""
+        if self.sequencer is not None:
+            return self._next_sequenced_number()
+        
         while True:
             prefix = random.choice(self.prefixes)
             suffix = random.randint(10000000, 99999999)
             number = f"+91{prefix}{suffix}"
             
             # Ensure uniqueness
-            if number not in self.used_numbers:
-                self.used_numbers.add(number)
+            if self.index is not None:
+                if number not in self.index and self._reserve([self.index.position(number)]):
+                    return number
+            elif number not in self.used_numbers:
+                self.used_numbers[number] = None
+                if len(self.used_numbers) > self.recent_limit:
+                    self.used_numbers.popitem(last=False)
                 return number
     
-    def generate_otp(self, length: int = 6) -> str:
-        """Generate OTP code"""
-        if length < 4 or length > 8:
-            length = 6
+    def _next_sequenced_number(self) -> str:
+        """Get next number from the sequencer"""
+        while True:
+            number = self.sequencer.next_number()
+            # Sequenced numbers never repeat, but may still collide with
+            # numbers issued earlier in random mode
+            if self.index is None or (number not in self.index
+                                      and self._reserve([self.index.position(number)])):
+                return number
+    
+    def _reserve(self, positions: List[int]) -> List[int]:
+        """Mark positions pending, return those no one else holds"""
+        with self._pending_lock:
+            fresh = [position for position in positions if position not in self._pending]
+            self._pending.update(fresh)
+        return fresh
+    
+    def mark_issued(self, number: str):
+        """Record a number whose history row has committed"""
+        if self.index is None:
+            return
+        position = self.index.position(number)
+        if position is not None:
+            self.index.add_positions([position])
+            with self._pending_lock:
+                self._pending.discard(position)
+    
+    def release(self, number: str):
+        """Give back a number that was handed out but never stored"""
+        if self.index is None:
+            return
+        position = self.index.position(number)
+        with self._pending_lock:
+            self._pending.discard(position)
+    
+    def generate_batch(self, count: int, otp_length: int = None, store=None,
+                       use_numpy: bool = None) -> NumberBatch:
+        """Generate `count` unique number/OTP pairs in one pass
+        
+        Randomness comes from one large os.urandom buffer per round instead of
+        per-call random module draws. Duplicates are removed within the batch,
+        against the index (if any) and against `store` (anything with
+        get_issued_numbers, e.g. DatabaseManager) in bulk.
+        """
+        if use_numpy is None:
+            use_numpy = np is not None
+        use_numpy = use_numpy and np is not None
+        
+        positions = []
+        seen = set()
+        while len(positions) < count:
+            needed = count - len(positions)
+            if self.sequencer is not None:
+                fresh = self.sequencer.next_positions(needed)
+            else:
+                fresh = self._random_below(len(self.prefixes) * SUFFIX_SPAN, needed, use_numpy)
+                fresh = NumberBatch._values(fresh)
+            
+            fresh = [position for position in dict.fromkeys(fresh) if position not in seen]
+            
+            if store is not None:
+                issued = store.get_issued_numbers(
+                    [format_position(self.prefixes, position) for position in fresh]
+                )
+                if issued:
+                    fresh = [p for p in fresh if format_position(self.prefixes, p) not in issued]
+            
+            if self.index is not None:
+                fresh = self._reserve(self.index.unissued_positions(fresh))
+            
+            seen.update(fresh)
+            positions.extend(fresh)
+        
+        otp_length = otp_length or self.otp_engine.length
+        otps = self._random_below(10 ** otp_length, count, use_numpy)
+        return NumberBatch(self._national_numbers(positions, use_numpy), otps, otp_length)
+    
+    def _national_numbers(self, positions: List[int], use_numpy: bool):
+        """Convert index positions to national numbers (prefix + suffix)"""
+        prefix_base = [int(prefix) * 10 ** 8 + SUFFIX_MIN for prefix in self.prefixes]
+        
+        if use_numpy:
+            positions = np.asarray(positions, dtype=np.int64)
+            slots, offsets = np.divmod(positions, SUFFIX_SPAN)
+            return np.asarray(prefix_base, dtype=np.int64)[slots] + offsets
+        
+        return [prefix_base[position // SUFFIX_SPAN] + position % SUFFIX_SPAN
+                for position in positions]
+    
+    @staticmethod
+    def _random_below(bound: int, count: int, use_numpy: bool):
+        """Draw `count` unbiased integers in [0, bound) from os.urandom"""
+        if bound > 1 << 32:
+            raise ValueError("Batch values must fit in 32 bits")
         
-        # Generate secure random OTP
-        otp = ''.join([str(random.randint(0, 9)) for _ in range(length)])
+        # Rejection sampling over 32-bit words: anything at or above the
+        # largest multiple of `bound` is discarded to avoid modulo bias
+        limit = (1 << 32) // bound * bound
+        values = []
+        drawn = 0
+        while drawn < count:
+            # Over-draw a little so one round is almost always enough
+            words = int((count - drawn) * (1 << 32) / limit * 1.05) + 16
+            raw = os.urandom(words * 4)
+            
+            if use_numpy:
+                chunk = np.frombuffer(raw, dtype=np.uint32)
+                chunk = (chunk[chunk < limit] % bound).astype(np.int64)
+            else:
+                chunk = [word % bound for word in memoryview(raw).cast('I') if word < limit]
+            
+            values.append(chunk[:count - drawn])
+            drawn += len(values[-1])
         
-        # Add timestamp for uniqueness
-        timestamp = datetime.now().strftime('%H%M%S')
-        return f"{otp}"
+        if use_numpy:
+            return np.concatenate(values)
+        return [value for chunk in values for value in chunk]
+    
+    def generate_otp(self, length: int = None) -> str:
+        """Generate OTP code"""
+        return self.otp_engine.generate(length)
     
     def generate_virtual_pair(self) -> Tuple[str, str]:
         """Generate number and OTP pair"""
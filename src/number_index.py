@@ -0,0 +1,171 @@
+import json
+import mmap
+import os
+import threading
+from typing import Optional, Iterable, List
+
+# Every number is +91<2-digit prefix><8-digit suffix>
+COUNTRY_CODE = "+91"
+SUFFIX_MIN = 10000000
+SUFFIX_SPAN = 90000000
+
+def format_position(prefixes: List[str], position: int) -> str:
+    """Format a position in the number space as a phone number"""
+    slot, offset = divmod(position, SUFFIX_SPAN)
+    return f"{COUNTRY_CODE}{prefixes[slot]}{offset + SUFFIX_MIN}"
+
+class NumberIndex:
+    def __init__(self, path: str, prefixes: List[str]):
+        """Open (or create) the memory-mapped issued-number bitset"""
+        self.path = path
+        self.prefixes = list(prefixes)
+        self._prefix_slots = {prefix: slot for slot, prefix in enumerate(self.prefixes)}
+        self.size_bits = len(self.prefixes) * SUFFIX_SPAN
+        self.size_bytes = (self.size_bits + 7) // 8
+        self._lock = threading.Lock()
+        self._file = None
+        self._mm = None
+
+        self.created = not (os.path.exists(path) and os.path.getsize(path) == self.size_bytes)
+        if not self.created:
+            self._open(path)
+
+    def _open(self, path: str):
+        """Map the index file into memory"""
+        self._file = open(path, 'r+b')
+        self._mm = mmap.mmap(self._file.fileno(), self.size_bytes)
+
+    def position(self, number: str) -> Optional[int]:
+        """Get bit position of a number, None if outside the number space"""
+        if len(number) != 13 or not number.startswith(COUNTRY_CODE):
+            return None
+
+        slot = self._prefix_slots.get(number[3:5])
+        suffix = number[5:]
+        if slot is None or not suffix.isdigit():
+            return None
+
+        offset = int(suffix) - SUFFIX_MIN
+        if offset < 0:
+            return None
+        return slot * SUFFIX_SPAN + offset
+
+    def number_at(self, position: int) -> str:
+        """Get number stored at a bit position"""
+        return format_position(self.prefixes, position)
+
+    def __contains__(self, number: str) -> bool:
+        position = self.position(number)
+        if position is None:
+            return False
+        return bool(self._mm[position >> 3] & (1 << (position & 7)))
+
+    def add(self, number: str) -> bool:
+        """Mark number as issued, return False if it already was"""
+        position = self.position(number)
+        if position is None:
+            raise ValueError(f"Number outside index space: {number}")
+
+        with self._lock:
+            return self._set_bit(position)
+
+    def add_positions(self, positions: Iterable[int]) -> List[int]:
+        """Mark positions as issued, return those that were new"""
+        with self._lock:
+            return [position for position in positions if self._set_bit(position)]
+
+    def unissued_positions(self, positions: Iterable[int]) -> List[int]:
+        """Get the positions whose bit is not set"""
+        mm = self._mm
+        return [position for position in positions
+                if not mm[position >> 3] & (1 << (position & 7))]
+
+    def _set_bit(self, position: int) -> bool:
+        """Set a bit, return False if it was already set (caller holds lock)"""
+        byte, bit = position >> 3, 1 << (position & 7)
+        current = self._mm[byte]
+        if current & bit:
+            return False
+        self._mm[byte] = current | bit
+        return True
+
+    def add_many(self, numbers: Iterable[str]) -> int:
+        """Mark several numbers as issued, return how many were new"""
+        return sum(1 for number in numbers if self.position(number) is not None and self.add(number))
+
+    def rebuild(self, numbers: Iterable[str]) -> int:
+        """Build a fresh index file from issued numbers"""
+        self.close()
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+
+        # Build next to the real file and swap in, so a crash never
+        # leaves a half-filled index behind
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.truncate(self.size_bytes)  # sparse, zero-filled
+
+        self._open(temp_path)
+        count = self.add_many(numbers)
+        self._mm.flush()
+        self.close()
+
+        os.replace(temp_path, self.path)
+        self._open(self.path)
+        self.created = False
+        print(f"✅ Number index rebuilt: {count:,} numbers ({self.path})")
+        return count
+
+    # Bits are set after a number's history row commits. The stamp saved at
+    # shutdown holds each file's numbers_history sequence, so a start can
+    # tell rows committed after it (crash: add them) from a database
+    # restored to an older state (rebuild)
+
+    @property
+    def stamp_path(self) -> str:
+        return f"{self.path}.stamp"
+
+    def _read_stamp(self) -> Optional[List[int]]:
+        try:
+            with open(self.stamp_path, 'r') as f:
+                return json.load(f)['sequences']
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def checkpoint(self, db):
+        """Flush the bitset and stamp it with the database's sequences"""
+        self.flush()
+        temp_path = f"{self.stamp_path}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump({'sequences': db.history_sequences()}, f)
+        os.replace(temp_path, self.stamp_path)
+
+    def ensure_built(self, db) -> bool:
+        """Build or reconcile the index against numbers_history, return True if rebuilt"""
+        stamp = self._read_stamp()
+        sequences = db.history_sequences()
+        if (self.created or stamp is None or len(stamp) != len(sequences)
+                or any(now < then for now, then in zip(sequences, stamp))):
+            self.rebuild(db.iter_issued_numbers())
+            self.checkpoint(db)
+            return True
+
+        if sequences != stamp:
+            added = self.add_many(db.iter_numbers_after(stamp))
+            print(f"✅ Number index caught up: {added:,} numbers")
+            self.checkpoint(db)
+        return False
+
+    def flush(self):
+        """Flush dirty pages to disk"""
+        if self._mm is not None:
+            self._mm.flush()
+
+    def close(self):
+        """Unmap and close the index file"""
+        if self._mm is not None:
+            self._mm.flush()
+            self._mm.close()
+            self._mm = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,130 @@
+import threading
+from collections import deque
+from typing import Tuple, List, Dict
+
+class NumberPool:
+    def __init__(self, generator, db=None, low_watermark: int = 200,
+                 high_watermark: int = 1000, refill_batch: int = 250):
+        """Initialize reserve pool of ready (number, OTP) pairs"""
+        if low_watermark < 0 or high_watermark <= low_watermark:
+            raise ValueError("high_watermark must be greater than low_watermark")
+
+        self.generator = generator
+        self.db = db
+        self.low_watermark = low_watermark
+        self.high_watermark = high_watermark
+        self.refill_batch = max(1, refill_batch)
+
+        self._pairs = deque()
+        self._queued = set()
+        self._lock = threading.Lock()
+        self._refill_needed = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+        # Counters for monitoring
+        self.served = 0
+        self.misses = 0
+        self.refills = 0
+
+    def start(self, prefill: bool = True):
+        """Start background refill worker"""
+        if self._thread and self._thread.is_alive():
+            return
+
+        if prefill:
+            self.refill()
+
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="number-pool", daemon=True)
+        self._thread.start()
+        print(f"✅ Number pool started ({len(self)} ready, "
+              f"low={self.low_watermark}, high={self.high_watermark})")
+
+    def stop(self):
+        """Stop background refill worker"""
+        self._stopped.set()
+        self._refill_needed.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def __len__(self) -> int:
+        return len(self._pairs)
+
+    def pop(self) -> Tuple[str, str]:
+        """Take a ready (number, OTP) pair from the pool"""
+        with self._lock:
+            if self._pairs:
+                pair = self._pairs.popleft()
+                self._queued.discard(pair[0])
+                self.served += 1
+            else:
+                pair = None
+
+            if len(self._pairs) < self.low_watermark:
+                self._refill_needed.set()
+
+        if pair is None:
+            # Pool drained faster than refill, generate inline
+            self.misses += 1
+            pair = self._fresh_pairs(1)[0]
+
+        return pair
+
+    def put_back(self, pair: Tuple[str, str]):
+        """Return an unused pair to the front of the pool"""
+        with self._lock:
+            if pair[0] not in self._queued:
+                self._pairs.appendleft(pair)
+                self._queued.add(pair[0])
+
+    def refill(self) -> int:
+        """Top the pool up to the high watermark, return pairs added"""
+        added = 0
+        while len(self._pairs) < self.high_watermark and not self._stopped.is_set():
+            wanted = min(self.refill_batch, self.high_watermark - len(self._pairs))
+            pairs = self._fresh_pairs(wanted)
+
+            with self._lock:
+                for pair in pairs:
+                    if pair[0] not in self._queued:
+                        self._pairs.append(pair)
+                        self._queued.add(pair[0])
+                        added += 1
+
+        if added:
+            self.refills += 1
+        return added
+
+    def _fresh_pairs(self, count: int) -> List[Tuple[str, str]]:
+        """Generate pairs that were never issued before"""
+        # The generator's index already guarantees unseen numbers
+        store = self.db if self.generator.index is None else None
+        return self.generator.generate_batch(count, store=store).pairs()
+
+    def _run(self):
+        """Background worker loop"""
+        while not self._stopped.is_set():
+            self._refill_needed.wait()
+            self._refill_needed.clear()
+
+            if self._stopped.is_set():
+                break
+
+            try:
+                self.refill()
+            except Exception as e:
+                print(f"❌ Number pool refill failed: {e}")
+                self._stopped.wait(1)
+
+    def get_stats(self) -> Dict:
+        """Get pool statistics"""
+        return {
+            'ready': len(self._pairs),
+            'low_watermark': self.low_watermark,
+            'high_watermark': self.high_watermark,
+            'served': self.served,
+            'misses': self.misses,
+            'refills': self.refills
+        }
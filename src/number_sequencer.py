@@ -0,0 +1,105 @@
+import hashlib
+import json
+import os
+import threading
+from typing import List
+
+from .number_index import SUFFIX_SPAN, format_position
+
+class NumberSequencer:
+    ROUNDS = 8
+    HALF_BITS = 16
+    HALF_MASK = (1 << 16) - 1
+
+    def __init__(self, state_path: str, prefixes: List[str], block_size: int = 1000):
+        """Initialize counter-based number sequencer"""
+        self.state_path = state_path
+        self.prefixes = list(prefixes)
+        self.domain = len(self.prefixes) * SUFFIX_SPAN
+        self.block_size = max(1, block_size)
+        self._lock = threading.Lock()
+
+        if self.domain > 1 << (2 * self.HALF_BITS):
+            raise ValueError("Number space too large for 32-bit permutation")
+
+        state = self._load_state()
+        self.key = bytes.fromhex(state['key'])
+        # Counters below the persisted mark may have been handed out
+        # before a restart, so resume from it and never look back
+        self.counter = state['counter']
+        self.reserved = self.counter
+
+    def _load_state(self) -> dict:
+        """Load key and counter, creating them on first run"""
+        if os.path.exists(self.state_path):
+            with open(self.state_path, 'r') as f:
+                return json.load(f)
+
+        state = {'key': os.urandom(32).hex(), 'counter': 0}
+        self._save_state(state)
+        return state
+
+    def _save_state(self, state: dict):
+        """Atomically persist sequencer state"""
+        os.makedirs(os.path.dirname(self.state_path) or '.', exist_ok=True)
+        temp_path = f"{self.state_path}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.state_path)
+
+    def _round(self, round_no: int, half: int) -> int:
+        """Keyed Feistel round function"""
+        digest = hashlib.blake2b(
+            bytes((round_no, half >> 8, half & 0xFF)),
+            key=self.key,
+            digest_size=2
+        ).digest()
+        return int.from_bytes(digest, 'big')
+
+    def _permute32(self, value: int) -> int:
+        """Balanced Feistel permutation over 32-bit values"""
+        left, right = value >> self.HALF_BITS, value & self.HALF_MASK
+        for round_no in range(self.ROUNDS):
+            left, right = right, left ^ self._round(round_no, right)
+        return (left << self.HALF_BITS) | right
+
+    def permute(self, value: int) -> int:
+        """Map a counter to a unique position in the number space"""
+        # Cycle-walk until the result falls inside the domain; the domain
+        # covers ~63% of 2^32 so this takes 1.6 rounds on average
+        value = self._permute32(value)
+        while value >= self.domain:
+            value = self._permute32(value)
+        return value
+
+    def _take(self, count: int) -> int:
+        """Reserve a run of counters, return the first one"""
+        with self._lock:
+            if self.counter + count > self.domain:
+                raise RuntimeError("Number space exhausted")
+
+            start = self.counter
+            self.counter += count
+            if self.counter > self.reserved:
+                self.reserved = self.counter + self.block_size
+                self._save_state({'key': self.key.hex(), 'counter': self.reserved})
+            return start
+
+    def number_at(self, position: int) -> str:
+        """Format a position in the number space"""
+        return format_position(self.prefixes, position)
+
+    def next_number(self) -> str:
+        """Get the next unique number"""
+        return self.number_at(self.permute(self._take(1)))
+
+    def next_positions(self, count: int) -> List[int]:
+        """Get the next `count` unique positions in the number space"""
+        start = self._take(count)
+        return [self.permute(value) for value in range(start, start + count)]
+
+    def next_numbers(self, count: int) -> List[str]:
+        """Get the next `count` unique numbers"""
+        return [self.number_at(position) for position in self.next_positions(count)]
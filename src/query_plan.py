@@ -0,0 +1,296 @@
+"""
+Query-plan audit
+
+Runs the bot's database workload (DatabaseManager, UserManager,
+AdminManager, BackupManager) against a synthetic database, captures every
+SQL statement and checks its EXPLAIN QUERY PLAN. Exits non-zero when a
+statement scans a hot table without an allowlisted reason. An index walk
+counts as bounded only when the statement's own ORDER BY ... LIMIT is
+served by that index and no WHERE condition on the table falls outside
+it; tests/test_query_plans.py runs the audit under pytest.
+
+    python -m src.query_plan [--users 20000] [--numbers 100000] [--compact] [--verbose]
+"""
+
+import argparse
+import os
+import random
+import re
+import shutil
+import sqlite3
+import sys
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+
+# Tables that grow with the user base
+HOT_TABLES = {'users', 'user_limits', 'numbers_history', 'admin_logs', 'subscriptions'}
+
+# Statements allowed to scan a hot table, with the reason
+ALLOWED_SCANS: List[Tuple[str, str]] = [
+    (r"\bLIKE '%", "substring search fallback when SQLite lacks FTS5 trigram"),
+    (r"^SELECT phone_number FROM numbers_history$", "number index rebuild reads every number"),
+    (r"^SELECT \* FROM \w+$", "JSON export dumps whole tables"),
+    (r"^SELECT user_id FROM users$", "bulk operation on the 'all' cohort")
+]
+
+PLANNED = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+KEYWORDS = {'WHERE', 'JOIN', 'LEFT', 'INNER', 'CROSS', 'ON', 'USING', 'ORDER', 'GROUP',
+            'LIMIT', 'SET', 'VALUES', 'AS', 'NATURAL', 'RETURNING', 'HAVING'}
+
+_SCAN = re.compile(r'^SCAN (\w+)(?: USING (?:COVERING )?INDEX (\w+))?')
+_CLAUSE_END = re.compile(r'\b(?:GROUP|ORDER|LIMIT|RETURNING|HAVING)\b', re.IGNORECASE)
+_COLUMN = re.compile(r'\b(?:(\w+)\.)?(\w+)\b')
+_SOURCE = re.compile(r'\b(?:FROM|JOIN|UPDATE|INTO)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?', re.IGNORECASE)
+
+def normalize(sql: str) -> str:
+    """Collapse whitespace"""
+    return ' '.join(sql.split())
+
+def shape(sql: str) -> str:
+    """Replace literals with ? so repeated calls group together"""
+    sql = re.sub(r"'(?:[^']|'')*'", "?", normalize(sql))
+    return re.sub(r"\b\d+(?:\.\d+)?\b", "?", sql)
+
+def aliases(sql: str) -> Dict[str, str]:
+    """Map table aliases (and names) used in a statement to table names"""
+    mapping = {}
+    for table, alias in _SOURCE.findall(sql):
+        mapping[table] = table
+        if alias and alias.upper() not in KEYWORDS:
+            mapping[alias] = table
+    return mapping
+
+def top_level(sql: str) -> str:
+    """Statement text with parenthesized parts (subqueries, IN lists) dropped"""
+    depth, kept = 0, []
+    for char in sql:
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif depth == 0:
+            kept.append(char)
+    return ''.join(kept)
+
+def bounded_walk(sql: str, plan: List[str], name: str, table: str, index: str,
+                 conn: sqlite3.Connection) -> bool:
+    """Whether an index walk stops after LIMIT rows
+    
+    The statement itself (not a subquery) must have ORDER BY and LIMIT,
+    the index must deliver that order (no temp B-tree sort) and every
+    WHERE condition on the table must be answerable from the index;
+    otherwise the walk may read the whole table to find LIMIT rows.
+    """
+    outer = top_level(sql)
+    if not re.search(r'\bORDER\s+BY\b.*\bLIMIT\b', outer, re.IGNORECASE | re.DOTALL):
+        return False
+    if any(detail.startswith('USE TEMP B-TREE FOR') and 'ORDER BY' in detail for detail in plan):
+        return False
+    
+    where = re.split(r'\bWHERE\b', outer, maxsplit=1, flags=re.IGNORECASE)
+    if len(where) == 1:
+        return True
+    condition = _CLAUSE_END.split(where[1], maxsplit=1)[0]
+    columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    indexed = {row[2] for row in conn.execute(f"PRAGMA index_info({index})")}
+    for qualifier, column in _COLUMN.findall(condition):
+        if qualifier and qualifier not in (name, table):
+            continue
+        if column in columns and column not in indexed:
+            return False
+    return True
+
+def check_plan(sql: str, plan: List[str], conn: sqlite3.Connection) -> Tuple[str, str]:
+    """Classify a statement's plan as OK, ALLOWED or FAIL"""
+    names = aliases(sql)
+    for detail in plan:
+        match = _SCAN.match(detail)
+        table = names.get(match.group(1), match.group(1)) if match else None
+        if table not in HOT_TABLES:
+            continue
+        # An ordered index walk that stops after LIMIT rows is not a full scan
+        if match.group(2) and bounded_walk(sql, plan, match.group(1), table, match.group(2), conn):
+            continue
+        for pattern, reason in ALLOWED_SCANS:
+            if re.search(pattern, normalize(sql)):
+                return 'ALLOWED', reason
+        return 'FAIL', detail
+    return 'OK', ''
+
+class StatementLog:
+    def __init__(self):
+        """Initialize statement collector"""
+        self.statements = {}
+    
+    def __call__(self, sql: str):
+        """Trace callback: remember one example of each statement shape"""
+        sql = normalize(sql)
+        if sql.upper().startswith(PLANNED):
+            self.statements.setdefault(shape(sql), sql)
+
+@contextmanager
+def traced_connections(log: StatementLog):
+    """Trace connections opened directly with sqlite3.connect (BackupManager)"""
+    connect = sqlite3.connect
+    
+    def traced(*args, **kwargs):
+        conn = connect(*args, **kwargs)
+        conn.set_trace_callback(log)
+        return conn
+    
+    sqlite3.connect = traced
+    try:
+        yield
+    finally:
+        sqlite3.connect = connect
+
+def populate(db_path: str, users: int, numbers: int, seed: int = 7):
+    """Fill a database with synthetic users, limits, history and logs"""
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    
+    def stamp(days: int) -> str:
+        return (now - timedelta(seconds=rng.randrange(days * 86400))).strftime('%Y-%m-%d %H:%M:%S')
+    
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.executemany('''
+        INSERT OR IGNORE INTO users (user_id, username, first_name, join_date, last_active)
+        VALUES (?, ?, ?, ?, ?)
+        ''', ((1000 + i, f"user{i}", f"User {i}", stamp(365), stamp(30)) for i in range(users)))
+        conn.executemany('''
+        INSERT OR IGNORE INTO user_limits (user_id, used, remaining)
+        VALUES (?, ?, 10 - ?)
+        ''', ((1000 + i, used, used) for i, used in ((i, rng.randrange(11)) for i in range(users))))
+        conn.executemany('''
+        INSERT OR IGNORE INTO numbers_history (user_id, phone_number, otp_code, created_at)
+        VALUES (?, ?, ?, ?)
+        ''', ((1000 + rng.randrange(users), f"+91{6000000000 + i}", f"{rng.randrange(10 ** 6):06d}",
+               stamp(365)) for i in range(numbers)))
+        conn.executemany('''
+        INSERT INTO admin_logs (admin_id, action, target_user, details, timestamp)
+        VALUES (1, 'UPDATE_LIMIT', ?, '', ?)
+        ''', ((1000 + rng.randrange(users), stamp(365)) for _ in range(max(1, users // 10))))
+        conn.executemany('''
+        INSERT OR IGNORE INTO subscriptions (user_id, channel_id, channel_name, is_subscribed)
+        VALUES (?, '@channel', 'Channel', 1)
+        ''', ((1000 + i,) for i in range(users)))
+        conn.commit()
+        conn.execute('ANALYZE')
+    finally:
+        conn.close()
+
+def run_workload(workdir: str, users: int, numbers: int, compact: bool = False) -> StatementLog:
+    """Build the synthetic database, run every manager's queries, return the log"""
+    from .database import DatabaseManager
+    from .number_generator import NumberGenerator
+    from .user_manager import UserManager
+    from .admin_manager import AdminManager
+    from .expiry import ExpirySweeper
+    from .limit_reset import LimitResetScheduler
+    from .utils.backup import BackupManager
+    from config.snapshot import ConfigStore
+    
+    db_path = os.path.join(workdir, 'numbers.db')
+    DatabaseManager(db_path).close()
+    populate(db_path, users, numbers)
+    if compact:
+        from .compact import convert
+        
+        db = DatabaseManager(db_path)
+        convert(db)
+        db.close()
+    
+    log = StatementLog()
+    # No cache: every read must reach SQLite to be audited
+    db = DatabaseManager(db_path, cache_max_users=0)
+    db.storage.set_trace_callback(log)
+    try:
+        with traced_connections(log):
+            user_manager = UserManager(db, NumberGenerator())
+            config = ConfigStore(channels_path=None, env_path=None)
+            config.swap(config.get()._replace(admin_ids=frozenset({1})))
+            admin_manager = AdminManager(db, config=config)
+            backup = BackupManager(db_path, os.path.join(workdir, 'backups'))
+            
+            existing, new = 1000 + users // 2, 10 ** 9
+            user_manager.register_user({'id': new, 'username': 'audit', 'first_name': 'Audit'})
+            for user_id in (existing, new):
+                user_manager.get_user_status(user_id)
+                user_manager.request_number(user_id, "Audit")
+                user_manager.get_user_history(user_id)
+                user_manager.get_active_numbers(user_id)
+                user_manager.get_user_history_page(user_id, 10 ** 6, "next")
+                user_manager.get_user_history_page(user_id, 1, "prev")
+                db.can_get_number(user_id)
+            db.add_number_to_history(new, "+910000000001", "123456")
+            db.get_issued_numbers(["+916000000001", "+910000000002"])
+            for _ in db.iter_issued_numbers():
+                break
+            
+            admin_manager.update_user_limit(1, existing, 20)
+            admin_manager.add_extra_numbers(1, existing, 5)
+            user_manager.reset_user_limits(existing)
+            ExpirySweeper(db, pause=0).sweep()
+            LimitResetScheduler(db, "weekly", pause=0).run_due()
+            admin_manager.get_admin_stats()
+            admin_manager.get_user_search(str(existing))
+            admin_manager.get_user_search("user12")
+            admin_manager.get_user_search("us")
+            for cohort in ('all', 'active', 'new'):
+                admin_manager.get_cohort(cohort)
+            admin_manager.bulk_add_extra_numbers(1, [existing, new, 1001], 1)
+            
+            backup.verify_database()
+            backup.create_backup("audit")
+            backup.export_to_json(os.path.join(workdir, 'export.json'))
+    finally:
+        db.close()
+    return log
+
+def audit(log: StatementLog, db_path: str) -> List[Tuple[str, str, str, List[str]]]:
+    """EXPLAIN every captured statement, return (status, note, sql, plan) rows"""
+    conn = sqlite3.connect(db_path)
+    results = []
+    try:
+        for sql in log.statements.values():
+            plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}")]
+            status, note = check_plan(sql, plan, conn)
+            results.append((status, note, sql, plan))
+    finally:
+        conn.close()
+    return results
+
+def main(argv=None) -> int:
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description="Check query plans of the bot's SQL")
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--numbers', type=int, default=100000)
+    parser.add_argument('--compact', action='store_true', help="audit the compact history layout")
+    parser.add_argument('--verbose', action='store_true', help="print every plan")
+    args = parser.parse_args(argv)
+    
+    workdir = tempfile.mkdtemp(prefix='query_plan_')
+    try:
+        log = run_workload(workdir, args.users, args.numbers, args.compact)
+        results = audit(log, os.path.join(workdir, 'numbers.db'))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    
+    failures = 0
+    for status, note, sql, plan in results:
+        if status == 'FAIL':
+            failures += 1
+        if status != 'OK' or args.verbose:
+            print(f"[{status}] {shape(sql)}" + (f"\n    -> {note}" if note else ''))
+            if args.verbose or status == 'FAIL':
+                for detail in plan:
+                    print(f"    {detail}")
+    
+    print(f"{'❌' if failures else '✅'} {len(results)} statements checked, {failures} full scans")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
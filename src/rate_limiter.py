@@ -0,0 +1,255 @@
+"""
+Per-user rate limiting
+
+Checks run in memory: a token bucket absorbs bursts, fixed windows (one
+of RATE_LIMIT_WINDOW seconds, one of a day) cap sustained use. Counters
+are flushed to rate_limits every few seconds in one executemany, so they
+survive restarts without a write per update. Admin-managed columns
+(hourly_limit, daily_limit, is_blocked, block_until) are read when a user
+is first seen, re-read for every tracked user each refresh_interval so
+edits to the table take effect, and never written by the flush; NULL
+limits mean the configured defaults.
+"""
+
+import threading
+import time
+from typing import Dict
+
+DAY = 86400
+
+# Users per admin-column query (SQLite allows 999 parameters)
+REFRESH_CHUNK = 500
+
+class _UserState:
+    __slots__ = ('tokens', 'refilled', 'window_start', 'window_count', 'day_start',
+                 'day_count', 'window_limit', 'daily_limit', 'block_until',
+                 'last_request', 'dirty')
+
+class RateLimiter:
+    def __init__(self, db, rate: float = 1.0, burst: int = 5, window: int = 3600,
+                 window_limit: int = 120, daily_limit: int = 1000,
+                 flush_interval: float = 30, refresh_interval: float = 300):
+        """Initialize limiter; defaults apply to users without their own row"""
+        self.db = db
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.window = max(1, window)
+        self.window_limit = window_limit
+        self.daily_limit = daily_limit
+        self.flush_interval = flush_interval
+        self.refresh_interval = refresh_interval
+        
+        self._users: Dict[int, _UserState] = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+        
+        # Counters for monitoring
+        self.allowed = 0
+        self.limited = 0
+        self.flushes = 0
+        self.flush_errors = 0
+        self.last_flush_rows = 0
+        self.refreshes = 0
+        self._last_refresh = time.monotonic()
+    
+    def _load(self, user_id: int, now: float) -> _UserState:
+        """State from rate_limits, or a fresh one"""
+        state = _UserState()
+        state.tokens = float(self.burst)
+        state.refilled = now
+        state.window_start = state.day_start = 0
+        state.window_count = state.day_count = 0
+        state.window_limit = self.window_limit
+        state.daily_limit = self.daily_limit
+        state.block_until = None
+        state.last_request = now
+        state.dirty = False
+        
+        row = self.db.fetchone('''
+        SELECT request_count, hourly_limit, daily_limit, is_blocked,
+               CAST(strftime('%s', block_until) AS INTEGER) AS block_until,
+               window_start, window_count, day_start
+        FROM rate_limits WHERE user_id = ?
+        ''', (user_id,))
+        if row:
+            state.window_start = row['window_start'] or 0
+            state.window_count = row['window_count'] or 0
+            state.day_start = row['day_start'] or 0
+            state.day_count = row['request_count'] or 0
+            self._apply_admin_columns(state, row)
+        return state
+    
+    def _apply_admin_columns(self, state: _UserState, row):
+        """Take limits and block from a rate_limits row"""
+        state.window_limit = self.window_limit if row['hourly_limit'] is None else row['hourly_limit']
+        state.daily_limit = self.daily_limit if row['daily_limit'] is None else row['daily_limit']
+        if row['is_blocked']:
+            # No end date: blocked until an admin lifts it
+            state.block_until = row['block_until'] or float('inf')
+        else:
+            state.block_until = None
+    
+    def refresh(self) -> int:
+        """Re-read admin columns of tracked users, return rows applied"""
+        with self._lock:
+            user_ids = list(self._users)
+        
+        applied = 0
+        for start in range(0, len(user_ids), REFRESH_CHUNK):
+            chunk = user_ids[start:start + REFRESH_CHUNK]
+            rows = self.db.fetchall(f'''
+            SELECT user_id, hourly_limit, daily_limit, is_blocked,
+                   CAST(strftime('%s', block_until) AS INTEGER) AS block_until
+            FROM rate_limits WHERE user_id IN ({','.join('?' * len(chunk))})
+            ''', chunk)
+            with self._lock:
+                for row in rows:
+                    state = self._users.get(row['user_id'])
+                    if state is not None:
+                        self._apply_admin_columns(state, row)
+                        applied += 1
+        self.refreshes += 1
+        self._last_refresh = time.monotonic()
+        return applied
+    
+    def check(self, user_id: int) -> bool:
+        """Count one update for user, return False if it must be dropped"""
+        now = time.time()
+        with self._lock:
+            state = self._users.get(user_id)
+        if state is None:
+            # Read outside the lock; a racing first load just loses
+            loaded = self._load(user_id, now)
+            with self._lock:
+                state = self._users.setdefault(user_id, loaded)
+        
+        with self._lock:
+            if state.block_until is not None:
+                if now < state.block_until:
+                    self.limited += 1
+                    return False
+                state.block_until = None
+            
+            window_start = int(now // self.window) * self.window
+            if state.window_start != window_start:
+                state.window_start, state.window_count = window_start, 0
+            day_start = int(now // DAY) * DAY
+            if state.day_start != day_start:
+                state.day_start, state.day_count = day_start, 0
+            
+            state.tokens = min(self.burst, state.tokens + (now - state.refilled) * self.rate)
+            state.refilled = now
+            if (state.tokens < 1 or state.window_count >= state.window_limit
+                    or state.day_count >= state.daily_limit):
+                self.limited += 1
+                return False
+            
+            state.tokens -= 1
+            state.window_count += 1
+            state.day_count += 1
+            state.last_request = now
+            state.dirty = True
+            self.allowed += 1
+            return True
+    
+    def forget(self, user_id: int):
+        """Drop user's in-memory state, e.g. after an admin changed their row"""
+        self.flush()
+        with self._lock:
+            self._users.pop(user_id, None)
+    
+    def flush(self) -> int:
+        """Write changed counters to rate_limits, return rows written"""
+        now = time.time()
+        with self._lock:
+            rows = []
+            for user_id, state in list(self._users.items()):
+                if state.dirty:
+                    state.dirty = False
+                    rows.append((
+                        user_id, state.day_count,
+                        time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(state.last_request)),
+                        state.window_start, state.window_count, state.day_start
+                    ))
+                elif now - state.last_request > DAY and state.block_until is None:
+                    # Idle for a day: counters are stale, reload if seen again
+                    del self._users[user_id]
+        
+        if rows:
+            def upsert(conn):
+                conn.executemany('''
+                INSERT INTO rate_limits
+                (user_id, request_count, last_request, hourly_limit, daily_limit,
+                 window_start, window_count, day_start)
+                VALUES (?, ?, ?, NULL, NULL, ?, ?, ?)
+                ON CONFLICT(user_id) DO UPDATE
+                SET request_count = excluded.request_count,
+                    last_request = excluded.last_request,
+                    window_start = excluded.window_start,
+                    window_count = excluded.window_count,
+                    day_start = excluded.day_start
+                ''', rows)
+            
+            try:
+                self.db.connections.write(upsert)
+            except Exception:
+                # Keep the counts for the next flush
+                with self._lock:
+                    for row in rows:
+                        state = self._users.get(row[0])
+                        if state is not None:
+                            state.dirty = True
+                self.flush_errors += 1
+                raise
+        self.flushes += 1
+        self.last_flush_rows = len(rows)
+        return len(rows)
+    
+    # Background flush
+    
+    def start(self):
+        """Start periodic flushing"""
+        if self._thread and self._thread.is_alive():
+            return
+        
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="rate-limit-flush", daemon=True)
+        self._thread.start()
+        print(f"✅ Rate limiter started ({self.rate}/s, burst {self.burst}, "
+              f"{self.window_limit}/{self.window}s, {self.daily_limit}/day)")
+    
+    def stop(self):
+        """Stop periodic flushing and write what is left"""
+        self._stopped.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.flush()
+    
+    def _run(self):
+        """Background worker loop"""
+        while not self._stopped.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"❌ Rate limit flush failed: {e}")
+            if time.monotonic() - self._last_refresh >= self.refresh_interval:
+                try:
+                    self.refresh()
+                except Exception as e:
+                    print(f"❌ Rate limit refresh failed: {e}")
+    
+    def get_stats(self) -> Dict:
+        """Get limiter counters"""
+        with self._lock:
+            tracked = len(self._users)
+        return {
+            'tracked_users': tracked,
+            'allowed': self.allowed,
+            'limited': self.limited,
+            'flushes': self.flushes,
+            'flush_errors': self.flush_errors,
+            'last_flush_rows': self.last_flush_rows,
+            'refreshes': self.refreshes
+        }
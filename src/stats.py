@@ -0,0 +1,86 @@
+"""
+Daily rollups in bot_stats
+
+Counters are bumped inside the same writer transaction as the event they
+count, so admin statistics read a few rows instead of scanning history.
+Days are UTC, matching CURRENT_TIMESTAMP.
+
+Existing history is backfilled once by schema migration 14; to re-run:
+    python -m src.stats backfill [database/numbers.db] [shards]
+"""
+
+import sys
+from typing import Dict
+
+COUNTERS = ('new_users', 'active_users', 'numbers_generated', 'otps_generated', 'admin_actions')
+
+def record_stats(conn, **counts):
+    """Add counts to today's bot_stats row (call inside a write job)"""
+    columns = [column for column in COUNTERS if counts.get(column)]
+    if not columns:
+        return
+    
+    updates = ', '.join(f"{column} = {column} + excluded.{column}" for column in columns)
+    conn.execute(f'''
+    INSERT INTO bot_stats (date, {', '.join(columns)})
+    VALUES (DATE('now'), {', '.join('?' * len(columns))})
+    ON CONFLICT(date) DO UPDATE SET {updates}, updated_at = CURRENT_TIMESTAMP
+    ''', [counts[column] for column in columns])
+
+# Per-day aggregates rebuilt from history. Only the latest activity of each
+# user survives in users.last_active, so backfilled active_users is a floor.
+BACKFILL_QUERIES = {
+    'new_users': 'SELECT DATE(join_date), COUNT(*) FROM users WHERE join_date IS NOT NULL GROUP BY 1',
+    'active_users': 'SELECT DATE(last_active), COUNT(*) FROM users WHERE last_active IS NOT NULL GROUP BY 1',
+    'numbers_generated': 'SELECT DATE(created_at), COUNT(*) FROM numbers_history WHERE created_at IS NOT NULL GROUP BY 1',
+    'otps_generated': 'SELECT DATE(created_at), COUNT(otp_code) FROM numbers_history WHERE created_at IS NOT NULL GROUP BY 1',
+    'admin_actions': 'SELECT DATE(timestamp), COUNT(*) FROM admin_logs WHERE timestamp IS NOT NULL GROUP BY 1'
+}
+
+def backfill_rows(conn) -> Dict[str, int]:
+    """Rebuild daily rollups from this file's history (call inside a write job)
+    
+    Counts never go down, so re-running it (or running it on a live bot)
+    keeps increments already recorded.
+    """
+    touched = {}
+    for column, query in BACKFILL_QUERIES.items():
+        cursor = conn.execute(f'''
+        INSERT INTO bot_stats (date, {column})
+        SELECT * FROM ({query}) WHERE 1
+        ON CONFLICT(date) DO UPDATE
+        SET {column} = MAX({column}, excluded.{column}),
+            updated_at = CURRENT_TIMESTAMP
+        ''')
+        touched[column] = cursor.rowcount
+    return touched
+
+def backfill(connections) -> Dict[str, int]:
+    """Rebuild daily rollups in one write transaction, return days touched per counter"""
+    return connections.write(backfill_rows)
+
+def main(argv=None):
+    """Command line entry point"""
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] != 'backfill':
+        print("Usage: python -m src.stats backfill [db_path] [shards]")
+        return 1
+    
+    from .database import DatabaseManager
+    
+    db = DatabaseManager(argv[1] if len(argv) > 1 else "database/numbers.db",
+                         shards=int(argv[2]) if len(argv) > 2 else 1)
+    try:
+        # Each file rolls up its own rows (admin actions live in the main file)
+        touched = {}
+        for connections in db.storage.managers():
+            for column, days in backfill(connections).items():
+                touched[column] = max(touched.get(column, 0), days)
+        for column, days in touched.items():
+            print(f"✅ {column}: {days} days")
+    finally:
+        db.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,221 @@
+"""
+Storage backends beneath DatabaseManager
+
+SingleFileBackend keeps every table in one SQLite file behind one writer.
+ShardedBackend splits the per-user tables (users, user_limits,
+numbers_history) across N shard files by a hash of user_id, each with its
+own ConnectionManager and writer thread, so writes for different users
+commit in parallel. Global tables (admin_logs, app_names, subscriptions,
+...) stay in the main file.
+
+Phone numbers are unique per file through numbers_history's UNIQUE
+constraint. Across shards a number is claimed in number_claims on the
+shard its own hash picks, so every number has exactly one place where a
+duplicate is detected. When that is the user's own shard the claim joins
+the history transaction; otherwise it commits first, and a crash before
+the history write is repaired at startup (reconcile_claims). The shard count is fixed when the database is
+created and recorded in the main file's user_version.
+"""
+
+import os
+import zlib
+from typing import Dict, Iterator, List, Tuple
+
+from .connection import ConnectionManager
+from .compact import encode_phone, decode_phone
+
+def shard_index(user_id: int, count: int) -> int:
+    """Shard holding a user's rows (stable across processes and restarts)"""
+    return zlib.crc32(str(user_id).encode()) % count
+
+def shard_paths(db_path: str, count: int) -> List[str]:
+    """Shard files next to the main file (numbers.shard0.db, ...)"""
+    base, ext = os.path.splitext(db_path)
+    return [f"{base}.shard{i}{ext or '.db'}" for i in range(count)]
+
+def number_shard(phone: str, count: int) -> int:
+    """Shard holding a phone number's claim"""
+    return zlib.crc32(str(encode_phone(phone)).encode()) % count
+
+class SingleFileBackend:
+    sharded = False
+    
+    def __init__(self, db_path: str, **options):
+        """Open the database file"""
+        self.main = ConnectionManager(db_path, **options)
+        self.shards = [self.main]
+        
+        shards = self.main.write(lambda conn: conn.execute('PRAGMA user_version').fetchone()[0])
+        if shards:
+            raise ValueError(f"{db_path} is the main file of a {shards}-shard database (set DB_SHARDS)")
+    
+    def managers(self) -> List[ConnectionManager]:
+        """Every ConnectionManager, main first"""
+        return [self.main]
+    
+    def shard_for(self, user_id: int) -> ConnectionManager:
+        """ConnectionManager holding user's rows"""
+        return self.main
+    
+    def claim_is_local(self, phone: str, user_id: int) -> bool:
+        """Always: see claim_number"""
+        return True
+    
+    def claim_in(self, conn, phone: str, user_id: int):
+        """No-op, see claim_number"""
+    
+    def claim_number(self, phone: str, user_id: int):
+        """No-op: the UNIQUE constraint on numbers_history is global here"""
+    
+    def release_number(self, phone: str, user_id: int):
+        """No-op, see claim_number"""
+    
+    def recent_claims(self, window_seconds: int) -> Iterator[Tuple[str, int]]:
+        """Nothing to reconcile, see claim_number"""
+        return iter(())
+    
+    def set_trace_callback(self, callback):
+        """Pass every statement to callback"""
+        self.main.set_trace_callback(callback)
+    
+    def get_metrics(self) -> Dict:
+        """Get writer statistics"""
+        return self.main.get_metrics()
+    
+    def close(self):
+        """Close all connections"""
+        self.main.close()
+
+class ShardedBackend:
+    sharded = True
+    
+    def __init__(self, db_path: str, shards: int, cache_size_kb: int = 64 * 1024, **options):
+        """Open the main file and one file per shard (numbers.shard0.db, ...)
+        
+        The page cache budget is split across the files.
+        """
+        if shards < 2:
+            raise ValueError("ShardedBackend needs at least 2 shards")
+        
+        options['cache_size_kb'] = max(2048, cache_size_kb // (shards + 1))
+        self.main = ConnectionManager(db_path, **options)
+        self.shards = [ConnectionManager(path, **options) for path in shard_paths(db_path, shards)]
+        self.main.write(self._check_layout)
+    
+    def _check_layout(self, conn):
+        """Record the shard count on first use, refuse a different one later"""
+        shards = conn.execute('PRAGMA user_version').fetchone()[0]
+        if shards == 0:
+            # Rows of a single-file database would silently disappear
+            has_users = conn.execute('''
+            SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'users'
+            ''').fetchone() and conn.execute('SELECT 1 FROM users LIMIT 1').fetchone()
+            if has_users:
+                raise ValueError(f"{self.main.db_path} holds single-file data, cannot shard it in place")
+            conn.execute(f'PRAGMA user_version = {len(self.shards)}')
+        elif shards != len(self.shards):
+            raise ValueError(f"{self.main.db_path} was created with {shards} shards, not {len(self.shards)}")
+    
+    def managers(self) -> List[ConnectionManager]:
+        """Every ConnectionManager, main first"""
+        return [self.main] + self.shards
+    
+    def shard_for(self, user_id: int) -> ConnectionManager:
+        """ConnectionManager holding user's rows"""
+        return self.shards[shard_index(user_id, len(self.shards))]
+    
+    # Global number uniqueness
+    
+    def claim_is_local(self, phone: str, user_id: int) -> bool:
+        """Whether a number's claim lives in the same file as user's rows"""
+        return number_shard(phone, len(self.shards)) == shard_index(user_id, len(self.shards))
+    
+    @staticmethod
+    def claim_in(conn, phone: str, user_id: int):
+        """Claim a local number inside the caller's transaction on user's shard"""
+        conn.execute('''
+        INSERT INTO number_claims (phone_number, user_id) VALUES (?, ?)
+        ''', (encode_phone(phone), user_id))
+    
+    def claim_number(self, phone: str, user_id: int):
+        """Claim a number for user, raising IntegrityError if it is taken"""
+        self.shards[number_shard(phone, len(self.shards))].write(
+            lambda conn: self.claim_in(conn, phone, user_id)
+        )
+    
+    def release_number(self, phone: str, user_id: int):
+        """Give back a claim whose history row was never written"""
+        self.shards[number_shard(phone, len(self.shards))].execute('''
+        DELETE FROM number_claims WHERE phone_number = ? AND user_id = ?
+        ''', (encode_phone(phone), user_id))
+    
+    def recent_claims(self, window_seconds: int) -> Iterator[Tuple[str, int]]:
+        """(number, user_id) of claims made within window_seconds of the newest one"""
+        newest = max(filter(None, (
+            shard.fetchone('SELECT MAX(claimed_at) FROM number_claims')[0] for shard in self.shards
+        )), default=None)
+        if newest is None:
+            return
+        for shard in self.shards:
+            rows = shard.fetchall('''
+            SELECT phone_number, user_id FROM number_claims
+            WHERE claimed_at >= datetime(?, ?)
+            ''', (newest, f'-{int(window_seconds)} seconds'))
+            for row in rows:
+                yield decode_phone(row[0]), row[1]
+    
+    def get_claimed(self, numbers: List[str]) -> set:
+        """Return which of the given numbers are claimed"""
+        by_shard = {}
+        for number in numbers:
+            by_shard.setdefault(number_shard(number, len(self.shards)), {})[encode_phone(number)] = number
+        
+        claimed = set()
+        for index, stored in by_shard.items():
+            keys = list(stored)
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = self.shards[index].fetchall(f'''
+                SELECT phone_number FROM number_claims
+                WHERE phone_number IN ({','.join('?' * len(chunk))})
+                ''', chunk)
+                claimed.update(stored[row[0]] for row in rows)
+        return claimed
+    
+    def iter_claimed(self, batch_size: int = 10000) -> Iterator[str]:
+        """Iterate over every claimed number"""
+        for shard in self.shards:
+            conn = shard.open_reader()
+            try:
+                cursor = conn.execute('SELECT phone_number FROM number_claims')
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    for row in rows:
+                        yield decode_phone(row[0])
+            finally:
+                conn.close()
+    
+    def set_trace_callback(self, callback):
+        """Pass every statement on every file to callback"""
+        for connections in self.managers():
+            connections.set_trace_callback(callback)
+    
+    def get_metrics(self) -> Dict:
+        """Get writer statistics of the main file and each shard"""
+        return {
+            'main': self.main.get_metrics(),
+            'shards': [shard.get_metrics() for shard in self.shards]
+        }
+    
+    def close(self):
+        """Close all connections"""
+        for connections in self.managers():
+            connections.close()
+
+def open_storage(db_path: str, shards: int = 1, **options):
+    """Open the backend for a shard count (1 = single file)"""
+    if shards > 1:
+        return ShardedBackend(db_path, shards, **options)
+    return SingleFileBackend(db_path, **options)
@@ -0,0 +1,261 @@
+"""
+Channel subscription verification
+
+Results live in memory and in the subscriptions table. A positive result
+is trusted for `positive_ttl` seconds, then still served while a
+background thread re-verifies it; a negative one expires after the much
+shorter `negative_ttl`, so a user who just joined is not kept waiting.
+Cache misses check every required channel at once on a bounded worker
+pool, and concurrent checks for the same user share one round of calls.
+
+Only transient API failures (network, 429, 5xx) let a user through; a
+400/403 means the bot cannot check that channel (not an admin there,
+wrong id) and counts as not subscribed, so a misconfiguration shows up
+as refusals and in config_errors instead of opening the gate for good.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Mapping, Optional, Sequence, Tuple
+
+from .cache import TTLCache
+
+# getChatMember statuses that count as subscribed
+SUBSCRIBED = {'creator', 'administrator', 'member', 'restricted'}
+
+def is_transient(error: Exception) -> bool:
+    """Network errors, rate limits and Telegram 5xx are worth retrying"""
+    # ApiTelegramException carries Telegram's error_code; network errors have none
+    code = getattr(error, 'error_code', None)
+    return code is None or code == 429 or code >= 500
+
+class SubscriptionVerifier:
+    def __init__(self, db, get_member_status: Callable[[str, int], str],
+                 channels: Callable[[], Sequence[Mapping[str, str]]],
+                 positive_ttl: float = 3600, negative_ttl: float = 60,
+                 max_workers: int = 8, max_users: int = 10000):
+        """Initialize verifier
+        
+        get_member_status(channel_id, user_id) calls getChatMember and
+        returns the status; channels() returns the required channels.
+        """
+        self.db = db
+        self.get_member_status = get_member_status
+        self.channels = channels
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        
+        # user_id -> {channel_id: (subscribed, checked_at)}; stale
+        # positives stay around for a second TTL while they are refreshed
+        self._results = TTLCache(max_users, positive_ttl * 2)
+        self._pool = ThreadPoolExecutor(max_workers=max(1, max_workers),
+                                        thread_name_prefix="subscription-check")
+        self._inflight: Dict[int, Future] = {}
+        self._lock = threading.Lock()
+        
+        self._refresh = queue.Queue()
+        self._queued = set()
+        self._stopped = threading.Event()
+        self._thread = None
+        
+        # Counters for monitoring
+        self.cache_answers = 0
+        self.verifications = 0
+        self.collapsed = 0
+        self.api_calls = 0
+        self.api_errors = 0
+        self.config_errors = 0
+        self.refreshes = 0
+    
+    # Request path
+    
+    def is_subscribed(self, user_id: int, force: bool = False) -> bool:
+        """Check that user is in every required channel
+        
+        force=True skips the cache (the "check again" button).
+        """
+        channels = self.channels()
+        if not channels:
+            return True
+        
+        results = {} if force else self._cached(user_id)
+        now = time.time()
+        missing = False
+        stale = False
+        for channel in channels:
+            entry = results.get(channel['id'])
+            if entry is None:
+                missing = True
+                continue
+            subscribed, checked_at = entry
+            age = now - checked_at
+            if not subscribed and age <= self.negative_ttl:
+                # Known to be out of this channel: no call needed
+                self.cache_answers += 1
+                return False
+            if not subscribed or age > self.positive_ttl * 2:
+                missing = True
+            elif age > self.positive_ttl:
+                stale = True
+        
+        if missing:
+            results = self._verify(user_id, channels)
+        else:
+            self.cache_answers += 1
+            if stale:
+                self._schedule_refresh(user_id)
+        return all(results[channel['id']][0] for channel in channels)
+    
+    def _cached(self, user_id: int) -> Dict[str, Tuple[bool, float]]:
+        """Results from memory, falling back to the subscriptions table"""
+        results = self._results.get(user_id)
+        if results is None:
+            rows = self.db.fetchall('''
+            SELECT channel_id, is_subscribed,
+                   CAST(strftime('%s', last_checked) AS INTEGER) AS checked_at
+            FROM subscriptions WHERE user_id = ?
+            ''', (user_id,))
+            results = {row['channel_id']: (bool(row['is_subscribed']), row['checked_at'] or 0)
+                       for row in rows}
+            if results:
+                self._results.set(user_id, results)
+        return results
+    
+    def _verify(self, user_id: int, channels: Sequence[Mapping[str, str]]) -> Dict[str, Tuple[bool, float]]:
+        """Check every channel concurrently; callers for the same user share it"""
+        with self._lock:
+            future = self._inflight.get(user_id)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[user_id] = future
+        if not owner:
+            self.collapsed += 1
+            return future.result()
+        
+        try:
+            self.verifications += 1
+            checks = {channel['id']: self._pool.submit(self._check, channel['id'], user_id)
+                      for channel in channels}
+            previous = self._results.get(user_id) or {}
+            now = time.time()
+            results = dict(previous)
+            checked = []
+            for channel in channels:
+                subscribed, definite = checks[channel['id']].result()
+                if subscribed is None:
+                    # Transient failure: keep the last answer, or let the user
+                    # through as stale so the retry happens in the background
+                    results.setdefault(channel['id'], (True, now - self.positive_ttl - 1))
+                    continue
+                results[channel['id']] = (subscribed, now)
+                if definite:
+                    checked.append((user_id, channel['id'], channel.get('name', channel['id']), subscribed))
+            
+            self._results.set(user_id, results)
+            self._save(checked)
+            future.set_result(results)
+            return results
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(user_id, None)
+    
+    def _check(self, channel_id: str, user_id: int) -> Tuple[Optional[bool], bool]:
+        """One getChatMember call: (subscribed, worth saving)
+        
+        subscribed is None after a transient failure; a permanent one
+        (400/403) answers False without being saved.
+        """
+        self.api_calls += 1
+        try:
+            return self.get_member_status(channel_id, user_id) in SUBSCRIBED, True
+        except Exception as e:
+            self.api_errors += 1
+            if is_transient(e):
+                print(f"❌ Subscription check failed ({channel_id}): {e}")
+                return None, False
+            self.config_errors += 1
+            print(f"❌ Cannot check channel {channel_id}, is the bot an admin there? {e}")
+            return False, False
+    
+    def _save(self, checked):
+        """Upsert results into subscriptions without waiting for the commit"""
+        if not checked:
+            return
+        
+        def upsert(conn):
+            conn.executemany('''
+            INSERT INTO subscriptions (user_id, channel_id, channel_name, is_subscribed, last_checked, check_count)
+            VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP, 1)
+            ON CONFLICT(user_id, channel_id) DO UPDATE
+            SET channel_name = excluded.channel_name,
+                is_subscribed = excluded.is_subscribed,
+                last_checked = excluded.last_checked,
+                check_count = check_count + 1
+            ''', checked)
+        
+        self.db.connections.write(upsert, wait=False)
+    
+    # Background re-verification
+    
+    def _schedule_refresh(self, user_id: int):
+        """Queue a stale user once"""
+        with self._lock:
+            if user_id in self._queued:
+                return
+            self._queued.add(user_id)
+        self._refresh.put(user_id)
+    
+    def start(self):
+        """Start background re-verification"""
+        if self._thread and self._thread.is_alive():
+            return
+        
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="subscription-refresh", daemon=True)
+        self._thread.start()
+        print(f"✅ Subscription verifier started (ttl +{self.positive_ttl}s/-{self.negative_ttl}s)")
+    
+    def stop(self):
+        """Stop background re-verification and the worker pool"""
+        self._stopped.set()
+        self._refresh.put(None)
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self._pool.shutdown(wait=False)
+    
+    def _run(self):
+        """Background worker loop"""
+        while not self._stopped.is_set():
+            user_id = self._refresh.get()
+            if user_id is None:
+                break
+            with self._lock:
+                self._queued.discard(user_id)
+            try:
+                channels = self.channels()
+                if channels:
+                    self._verify(user_id, channels)
+                    self.refreshes += 1
+            except Exception as e:
+                print(f"❌ Subscription refresh failed: {e}")
+    
+    def get_stats(self) -> Dict:
+        """Get cache and API call counters"""
+        return {
+            'cache': self._results.get_stats(),
+            'cache_answers': self.cache_answers,
+            'verifications': self.verifications,
+            'collapsed': self.collapsed,
+            'api_calls': self.api_calls,
+            'api_errors': self.api_errors,
+            'config_errors': self.config_errors,
+            'refreshes': self.refreshes,
+            'refresh_queue': self._refresh.qsize()
+        }
@@ -1,10 +1,18 @@
+import sqlite3
 from typing import Optional, Dict, List
 from datetime import datetime
 
+# Fresh pairs tried when a number turns out to be issued already
+RESERVE_ATTEMPTS = 5
+
 class UserManager:
-    def __init__(self, db):
+    def __init__(self, db, number_gen=None, number_pool=None):
         """Initialize user manager"""
+        from .number_generator import NumberGenerator
+        
         self.db = db
+        self.number_gen = number_gen or NumberGenerator()
+        self.number_pool = number_pool
     
     def register_user(self, user_data: Dict) -> bool:
         """Register new user"""
@@ -24,59 +32,80 @@ class UserManager:
         
         if not limits:
             # Create default limits
-            self.db.cursor.execute('INSERT OR IGNORE INTO user_limits (user_id) VALUES (?)', (user_id,))
-            self.db.conn.commit()
-            limits = self.db.get_user_limits(user_id)
+            limits = self.db.init_user_limits(user_id)
         
         # Get user info
-        self.db.cursor.execute('SELECT * FROM users WHERE user_id = ?', (user_id,))
-        user_info = self.db.cursor.fetchone()
+        user_info = self.db.get_user(user_id)
         
         return {
-            'user_info': dict(user_info) if user_info else {},
+            'user_info': user_info or {},
             'limits': limits,
-            'can_get_more': self.db.can_get_number(user_id)
+            'can_get_more': limits['used'] < limits['total_allowed']
         }
     
     def request_number(self, user_id: int, app_name: str = "Unknown") -> Optional[Dict]:
-        """Process number request for user"""
-        from .number_generator import NumberGenerator
+        """Process number request for user
+        
+        Returns None only if the user's limit is reached; other failures
+        return {'success': False, 'error': ...}.
+        """
+        for _ in range(RESERVE_ATTEMPTS):
+            # Take a ready pair from the pool, or generate inline
+            if self.number_pool is not None:
+                number, otp = self.number_pool.pop()
+            else:
+                number, otp = self.number_gen.generate_virtual_pair()
+            
+            # Limit check, history insert and new limits in one transaction
+            try:
+                limits = self.db.reserve_number(user_id, number, otp, app_name)
+                break
+            except sqlite3.IntegrityError:
+                # Issued already (e.g. an index that missed it): never offer it again
+                self.number_gen.mark_issued(number)
+            except Exception as e:
+                print(f"Error reserving number: {e}")
+                self.number_gen.release(number)
+                return {'success': False, 'error': 'Database error'}
+        else:
+            print(f"❌ No free number after {RESERVE_ATTEMPTS} attempts for user {user_id}")
+            return {'success': False, 'error': 'No free number'}
         
-        # Check if user can get more numbers
-        if not self.db.can_get_number(user_id):
+        if limits is None:
+            # Limit reached, keep the unused pair for the next request
+            if self.number_pool is not None:
+                self.number_pool.put_back((number, otp))
+            else:
+                self.number_gen.release(number)
             return None
         
-        # Generate number and OTP
-        generator = NumberGenerator()
-        number, otp = generator.generate_virtual_pair()
+        # Committed: only now is the number taken for good
+        self.number_gen.mark_issued(number)
         
-        # Save to database
-        if self.db.add_number_to_history(user_id, number, otp, app_name):
-            return {
-                'success': True,
-                'number': number,
-                'otp': otp,
-                'formatted': generator.format_number_display(number, otp),
-                'status': self.get_user_status(user_id)
+        return {
+            'success': True,
+            'number': number,
+            'otp': otp,
+            'formatted': self.number_gen.format_number_display(number, otp),
+            'status': {
+                'limits': limits,
+                'can_get_more': limits['used'] < limits['total_allowed']
             }
-        
-        return None
+        }
     
     def get_user_history(self, user_id: int) -> List[Dict]:
         """Get user's number history"""
         return self.db.get_user_numbers(user_id)
     
+    def get_active_numbers(self, user_id: int) -> List[Dict]:
+        """Get user's numbers that are still valid"""
+        return self.db.get_active_numbers(user_id)
+    
+    def get_user_history_page(self, user_id: int, cursor: Optional[int] = None,
+                              direction: str = "next", page_size: int = 5) -> Dict:
+        """Get one page of user's number history (keyset cursor)"""
+        return self.db.get_user_numbers_page(user_id, cursor, direction, page_size)
+    
     def reset_user_limits(self, user_id: int) -> bool:
         """Reset user's used count (admin only)"""
-        try:
-            self.db.cursor.execute('''
-            UPDATE user_limits 
-            SET used = 0, 
-                remaining = max_limit + extra_given 
-            WHERE user_id = ?
-            ''', (user_id,))
-            self.db.conn.commit()
-            return True
-        except Exception as e:
-            print(f"Error resetting limits: {e}")
-            return False
\ No newline at end of file
+        return self.db.reset_user_limits(user_id)
\ No newline at end of file
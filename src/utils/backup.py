@@ -11,15 +11,27 @@ import json
 from datetime import datetime, timedelta
 import threading
 from typing import Optional, Dict, List
+import glob
 import gzip
 import hashlib
 
+from ..connection import ConnectionManager
+from ..storage import shard_paths
+
 class BackupManager:
     def __init__(self, db_path: str = "database/numbers.db", 
-                 backup_dir: str = "backups"):
+                 backup_dir: str = "backups", archive_dir: Optional[str] = None,
+                 shards: int = 1):
         """Initialize backup manager"""
         self.db_path = db_path
         self.backup_dir = backup_dir
+        # With shards > 1 the per-user tables live in numbers.shardN.db;
+        # they are backed up and restored as one set with the main file
+        self.shards = shards
+        # Monthly numbers_history archives: the archiver appends to the
+        # current month and compact convert rewrites them, so every backup
+        # carries the whole set next to the main file
+        self.archive_dir = archive_dir
         self.backup_count = 0
         
         # Create backup directory if not exists
@@ -37,10 +49,13 @@ class BackupManager:
                 f"backup_{timestamp}_{backup_type}.db.gz"
             )
             
-            # Create compressed backup
-            with open(self.db_path, 'rb') as f_in:
-                with gzip.open(backup_file, 'wb') as f_out:
-                    shutil.copyfileobj(f_in, f_out)
+            self._backup_database(self.db_path, backup_file)
+            
+            # Files that belong to the same database go into a folder
+            # next to it (backup_..._manual.files/archive/numbers_2024_01.db.gz)
+            companions = self._companion_files()
+            for name, path in companions.items():
+                self._backup_database(path, os.path.join(self._files_dir(backup_file), f"{name}.gz"))
             
             # Get file info
             file_size = os.path.getsize(backup_file)
@@ -53,7 +68,8 @@ class BackupManager:
                 "backup_type": backup_type,
                 "created_at": datetime.now().isoformat(),
                 "status": "success",
-                "checksum": self.calculate_checksum(backup_file)
+                "checksum": self.calculate_checksum(backup_file),
+                "files": sorted(companions)
             }
             
             # Save backup info
@@ -63,7 +79,8 @@ class BackupManager:
             self.clean_old_backups()
             
             self.backup_count += 1
-            print(f"✅ Backup created: {backup_file} ({file_size:,} bytes)")
+            print(f"✅ Backup created: {backup_file} ({file_size:,} bytes, "
+                  f"{len(companions)} more files)")
             
             return backup_info
             
@@ -125,56 +142,173 @@ class BackupManager:
             for file_path, mod_time in backup_files:
                 age = now - mod_time
                 if age.days > keep_days:
-                    os.remove(file_path)
+                    self._remove_backup(file_path)
                     print(f"🗑️ Removed old backup: {file_path}")
             
             # Remove by count (keep only latest N)
             backup_files.sort(key=lambda x: x[1], reverse=True)  # newest first
             for i, (file_path, _) in enumerate(backup_files):
                 if i >= keep_count:
-                    os.remove(file_path)
+                    self._remove_backup(file_path)
                     print(f"🗑️ Removed excess backup: {file_path}")
                     
         except Exception as e:
             print(f"❌ Error cleaning backups: {e}")
     
+    # Backup sets
+    
+    def _companion_files(self) -> Dict[str, str]:
+        """Files backed up with the main one: name in the backup -> live path"""
+        files = {}
+        if self.shards > 1:
+            for path in shard_paths(self.db_path, self.shards):
+                files[f"shards/{os.path.basename(path)}"] = path
+        if self.archive_dir:
+            for path in sorted(glob.glob(os.path.join(self.archive_dir, "numbers_*.db"))):
+                files[f"archive/{os.path.basename(path)}"] = path
+        return files
+    
+    def _live_path(self, name: str) -> Optional[str]:
+        """Live path for a name in a backup set (None if not configured)"""
+        folder, filename = name.split("/", 1)
+        if folder == "archive" and self.archive_dir:
+            return os.path.join(self.archive_dir, filename)
+        if folder == "shards":
+            return os.path.join(os.path.dirname(self.db_path), filename)
+        return None
+    
+    @staticmethod
+    def _files_dir(backup_file: str) -> str:
+        """Folder holding a backup's companion files"""
+        return backup_file[:-len(".db.gz")] + ".files"
+    
+    def _remove_backup(self, backup_file: str):
+        """Delete a backup and its companion files"""
+        os.remove(backup_file)
+        shutil.rmtree(self._files_dir(backup_file), ignore_errors=True)
+    
+    def _backup_database(self, source_path: str, backup_file: str):
+        """Snapshot a database into a compressed file
+        
+        The online backup API includes pages still in the WAL file.
+        """
+        os.makedirs(os.path.dirname(backup_file) or ".", exist_ok=True)
+        snapshot_file = f"{backup_file}.tmp"
+        self._copy_database(source_path, snapshot_file)
+        with open(snapshot_file, 'rb') as f_in:
+            with gzip.open(backup_file, 'wb') as f_out:
+                shutil.copyfileobj(f_in, f_out)
+        os.remove(snapshot_file)
+    
+    def _restore_database(self, backup_file: str, target_path: str):
+        """Copy a compressed snapshot over a database"""
+        restored_file = f"{backup_file}.restore.tmp"
+        with gzip.open(backup_file, 'rb') as f_in:
+            with open(restored_file, 'wb') as f_out:
+                shutil.copyfileobj(f_in, f_out)
+        try:
+            self._copy_database(restored_file, target_path)
+        finally:
+            os.remove(restored_file)
+    
+    @staticmethod
+    def _remove_database(path: str):
+        """Delete a closed database file with its WAL files"""
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+    
+    @staticmethod
+    def _copy_database(source_path: str, target_path: str):
+        """Copy one database over another through SQLite's backup API
+        
+        Pages still in the source's WAL are included and the target's
+        WAL/-shm stay consistent, unlike copying the files.
+        """
+        source = sqlite3.connect(source_path)
+        target = sqlite3.connect(target_path)
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
+    
     def restore_backup(self, backup_file: str) -> bool:
-        """Restore database from backup"""
+        """Restore database and its companion files from backup (the bot must be stopped)"""
         try:
             # Check if backup exists
             if not os.path.exists(backup_file):
                 print(f"❌ Backup file not found: {backup_file}")
                 return False
             
-            # Close existing database connections
-            # (This is important for SQLite)
+            # Its writer and readers would keep serving the old pages
+            live_files = [self.db_path] + [path for name, path in self._companion_files().items()
+                                           if name.startswith("shards/")]
+            if any(ConnectionManager.is_open(path) for path in live_files):
+                print(f"❌ Restore refused: {self.db_path} is open, stop the bot first")
+                return False
             
-            # Create backup of current database
-            temp_backup = f"{self.db_path}.temp_backup"
-            if os.path.exists(self.db_path):
-                shutil.copy2(self.db_path, temp_backup)
-                print(f"📋 Current DB backed up to: {temp_backup}")
+            # Live path -> compressed snapshot
+            restore_set = {self.db_path: backup_file}
+            stale = []
+            files_dir = self._files_dir(backup_file)
+            if os.path.isdir(files_dir):
+                for root, _, filenames in os.walk(files_dir):
+                    for filename in filenames:
+                        if not filename.endswith(".gz"):
+                            continue
+                        name = os.path.relpath(os.path.join(root, filename[:-3]), files_dir)
+                        live_path = self._live_path(name.replace(os.sep, "/"))
+                        if live_path is None:
+                            print(f"⚠️ Skipping {name}: no place to restore it to")
+                            continue
+                        restore_set[live_path] = os.path.join(root, filename)
+                # Months archived after the backup hold rows the restored
+                # main file has again
+                stale = [path for path in self._companion_files().values()
+                         if path not in restore_set]
             
-            # Restore from compressed backup
-            with gzip.open(backup_file, 'rb') as f_in:
-                with open(self.db_path, 'wb') as f_out:
-                    shutil.copyfileobj(f_in, f_out)
+            # Global tables of one moment must not meet user rows of another
+            missing = [path for path in live_files[1:] if path not in restore_set]
+            if missing:
+                print(f"❌ Restore refused: backup has no copy of {', '.join(missing)}")
+                return False
             
-            print(f"✅ Database restored from: {backup_file}")
+            # Create backup of everything about to change
+            temp_backups = {}
+            for path in list(restore_set) + stale:
+                if os.path.exists(path):
+                    temp_backups[path] = f"{path}.temp_backup"
+                    self._copy_database(path, temp_backups[path])
+            print(f"📋 Current DB backed up ({len(temp_backups)} files, *.temp_backup)")
+            
+            try:
+                for path, snapshot in restore_set.items():
+                    self._restore_database(snapshot, path)
+                for path in stale:
+                    self._remove_database(path)
+                print(f"✅ Database restored from: {backup_file} ({len(restore_set)} files)")
+                restored = self.verify_database()
+            except Exception as e:
+                print(f"❌ Restore failed: {e}")
+                restored = False
             
             # Verify restoration
-            if self.verify_database():
+            if restored:
                 print("✅ Database verification successful")
-                # Remove temp backup
-                if os.path.exists(temp_backup):
+                # Remove temp backups
+                for temp_backup in temp_backups.values():
                     os.remove(temp_backup)
                 return True
             else:
                 print("❌ Database verification failed, restoring from temp backup")
-                # Restore from temp backup
-                if os.path.exists(temp_backup):
-                    shutil.copy2(temp_backup, self.db_path)
-                    os.remove(temp_backup)
+                # Restore from temp backups; drop files the restore created
+                for path in list(restore_set) + stale:
+                    if path in temp_backups:
+                        self._copy_database(temp_backups[path], path)
+                        os.remove(temp_backups[path])
+                    else:
+                        self._remove_database(path)
                 return False
                 
         except Exception as e:
@@ -269,8 +403,15 @@ class BackupManager:
             cursor = conn.cursor()
             
             # Get all tables
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-            tables = [row[0] for row in cursor.fetchall()]
+            cursor.execute("SELECT name, sql FROM sqlite_master WHERE type='table';")
+            rows = cursor.fetchall()
+            
+            # Skip full-text indexes and their shadow tables (derived data)
+            virtual = [row[0] for row in rows if (row[1] or '').upper().startswith('CREATE VIRTUAL TABLE')]
+            tables = [
+                row[0] for row in rows
+                if not any(row[0] == name or row[0].startswith(name + '_') for name in virtual)
+            ]
             
             export_data = {
                 "export_date": datetime.now().isoformat(),
@@ -289,6 +430,16 @@ class BackupManager:
                 
                 export_data["tables"][table] = table_data
             
+            # Older history lives in monthly archives, attached one at a time
+            if self.archive_dir and "numbers_history" in export_data["tables"]:
+                archived = []
+                for archive_file in sorted(glob.glob(os.path.join(self.archive_dir, "numbers_*.db"))):
+                    cursor.execute("ATTACH DATABASE ? AS archive", (archive_file,))
+                    cursor.execute("SELECT * FROM archive.numbers_history ORDER BY id")
+                    archived.extend(dict(row) for row in cursor.fetchall())
+                    cursor.execute("DETACH DATABASE archive")
+                export_data["tables"]["numbers_history"][:0] = archived
+            
             # Save to JSON
             with open(output_file, 'w') as f:
                 json.dump(export_data, f, indent=2, default=str)
@@ -0,0 +1,238 @@
+"""
+Webhook ingress
+
+Telegram POSTs each update to WEBHOOK_PATH. The request handler only
+checks the secret token, parses the update and puts it on a bounded
+queue, then answers 200 at once; a pool of worker threads takes updates
+off the queue and runs the handlers. When the queue is full the request
+gets 503 and Telegram delivers the update again later, so a slow
+database pushes back on Telegram instead of growing memory.
+
+Every request must carry the secret token given to setWebhook (one is
+generated when WEBHOOK_SECRET is empty); without it anyone who learns
+the URL could post updates in an admin's name. The app is served by
+waitress: one process, a few HTTP threads, so the SQLite writer threads
+stay the only writers. TLS ends at a reverse proxy in front of it.
+
+Given a LaneDispatcher, updates go straight onto its per-user lanes
+(bounded the same way) and the server starts no workers of its own.
+"""
+
+import queue
+import secrets
+import threading
+import time
+from typing import Dict, Optional
+
+from flask import Flask, Response, abort, jsonify, request
+from telebot import types
+from waitress.server import create_server
+
+class WebhookServer:
+    def __init__(self, bot, url: str, host: str = "0.0.0.0", port: int = 8443,
+                 path: str = "/webhook", secret_token: str = "", workers: int = 8,
+                 queue_size: int = 1000, ssl_cert: str = "", http_threads: int = 4,
+                 dispatcher=None):
+        """Initialize server; url is the public base URL Telegram calls
+        
+        ssl_cert is the proxy's self-signed public certificate, uploaded to
+        Telegram; leave it empty for a CA-signed one.
+        """
+        self.bot = bot
+        self.url = url.rstrip("/") + path
+        self.host = host
+        self.port = port
+        self.path = path
+        if not secret_token:
+            # Only Telegram learns it, through set_webhook
+            secret_token = secrets.token_urlsafe(32)
+            print("⚠️ WEBHOOK_SECRET not set, using a generated secret token")
+        self.secret_token = secret_token
+        self.workers = max(1, workers)
+        self.ssl_cert = ssl_cert
+        self.http_threads = max(1, http_threads)
+        self.dispatcher = dispatcher
+        self._server = None
+        
+        # (update, received_at)
+        self._queue = queue.Queue(maxsize=max(1, queue_size))
+        self._threads = []
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+        
+        # Counters for monitoring
+        self.received = 0
+        self.rejected = 0
+        self.processed = 0
+        self.errors = 0
+        self.max_depth = 0
+        self.last_lag_ms = 0.0
+        self.max_lag_ms = 0.0
+        self.total_lag_ms = 0.0
+        self.total_handler_ms = 0.0
+        
+        self.app = Flask(__name__)
+        self.app.add_url_rule(path, "webhook", self._receive, methods=["POST"])
+        self.app.add_url_rule("/health", "health", self._health, methods=["GET"])
+    
+    # Ingress
+    
+    def _receive(self):
+        """Queue one update and acknowledge it"""
+        token = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+        # Bytes: compare_digest raises TypeError on non-ASCII str
+        if not secrets.compare_digest(token.encode(), self.secret_token.encode()):
+            abort(403)
+        
+        data = request.get_data(as_text=True)
+        try:
+            update = types.Update.de_json(data)
+        except Exception as e:
+            # Retrying a malformed update cannot help: acknowledge and drop it
+            print(f"❌ Bad webhook update: {e}")
+            return Response(status=200)
+        
+        if self.dispatcher is not None:
+            queued = self.dispatcher.submit(update, block=False)
+        else:
+            try:
+                self._queue.put_nowait((update, time.monotonic()))
+                queued = True
+            except queue.Full:
+                queued = False
+        if not queued:
+            with self._lock:
+                self.rejected += 1
+            # Telegram keeps the update and retries it
+            return Response("queue full", status=503)
+        
+        depth = self._queue.qsize()
+        with self._lock:
+            self.received += 1
+            self.max_depth = max(self.max_depth, depth)
+        return Response(status=200)
+    
+    def _health(self):
+        """Liveness check with queue metrics"""
+        return jsonify(self.get_metrics())
+    
+    # Dispatch
+    
+    def dispatch(self, update: types.Update):
+        """Run the handlers for one update (the worker's unit of work)"""
+        self.bot.process_new_updates([update])
+    
+    def _work(self):
+        """Worker loop: take updates off the queue until stopped"""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            update, received_at = item
+            started = time.monotonic()
+            lag_ms = (started - received_at) * 1000
+            try:
+                self.dispatch(update)
+                failed = False
+            except Exception as e:
+                failed = True
+                print(f"❌ Update {update.update_id} failed: {e}")
+            handler_ms = (time.monotonic() - started) * 1000
+            
+            with self._lock:
+                self.processed += 1
+                self.errors += failed
+                self.last_lag_ms = lag_ms
+                self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+                self.total_lag_ms += lag_ms
+                self.total_handler_ms += handler_ms
+    
+    # Lifecycle
+    
+    def start_workers(self):
+        """Start the worker pool (lanes run the updates if there is a dispatcher)"""
+        if self.dispatcher is not None:
+            self.dispatcher.start()
+            return
+        if self._threads:
+            return
+        
+        self._stopped.clear()
+        self._threads = [threading.Thread(target=self._work, name=f"webhook-worker-{i}", daemon=True)
+                         for i in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+    
+    def set_webhook(self) -> bool:
+        """Point Telegram at this server"""
+        self.bot.remove_webhook()
+        certificate = None
+        if self.ssl_cert:
+            # Self-signed: Telegram needs the public certificate
+            certificate = open(self.ssl_cert, 'rb')
+        try:
+            return self.bot.set_webhook(
+                url=self.url,
+                certificate=certificate,
+                max_connections=min(100, self.workers * 5),
+                secret_token=self.secret_token
+            )
+        finally:
+            if certificate:
+                certificate.close()
+    
+    def run(self):
+        """Register the webhook, start workers and serve until interrupted"""
+        self.start_workers()
+        self.set_webhook()
+        if self.dispatcher is not None:
+            print(f"✅ Webhook server started ({self.url}, dispatching to update lanes)")
+        else:
+            print(f"✅ Webhook server started ({self.url}, {self.workers} workers, "
+                  f"queue {self._queue.maxsize})")
+        
+        # Requests only enqueue, so a few HTTP threads keep up
+        self._server = create_server(self.app, host=self.host, port=self.port,
+                                     threads=self.http_threads)
+        try:
+            self._server.run()
+        finally:
+            self.stop()
+    
+    def stop(self, timeout: Optional[float] = 5):
+        """Let workers finish what is queued, then stop them"""
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        if self._server is not None:
+            self._server.close()
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+        self._threads = []
+    
+    def get_metrics(self) -> Dict:
+        """Get queue depth, queue lag and handler time"""
+        with self._lock:
+            if self.dispatcher is not None:
+                return {
+                    'received': self.received,
+                    'rejected': self.rejected,
+                    'dispatcher': self.dispatcher.get_metrics()
+                }
+            processed = self.processed or 1
+            return {
+                'workers': self.workers,
+                'queue_depth': self._queue.qsize(),
+                'queue_size': self._queue.maxsize,
+                'max_depth': self.max_depth,
+                'received': self.received,
+                'rejected': self.rejected,
+                'processed': self.processed,
+                'errors': self.errors,
+                'last_lag_ms': self.last_lag_ms,
+                'max_lag_ms': self.max_lag_ms,
+                'avg_lag_ms': self.total_lag_ms / processed,
+                'avg_handler_ms': self.total_handler_ms / processed
+            }
@@ -0,0 +1,55 @@
+import os
+import sqlite3
+import tempfile
+
+import pytest
+
+from src.query_plan import audit, check_plan, run_workload
+
+@pytest.fixture
+def history():
+    """numbers_history with an index on created_at only"""
+    conn = sqlite3.connect(':memory:')
+    conn.execute('''
+    CREATE TABLE numbers_history (
+        id INTEGER PRIMARY KEY, user_id INTEGER, otp_code TEXT, created_at TIMESTAMP
+    )
+    ''')
+    conn.execute('CREATE INDEX idx_numbers_history_created_at ON numbers_history(created_at)')
+    yield conn
+    conn.close()
+
+def plan_of(conn, sql):
+    return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}")]
+
+def test_index_walk_serving_order_by_limit_passes(history):
+    sql = "SELECT * FROM numbers_history ORDER BY created_at LIMIT 1"
+    plan = plan_of(history, sql)
+    assert any('USING INDEX' in detail for detail in plan)
+    assert check_plan(sql, plan, history)[0] == 'OK'
+
+def test_index_walk_with_residual_filter_fails(history):
+    sql = "SELECT * FROM numbers_history WHERE otp_code = '1' ORDER BY created_at LIMIT 1"
+    plan = plan_of(history, sql)
+    assert any('USING INDEX' in detail for detail in plan)
+    assert check_plan(sql, plan, history)[0] == 'FAIL'
+
+def test_limit_in_subquery_does_not_exempt_outer_walk(history):
+    sql = '''
+    SELECT * FROM numbers_history
+    WHERE id IN (SELECT id FROM numbers_history ORDER BY created_at LIMIT 5)
+       OR created_at > '2024-01-01'
+    ORDER BY created_at
+    '''
+    plan = plan_of(history, sql)
+    assert any(detail.startswith('SCAN numbers_history USING') for detail in plan)
+    assert check_plan(sql, plan, history)[0] == 'FAIL'
+
+def test_workload_has_no_full_scans():
+    with tempfile.TemporaryDirectory(prefix='query_plan_') as workdir:
+        log = run_workload(workdir, users=500, numbers=2000)
+        results = audit(log, os.path.join(workdir, 'numbers.db'))
+    
+    failures = [(sql, plan) for status, _, sql, plan in results if status == 'FAIL']
+    assert results
+    assert failures == []